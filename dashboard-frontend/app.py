@@ -6,6 +6,7 @@ import plotly.express as px
 import pandas as pd
 from datetime import datetime, timedelta
 import json
+import os
 
 # Import components
 from components.navbar import create_navbar
@@ -20,8 +21,13 @@ from components.alerts import create_alerts_layout
 # Import mock data
 from data.mock_data import mock_data
 
-# Import callbacks
+# Import callbacks and HTTP routes
 from callbacks import register_callbacks
+from routes import register_routes
+from reports import ReportScheduler
+from data.ingest_queue import IngestPipeline
+from data.tailer import LogTailer, parse_sources
+from data.wal import WriteAheadLog, replay_wal
 
 # Initialize the Dash app
 app = dash.Dash(
@@ -67,6 +73,28 @@ def display_page(pathname):
 # Register all interactive callbacks
 register_callbacks(app, mock_data)
 
+# Memory limit for the stores and caches, e.g. MEMORY_BUDGET_MB=2048; past it caches are dropped and cold log columns spilled to disk
+if os.environ.get("MEMORY_BUDGET_MB"):
+    mock_data["memory_budget"].limit = int(float(os.environ["MEMORY_BUDGET_MB"]) * 1024 * 1024)
+
+# Records pushed over HTTP or read from log files are applied by one writer thread
+ingest_pipeline = IngestPipeline(mock_data).start()
+
+# Register the ingest, export and report endpoints on the underlying Flask server
+register_routes(app.server, mock_data, ingest_pipeline)
+
 # Run the app
 if __name__ == "__main__":
+    # The debug reloader runs this script twice; only the serving child owns the WAL and schedules reports
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        # Restore what was ingested before the last shutdown, then log new batches before they are applied
+        wal = WriteAheadLog()
+        replay_wal(mock_data, wal)
+        mock_data["memory_budget"].enforce()
+        ingest_pipeline.wal = wal.start()
+        ReportScheduler(mock_data).start()
+        # Log files to follow, e.g. TAIL_LOG_FILES="nginx=/var/log/nginx/access.log,jsonl=/var/log/app.jsonl"
+        log_sources = parse_sources(os.environ.get("TAIL_LOG_FILES"))
+        if log_sources:
+            LogTailer(ingest_pipeline, log_sources).start()
     app.run_server(debug=True, host='0.0.0.0')
@@ -1,24 +1,67 @@
-from dash import Input, Output, State, callback_context
+from dash import Input, Output, State, callback_context, no_update
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
-from datetime import datetime, timedelta
 from dash.exceptions import PreventUpdate
 
-def register_callbacks(app, mock_data):
-    # Convert to DataFrame for easier manipulation
-    logs_df = pd.DataFrame(mock_data["logs"])
-    logs_df['timestamp'] = pd.to_datetime(logs_df['timestamp'])
-    logs_df['date'] = logs_df['timestamp'].dt.date
-    
-    api_df = pd.DataFrame(mock_data["api_metrics"])
-    api_df['timestamp'] = pd.to_datetime(api_df['timestamp'])
+from components.api_metrics import create_latency_percentile_figure, create_unique_users_figure
+from components.error_detection import (
+    ALL_ENDPOINTS_OPTION, create_error_spike_figure, create_suspect_records, create_suspect_timeline_figure,
+    error_timeline, error_timestamps
+)
+from components.export_links import create_export_links
+from components.infra_monitoring import add_forecast_traces, create_fleet_heatmap, create_hottest_servers_figure
+from data.correlation import find_spike, rank_suspects, sampling_step
+from data.filters import (
+    ERROR_SEVERITIES, apply_table_query, filter_alerts as apply_alert_filters, filter_classified_logs, filter_error_logs,
+    filter_suspicious_activities as apply_reason_filters, query_logs, search_logs
+)
+from data.log_query import QueryError
+from data.time_range import DEFAULT_MAX_POINTS, relayout_range, resolve_time_range
+
+INFRA_TREND_GRAPHS = ["cpu-trend-graph", "memory-trend-graph", "disk-trend-graph", "network-trend-graph"]
+
+
+def _zoom_event(graph_id, relayout_data):
+    """
+    Returns the relayoutData if this callback was triggered by zooming the given graph.
     
-    infra_df = pd.DataFrame(mock_data["infra_metrics"])
-    infra_df['timestamp'] = pd.to_datetime(infra_df['timestamp'])
+    Double-click resets (autorange) return None so the range controls apply again,
+    and any other relayout of the graph (pan mode, legend, resize) skips the update.
+    """
+    if not any(t["prop_id"] == f"{graph_id}.relayoutData" for t in callback_context.triggered):
+        return None
+    if relayout_range(relayout_data) is not None:
+        return relayout_data
+    if relayout_data and "xaxis.autorange" in relayout_data:
+        return None
+    raise PreventUpdate
+
+def _apply_query(logs_df, query, log_store):
+    """
+    Applies a log query, returning the filtered logs and the parse error to show, if any
+    """
+    # A query that does not parse leaves the table unfiltered and explains why
+    try:
+        return query_logs(logs_df, query, log_store), None
+    except QueryError as error:
+        return logs_df, f"Query ignored: {error}"
+
+def _alerts_frame(alerts):
+    """
+    Returns the current alerts as a DataFrame; predictive alerts are replaced on every forecast refresh
+    """
+    alerts_df = pd.DataFrame(alerts)
+    if 'timestamp' in alerts_df:
+        alerts_df['timestamp'] = pd.to_datetime(alerts_df['timestamp'])
+    return alerts_df
+
+def register_callbacks(app, mock_data):
+    # Logs are read from the live columnar store on every update
+    log_store = mock_data["logs"]
+    # Group-bys over the store run partitioned across the aggregator's threads
+    aggregator = mock_data["aggregator"]
     
-    alerts_df = pd.DataFrame(mock_data["alerts"])
-    alerts_df['timestamp'] = pd.to_datetime(alerts_df['timestamp'])
     
     # Log Ingestion callbacks
     @app.callback(
@@ -29,8 +72,11 @@ def register_callbacks(app, mock_data):
         if not selected_severities:
             selected_severities = mock_data["severity_levels"]
             
-        filtered_logs = logs_df[logs_df['severity'].isin(selected_severities)]
-        logs_by_date = filtered_logs.groupby(['date', 'severity']).size().reset_index(name='count')
+        # The severity bitmaps pick the rows; sampled rows stand for several logs each
+        logs_by_date = aggregator.group_by(
+            log_store, ['date', 'severity'], log_store.rows(severity=selected_severities), metrics=['weight']
+        )
+        logs_by_date['count'] = logs_by_date.pop('weight').round()
         
         fig = px.bar(
             logs_by_date,
@@ -49,27 +95,74 @@ def register_callbacks(app, mock_data):
         
         return fig
     
-    # Log table search filter
+    # Clicking a bar narrows the table below to the logs it counts, through the query box
     @app.callback(
-        Output("log-table", "data"),
-        [Input("log-search", "value")]
+        Output("log-query", "value"),
+        [Input("log-volume-graph", "clickData")],
+        [State("log-volume-graph", "figure")]
     )
-    def filter_log_table(search_term):
-        if not search_term:
-            return logs_df.tail(100).to_dict('records')
-            
-        filtered_df = logs_df[
-            logs_df['message'].str.contains(search_term, case=False) | 
-            logs_df['endpoint'].str.contains(search_term, case=False) |
-            logs_df['user_id'].str.contains(search_term, case=False)
+    def drill_into_log_volume(click_data, figure):
+        if not click_data:
+            raise PreventUpdate
+        point = click_data["points"][0]
+        severity = figure["data"][point["curveNumber"]]["name"]
+        return f'severity:{severity} AND ts:{str(point["x"])[:10]}'
+    
+    @app.callback(
+        Output("classification-query", "value"),
+        [Input("class-severity-chart", "clickData")],
+        [State("class-severity-chart", "figure")]
+    )
+    def drill_into_class_severity(click_data, figure):
+        if not click_data:
+            raise PreventUpdate
+        point = click_data["points"][0]
+        severity = figure["data"][point["curveNumber"]]["name"]
+        return f'class:"{point["x"]}" AND severity:{severity}'
+    
+    # Log tables are paged, sorted and filtered here; only the visible page is materialized
+    @app.callback(
+        [
+            Output("log-table", "data"),
+            Output("log-table", "page_count"),
+            Output("log-export-links", "children"),
+            Output("log-query-error", "children")
+        ],
+        [
+            Input("log-search", "value"),
+            Input("log-query", "value"),
+            Input("log-table", "page_current"),
+            Input("log-table", "page_size"),
+            Input("log-table", "sort_by"),
+            Input("log-table", "filter_query")
         ]
-        
-        return filtered_df.tail(100).to_dict('records')
+    )
+    def filter_log_table(search_term, query, page_current, page_size, sort_by, filter_query):
+        filtered_df = search_logs(log_store.frame(), search_term, log_store)
+        filtered_df, query_error = _apply_query(filtered_df, query, log_store)
+        filtered_df = apply_table_query(filtered_df, filter_query, log_store)
+        records, page_count = log_store.page(filtered_df, page_current, page_size, sort_by, newest_first=True)
+        export_links = create_export_links(
+            'logs', search=search_term, query=None if query_error else query, filter_query=filter_query
+        )
+        return records, page_count, export_links, query_error
     
     # Log Classification callbacks
     @app.callback(
-        Output("classification-table", "data"),
-        [Input("apply-class-filters", "n_clicks")],
+        [
+            Output("classification-table", "data"),
+            Output("classification-table", "page_count"),
+            Output("classification-export-links", "children"),
+            Output("classification-query-error", "children")
+        ],
+        [
+            Input("apply-class-filters", "n_clicks"),
+            Input("classification-query", "value"),
+            Input("classification-table", "page_current"),
+            Input("classification-table", "page_size"),
+            Input("classification-table", "sort_by"),
+            Input("classification-table", "filter_query")
+        ],
         [
             State("class-filter", "value"),
             State("severity-class-filter", "value"),
@@ -77,46 +170,122 @@ def register_callbacks(app, mock_data):
             State("date-range", "end_date")
         ]
     )
-    def filter_classification_table(n_clicks, classes, severities, start_date, end_date):
-        filtered_df = logs_df.copy()
-        
-        if classes and len(classes) > 0:
-            filtered_df = filtered_df[filtered_df['log_class'].isin(classes)]
-            
-        if severities and len(severities) > 0:
-            filtered_df = filtered_df[filtered_df['severity'].isin(severities)]
-            
-        if start_date and end_date:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            filtered_df = filtered_df[
-                (filtered_df['timestamp'].dt.date >= start_date) & 
-                (filtered_df['timestamp'].dt.date <= end_date)
-            ]
-            
-        return filtered_df.to_dict('records')
+    def filter_classification_table(n_clicks, query, page_current, page_size, sort_by, filter_query,
+                                    classes, severities, start_date, end_date):
+        # Class and severity are intersected as bitmaps; only the date range looks at the rows
+        rows = log_store.rows(log_class=classes, severity=severities)
+        filtered_df = filter_classified_logs(log_store.frame(rows=rows), start_date=start_date, end_date=end_date)
+        filtered_df, query_error = _apply_query(filtered_df, query, log_store)
+        filtered_df = apply_table_query(filtered_df, filter_query, log_store)
+        records, page_count = log_store.page(filtered_df, page_current, page_size, sort_by)
+        export_links = create_export_links(
+            'classification',
+            **{'class': classes, 'severity': severities, 'start_date': start_date, 'end_date': end_date,
+               'query': None if query_error else query, 'filter_query': filter_query}
+        )
+        return records, page_count, export_links, query_error
     
     # Error detection callbacks
     @app.callback(
-        Output("error-table", "data"),
+        [
+            Output("error-table", "data"),
+            Output("error-table", "page_count"),
+            Output("error-export-links", "children"),
+            Output("error-query-error", "children")
+        ],
         [
             Input("error-severity-filter", "value"),
-            Input("error-endpoint-filter", "value")
+            Input("error-endpoint-filter", "value"),
+            Input("error-template-filter", "value"),
+            Input("error-query", "value"),
+            Input("error-table", "page_current"),
+            Input("error-table", "page_size"),
+            Input("error-table", "sort_by"),
+            Input("error-table", "filter_query")
         ]
     )
-    def filter_error_table(severity, endpoints):
-        # Start with all error and critical logs
-        filtered_df = logs_df[logs_df['severity'].isin(['ERROR', 'CRITICAL'])]
+    def filter_error_table(severity, endpoints, template_ids, query, page_current, page_size, sort_by, filter_query):
+        # Severity and endpoint come from the bitmap indexes; the template filter compares an integer column
+        severities = ERROR_SEVERITIES if not severity or severity == 'all' else [severity]
+        rows = log_store.rows(severity=severities, endpoint=endpoints)
+        filtered_df = filter_error_logs(log_store.frame(rows=rows), severity, template_ids=template_ids)
+        filtered_df, query_error = _apply_query(filtered_df, query, log_store)
+        filtered_df = apply_table_query(filtered_df, filter_query, log_store)
+        records, page_count = log_store.page(filtered_df, page_current, page_size, sort_by)
+        export_links = create_export_links(
+            'errors', severity=severity, endpoint=endpoints, template_id=template_ids,
+            query=None if query_error else query, filter_query=filter_query
+        )
+        return records, page_count, export_links, query_error
+    
+    @app.callback(
+        [
+            Output("error-spike-graph", "figure"),
+            Output("suspects-table", "data"),
+            Output("suspect-timeline-graph", "figure")
+        ],
+        [
+            Input("spike-endpoint", "value"),
+            Input("error-spike-graph", "clickData")
+        ]
+    )
+    def investigate_error_spike(endpoint, click_data):
+        infra_store = mock_data["infra_store"]
+        error_rows = log_store.rows(severity=ERROR_SEVERITIES)
+        error_times = error_timestamps(log_store.frame(['timestamp', 'severity', 'endpoint'], error_rows), endpoint)
+        bins, counts = error_timeline(error_times, sampling_step(infra_store))
         
-        # Filter by severity if not 'all'
-        if severity != 'all':
-            filtered_df = filtered_df[filtered_df['severity'] == severity]
-            
-        # Filter by endpoints if any selected
-        if endpoints and len(endpoints) > 0:
-            filtered_df = filtered_df[filtered_df['endpoint'].isin(endpoints)]
-            
-        return filtered_df.to_dict('records')
+        # A clicked bar picks the spike; a new endpoint starts from its busiest bin
+        clicked = callback_context.triggered[0]["prop_id"] == "error-spike-graph.clickData"
+        if clicked and click_data:
+            spike_time = pd.Timestamp(click_data["points"][0]["x"])
+        else:
+            spike_time = find_spike(counts, bins)
+        
+        if spike_time is None:
+            suspects_df, timeline_df = rank_suspects([], infra_store, pd.Timestamp.now())
+        else:
+            suspects_df, timeline_df = rank_suspects(error_times, infra_store, spike_time)
+        
+        return (
+            create_error_spike_figure(bins, counts, spike_time),
+            create_suspect_records(suspects_df),
+            create_suspect_timeline_figure(timeline_df)
+        )
+    
+    # Endpoint dropdowns only hold the matches for what has been typed so far
+    endpoint_index = mock_data["endpoint_index"]
+    
+    @app.callback(
+        Output("endpoint-filter", "options"),
+        [Input("endpoint-filter", "search_value")],
+        [State("endpoint-filter", "value")]
+    )
+    def search_api_endpoints(search_value, value):
+        if not search_value:
+            raise PreventUpdate
+        return endpoint_index.options(search_value, selected=[value] if value else [])
+    
+    @app.callback(
+        Output("error-endpoint-filter", "options"),
+        [Input("error-endpoint-filter", "search_value")],
+        [State("error-endpoint-filter", "value")]
+    )
+    def search_error_endpoints(search_value, value):
+        if not search_value:
+            raise PreventUpdate
+        return endpoint_index.options(search_value, selected=value or [])
+    
+    @app.callback(
+        Output("spike-endpoint", "options"),
+        [Input("spike-endpoint", "search_value")],
+        [State("spike-endpoint", "value")]
+    )
+    def search_spike_endpoints(search_value, value):
+        if not search_value:
+            raise PreventUpdate
+        selected = [value] if value and value != 'all' else []
+        return [ALL_ENDPOINTS_OPTION] + endpoint_index.options(search_value, selected=selected)
     
     # API Metrics callbacks
     @app.callback(
@@ -124,28 +293,27 @@ def register_callbacks(app, mock_data):
             Output("time-series-graph", "figure"),
             Output("response-time-graph", "figure"),
             Output("error-rate-graph", "figure"),
-            Output("throughput-graph", "figure")
+            Output("throughput-graph", "figure"),
+            Output("latency-percentile-graph", "figure"),
+            Output("unique-users-graph", "figure")
+        ],
+        [
+            Input("apply-api-filters", "n_clicks"),
+            Input("time-series-graph", "relayoutData")
         ],
-        [Input("apply-api-filters", "n_clicks")],
         [
             State("endpoint-filter", "value"),
-            State("time-range", "value")
+            State("time-range", "value"),
+            State("time-range-custom", "value")
         ]
     )
-    def update_api_metrics(n_clicks, selected_endpoint, time_range):
-        # Filter by time range
-        now = datetime.now()
-        if time_range == '24h':
-            start_time = now - timedelta(days=1)
-        elif time_range == '3d':
-            start_time = now - timedelta(days=3)
-        else:  # 1w
-            start_time = now - timedelta(weeks=1)
+    def update_api_metrics(n_clicks, relayout_data, selected_endpoint, time_range, custom_range):
+        zoomed = _zoom_event("time-series-graph", relayout_data)
+        start_time, end_time = resolve_time_range(time_range, custom_range, zoomed)
             
-        filtered_df = api_df[api_df['timestamp'] >= start_time]
-        
-        # Create endpoint data for time series
-        endpoint_data = filtered_df[filtered_df['endpoint'] == selected_endpoint]
+        # Read the coarsest rollup tier that still resolves the range, bucketed to a bounded number of points
+        api_rollups = mock_data["api_rollups"]
+        endpoint_data = api_rollups.query(selected_endpoint, start_time, end_time, DEFAULT_MAX_POINTS)
         
         # Time series chart
         time_series_fig = go.Figure()
@@ -162,12 +330,12 @@ def register_callbacks(app, mock_data):
             yaxis_title='Response Time (ms)'
         )
         
+        # A zoom only refetches the slice shown in the time series
+        if zoomed is not None:
+            return time_series_fig, no_update, no_update, no_update, no_update, no_update
+        
         # Calculate average metrics for bar charts
-        avg_metrics = filtered_df.groupby('endpoint').agg({
-            'response_time': 'mean',
-            'error_rate': 'mean',
-            'throughput': 'mean'
-        }).reset_index()
+        avg_metrics = api_rollups.summary(start_time, end_time).rename_axis('endpoint').reset_index()
         
         # Bar charts
         response_time_fig = px.bar(
@@ -200,7 +368,14 @@ def register_callbacks(app, mock_data):
             color_continuous_scale=px.colors.sequential.Blues
         )
         
-        return time_series_fig, response_time_fig, error_rate_fig, throughput_fig
+        # Tail latency from merged hourly sketches rather than raw samples
+        percentile_fig = create_latency_percentile_figure(mock_data["latency_sketches"], start_time, end_time, aggregator)
+        unique_users_fig = create_unique_users_figure(mock_data["unique_users_by_endpoint"], start_time, end_time, aggregator)
+        
+        return (
+            time_series_fig, response_time_fig, error_rate_fig, throughput_fig,
+            percentile_fig, unique_users_fig
+        )
     
     # Infrastructure monitoring callbacks
     @app.callback(
@@ -212,23 +387,23 @@ def register_callbacks(app, mock_data):
         ],
         [
             Input("server-selector", "value"),
-            Input("time-range", "value")
+            Input("time-range", "value"),
+            Input("time-range-custom", "value"),
+            Input("cpu-trend-graph", "relayoutData"),
+            Input("memory-trend-graph", "relayoutData"),
+            Input("disk-trend-graph", "relayoutData"),
+            Input("network-trend-graph", "relayoutData")
         ]
     )
-    def update_infra_metrics(selected_server, time_range):
-        # Filter by time range
-        now = datetime.now()
-        if time_range == '24h':
-            start_time = now - timedelta(days=1)
-        elif time_range == '3d':
-            start_time = now - timedelta(days=3)
-        else:  # 1w
-            start_time = now - timedelta(weeks=1)
+    def update_infra_metrics(selected_server, time_range, custom_range, *relayouts):
+        # Zooming any of the trend charts refetches all four for the same slice
+        zoomed = None
+        for graph_id, relayout_data in zip(INFRA_TREND_GRAPHS, relayouts):
+            zoomed = zoomed or _zoom_event(graph_id, relayout_data)
+        start_time, end_time = resolve_time_range(time_range, custom_range, zoomed)
             
-        filtered_df = infra_df[infra_df['timestamp'] >= start_time]
-        
-        # Filter by server
-        server_data = filtered_df[filtered_df['server'] == selected_server].sort_values('timestamp')
+        # Read the coarsest rollup tier that still resolves the range, bucketed to a bounded number of points
+        server_data = mock_data["infra_rollups"].query(selected_server, start_time, end_time, DEFAULT_MAX_POINTS)
         
         # CPU Usage over time
         cpu_fig = px.line(
@@ -247,6 +422,7 @@ def register_callbacks(app, mock_data):
             title=f'Memory Usage Over Time - {selected_server}',
             labels={'memory_usage': 'Memory Usage (%)', 'timestamp': 'Time'}
         )
+        add_forecast_traces(memory_fig, mock_data["capacity_forecaster"], selected_server, 'memory_usage')
         
         # Disk Usage over time
         disk_fig = px.line(
@@ -256,6 +432,7 @@ def register_callbacks(app, mock_data):
             title=f'Disk Usage Over Time - {selected_server}',
             labels={'disk_usage': 'Disk Usage (%)', 'timestamp': 'Time'}
         )
+        add_forecast_traces(disk_fig, mock_data["capacity_forecaster"], selected_server, 'disk_usage')
         
         # Network IO over time
         network_fig = go.Figure()
@@ -284,25 +461,69 @@ def register_callbacks(app, mock_data):
         
         return cpu_fig, memory_fig, disk_fig, network_fig
     
+    @app.callback(
+        [
+            Output("fleet-heatmap", "figure"),
+            Output("hottest-servers-graph", "figure")
+        ],
+        [
+            Input("fleet-metric", "value"),
+            Input("fleet-sort", "value"),
+            Input("fleet-top-n", "value")
+        ]
+    )
+    def update_fleet_view(metric, sort_by, top_n):
+        # Sorting and top-N selection happen here so only the figures reach the browser
+        infra_store = mock_data["infra_store"]
+        return (
+            create_fleet_heatmap(infra_store, metric, sort_by),
+            create_hottest_servers_figure(infra_store, metric, top_n)
+        )
+    
+    @app.callback(
+        Output("server-selector", "value"),
+        [
+            Input("fleet-heatmap", "clickData"),
+            Input("hottest-servers-graph", "clickData")
+        ]
+    )
+    def select_clicked_server(heatmap_click, hottest_click):
+        # Clicking a single-server cell or bar drills into its trends
+        click = heatmap_click if callback_context.triggered[0]["prop_id"].startswith("fleet-heatmap") else hottest_click
+        if not click:
+            raise PreventUpdate
+        point = click["points"][0]
+        server = point.get("text") or point.get("y")
+        if server not in mock_data["infra_store"].rows:
+            raise PreventUpdate
+        return server
+    
     # User activity callbacks
     @app.callback(
-        Output("suspicious-table", "data"),
+        [
+            Output("suspicious-table", "data"),
+            Output("suspicious-export-links", "children")
+        ],
         [Input("apply-reason-filters", "n_clicks")],
         [State("reason-filter", "value")]
     )
     def filter_suspicious_activities(n_clicks, reasons):
-        activity_df = pd.DataFrame(mock_data["user_activities"])
-        suspicious_df = activity_df[activity_df['is_suspicious'] == True]
+        # Suspicious activities are flagged at ingest, so only that list is scanned
+        suspicious = mock_data["suspicious_activities"]
+        export_links = create_export_links('suspicious', reason=reasons)
         
-        if not reasons or len(reasons) == 0:
-            return suspicious_df.to_dict('records')
+        if not reasons or not suspicious:
+            return suspicious, export_links
             
-        filtered_df = suspicious_df[suspicious_df['reason'].isin(reasons)]
-        return filtered_df.to_dict('records')
+        filtered_df = apply_reason_filters(pd.DataFrame(suspicious), reasons)
+        return filtered_df.to_dict('records'), export_links
     
     # Alert management callbacks
     @app.callback(
-        Output("alerts-table", "data"),
+        [
+            Output("alerts-table", "data"),
+            Output("alert-export-links", "children")
+        ],
         [Input("apply-alert-filters", "n_clicks")],
         [
             State("status-filter", "value"),
@@ -310,15 +531,8 @@ def register_callbacks(app, mock_data):
         ]
     )
     def filter_alerts(n_clicks, status, priority):
-        filtered_df = alerts_df.copy()
-        
-        if status != 'all':
-            filtered_df = filtered_df[filtered_df['status'] == status]
-            
-        if priority != 'all':
-            filtered_df = filtered_df[filtered_df['priority'] == priority]
-            
-        return filtered_df.to_dict('records')
+        filtered_df = apply_alert_filters(_alerts_frame(mock_data["alerts"]), status, priority)
+        return filtered_df.to_dict('records'), create_export_links('alerts', status=status, priority=priority)
     
     # Placeholder callbacks for alert management buttons
     @app.callback(
@@ -334,7 +548,7 @@ def register_callbacks(app, mock_data):
         # with real backend logic in the actual implementation
         
         # Just return the current chart - in a real application this would update the data
-        alerts_by_status = alerts_df['status'].value_counts().reset_index()
+        alerts_by_status = _alerts_frame(mock_data["alerts"])['status'].value_counts().reset_index()
         alerts_by_status.columns = ['Status', 'Count']
         
         alerts_status_fig = px.bar(
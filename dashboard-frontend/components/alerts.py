@@ -3,6 +3,8 @@ import plotly.express as px
 import plotly.graph_objs as go
 import pandas as pd
 
+from components.export_links import create_export_links
+
 def create_alerts_layout(data):
     """
     Creates the layout for alerts visualization
@@ -222,6 +224,7 @@ def create_alerts_layout(data):
                             className="filter-button-inline"
                         ),
                     ], className="filters-inline"),
+                    html.Div(create_export_links('alerts'), id='alert-export-links', className="export-links"),
                     alerts_table,
                     
                     html.Div([
@@ -4,24 +4,72 @@ import plotly.graph_objs as go
 import pandas as pd
 from datetime import datetime, timedelta
 
+from data.endpoint_index import INITIAL_OPTIONS
+
+def create_latency_percentile_figure(latency_sketches, start_time=None, end_time=None, aggregator=None):
+    """
+    Creates a grouped bar chart of p50/p95/p99 latency per endpoint from merged sketches
+    """
+    percentiles = latency_sketches.percentiles(start_time, end_time, aggregator=aggregator)
+    percentile_df = pd.DataFrame(
+        [
+            {'endpoint': endpoint, 'percentile': label, 'response_time': value}
+            for endpoint, values in percentiles.items()
+            for label, value in zip(['p50', 'p95', 'p99'], values)
+        ],
+        columns=['endpoint', 'percentile', 'response_time']
+    )
+    
+    fig = px.bar(
+        percentile_df,
+        x='endpoint',
+        y='response_time',
+        color='percentile',
+        barmode='group',
+        title='Latency Percentiles by Endpoint',
+        labels={'response_time': 'Response Time (ms)', 'endpoint': 'API Endpoint', 'percentile': 'Percentile'},
+        color_discrete_map={
+            'p50': '#4CAF50',
+            'p95': '#FF9800',
+            'p99': '#F44336'
+        }
+    )
+    
+    return fig
+
+def create_unique_users_figure(unique_users_by_endpoint, start_time=None, end_time=None, aggregator=None):
+    """
+    Creates a bar chart of distinct users per endpoint from merged HyperLogLog sketches
+    """
+    counts = unique_users_by_endpoint.counts(start_time, end_time, aggregator=aggregator)
+    unique_users_df = pd.DataFrame(
+        list(counts.items()),
+        columns=['endpoint', 'unique_users']
+    ).sort_values('unique_users', ascending=False)
+    
+    fig = px.bar(
+        unique_users_df,
+        x='endpoint',
+        y='unique_users',
+        title='Unique Users by Endpoint',
+        labels={'unique_users': 'Unique Users', 'endpoint': 'API Endpoint'},
+        color_discrete_sequence=['#3F51B5']
+    )
+    
+    return fig
+
 def create_api_metrics_layout(data):
     """
     Creates the layout for API metrics visualization
     """
-    # Convert API metrics to DataFrame
-    api_df = pd.DataFrame(data["api_metrics"])
-    api_df['timestamp'] = pd.to_datetime(api_df['timestamp'])
+    api_rollups = data["api_rollups"]
     
     # Get the most recent day's data
-    last_day = api_df['timestamp'].max().date()
-    recent_data = api_df[api_df['timestamp'].dt.date == last_day]
+    last_day = api_rollups.latest.date()
+    last_day_start = datetime.combine(last_day, datetime.min.time())
     
-    # Calculate average metrics by endpoint for the recent data
-    avg_metrics = recent_data.groupby('endpoint').agg({
-        'response_time': 'mean',
-        'error_rate': 'mean',
-        'throughput': 'mean'
-    }).reset_index()
+    # Average metrics by endpoint for the recent data, from the hourly rollups
+    avg_metrics = api_rollups.summary(last_day_start).rename_axis('endpoint').reset_index()
     
     # Create response time bar chart
     response_time_fig = px.bar(
@@ -56,9 +104,17 @@ def create_api_metrics_layout(data):
         color_continuous_scale=px.colors.sequential.Blues
     )
     
+    # Tail latency for the most recent day from the hourly sketches
+    percentile_fig = create_latency_percentile_figure(data["latency_sketches"], last_day_start, aggregator=data["aggregator"])
+    overall_p95, overall_p99 = data["latency_sketches"].overall(last_day_start, aggregator=data["aggregator"]).quantiles([0.95, 0.99])
+    
+    # Distinct users for the most recent day from the hourly HyperLogLog sketches
+    unique_users_fig = create_unique_users_figure(data["unique_users_by_endpoint"], last_day_start, aggregator=data["aggregator"])
+    unique_users = data["unique_users_by_endpoint"].overall(last_day_start, aggregator=data["aggregator"]).count()
+    
     # Time series data for one selected endpoint
     default_endpoint = data["endpoints"][0]
-    endpoint_data = api_df[api_df['endpoint'] == default_endpoint]
+    endpoint_data = api_rollups.query(default_endpoint, api_rollups.latest - timedelta(weeks=1), api_rollups.latest)
     
     time_series_fig = go.Figure()
     
@@ -90,6 +146,14 @@ def create_api_metrics_layout(data):
                             html.H4(f"{avg_metrics['response_time'].mean():.1f} ms"),
                             html.P("Avg Response Time"),
                         ], className="summary-box response-time"),
+                        html.Div([
+                            html.H4(f"{overall_p95:.1f} ms"),
+                            html.P("p95 Response Time"),
+                        ], className="summary-box response-time"),
+                        html.Div([
+                            html.H4(f"{overall_p99:.1f} ms"),
+                            html.P("p99 Response Time"),
+                        ], className="summary-box response-time"),
                         html.Div([
                             html.H4(f"{avg_metrics['error_rate'].mean():.2f}%"),
                             html.P("Avg Error Rate"),
@@ -102,6 +166,10 @@ def create_api_metrics_layout(data):
                             html.H4(f"{len(data['endpoints'])}"),
                             html.P("Active Endpoints"),
                         ], className="summary-box endpoints"),
+                        html.Div([
+                            html.H4(f"{unique_users}"),
+                            html.P("Unique Users"),
+                        ], className="summary-box users"),
                     ], className="summary-container"),
                 ], className="card full-width"),
             ], className="row"),
@@ -115,7 +183,8 @@ def create_api_metrics_layout(data):
                             html.Label("Select Endpoint:"),
                             dcc.Dropdown(
                                 id='endpoint-filter',
-                                options=[{'label': ep, 'value': ep} for ep in data["endpoints"]],
+                                # Only the busiest endpoints ship with the page; typing fetches matches
+                                options=data["endpoint_index"].options(limit=INITIAL_OPTIONS, selected=[default_endpoint]),
                                 value=default_endpoint,
                                 className="filter-dropdown"
                             ),
@@ -128,11 +197,19 @@ def create_api_metrics_layout(data):
                                 options=[
                                     {'label': 'Last 24 Hours', 'value': '24h'},
                                     {'label': 'Last 3 Days', 'value': '3d'},
-                                    {'label': 'Last Week', 'value': '1w'}
+                                    {'label': 'Last Week', 'value': '1w'},
+                                    {'label': 'Custom', 'value': 'custom'}
                                 ],
                                 value='24h',
                                 className="radio-items"
                             ),
+                            dcc.Input(
+                                id='time-range-custom',
+                                type='text',
+                                placeholder='e.g. -6h, 2d or 2024-05-01 10:00 to 2024-05-01 12:00',
+                                debounce=True,
+                                className="search-box"
+                            ),
                         ], className="filter-item"),
                         
                         html.Button(
@@ -167,6 +244,28 @@ def create_api_metrics_layout(data):
                 ], className="column-right"),
             ], className="row"),
             
+            html.Div([
+                html.Div([
+                    html.Div([
+                        html.H3("Latency Percentiles"),
+                        dcc.Graph(
+                            id='latency-percentile-graph',
+                            figure=percentile_fig
+                        ),
+                    ], className="card"),
+                ], className="column-left"),
+                
+                html.Div([
+                    html.Div([
+                        html.H3("Unique Users by Endpoint"),
+                        dcc.Graph(
+                            id='unique-users-graph',
+                            figure=unique_users_fig
+                        ),
+                    ], className="card"),
+                ], className="column-right"),
+            ], className="row"),
+            
             # Charts Row 2
             html.Div([
                 html.Div([
@@ -2,20 +2,102 @@ from dash import html, dcc, dash_table
 import plotly.express as px
 import plotly.graph_objs as go
 import pandas as pd
+import numpy as np
+
+from components.export_links import create_export_links
+from components.query_box import create_query_box
+from data.correlation import bin_events, bin_width, find_spike, rank_suspects, sampling_step
+from data.endpoint_index import INITIAL_OPTIONS
+
+ALL_ENDPOINTS_OPTION = {'label': 'All Endpoints', 'value': 'all'}
+
+def error_timestamps(logs_df, endpoint=None):
+    """
+    Returns the int64 timestamps of error and critical logs, optionally for one endpoint
+    """
+    error_logs = logs_df[logs_df['severity'].isin(['ERROR', 'CRITICAL'])]
+    if endpoint and endpoint != 'all':
+        error_logs = error_logs[error_logs['endpoint'] == endpoint]
+    return pd.to_datetime(error_logs['timestamp']).values.astype(np.int64)
+
+def error_timeline(error_times, bin_ns):
+    """
+    Returns (bins, counts) of error timestamps on a fixed grid of bin_ns, widened so it has at most
+    DEFAULT_MAX_POINTS bins
+    """
+    if not len(error_times):
+        return pd.DatetimeIndex([]), np.zeros(0)
+    bin_ns = bin_width(error_times.max() - error_times.min() + 1, bin_ns)
+    start = error_times.min() // bin_ns * bin_ns
+    num_bins = int((error_times.max() - start) // bin_ns) + 1
+    bins = pd.to_datetime(start + np.arange(num_bins) * bin_ns)
+    return bins, bin_events(error_times, start, bin_ns, num_bins)
+
+def create_error_spike_figure(bins, counts, spike_time=None):
+    """
+    Creates the error count timeline used to pick a spike to investigate
+    """
+    fig = go.Figure(go.Bar(x=bins, y=counts, marker_color='#F44336', name='Errors'))
+    if spike_time is not None:
+        fig.add_vline(x=spike_time, line_dash='dash', line_color='#9C27B0')
+    fig.update_layout(
+        title='Errors Over Time (click a bar to investigate)',
+        xaxis_title='Time',
+        yaxis_title='Number of Errors'
+    )
+    return fig
+
+def create_suspect_timeline_figure(timeline_df):
+    """
+    Creates an overlay of the errors and top suspect series, each scaled to 0-1
+    """
+    fig = go.Figure()
+    for column in timeline_df.columns.drop('timestamp'):
+        series = timeline_df[column]
+        span = series.max() - series.min()
+        scaled = (series - series.min()) / span if span > 0 else series * 0
+        fig.add_trace(go.Scatter(
+            x=timeline_df['timestamp'],
+            y=scaled,
+            name=column,
+            line={'width': 3 if column == 'errors' else 1.5}
+        ))
+    fig.update_layout(
+        title='Errors vs Top Suspects (normalized)',
+        xaxis_title='Time',
+        yaxis_title='Scaled Value'
+    )
+    return fig
+
+def create_suspect_records(suspects_df):
+    """
+    Creates table rows for the ranked suspects
+    """
+    return [
+        {
+            'server': row.server,
+            'metric': row.metric,
+            'correlation': round(row.correlation, 3),
+            'lead_minutes': row.lead_minutes,
+        }
+        for row in suspects_df.itertuples(index=False)
+    ]
 
 def create_error_detection_layout(data):
     """
     Creates the layout for error detection visualization
     """
-    # Convert logs to DataFrame for easier manipulation
-    logs_df = pd.DataFrame(data["logs"])
+    # Columns of the log store; messages are only rebuilt for the rows the table shows
+    log_store = data["logs"]
     
-    # Filter for errors and critical logs
-    error_logs = logs_df[logs_df['severity'].isin(['ERROR', 'CRITICAL'])]
-    error_logs['date'] = pd.to_datetime(error_logs['timestamp']).dt.date
+    aggregator = data["aggregator"]
+    
+    # Error and critical logs, picked by the severity bitmaps
+    error_rows = log_store.rows(severity=['ERROR', 'CRITICAL'])
+    error_logs = log_store.frame(rows=error_rows)
     
     # Count errors by date
-    errors_by_date = error_logs.groupby(['date', 'severity']).size().reset_index(name='count')
+    errors_by_date = aggregator.group_by(log_store, ['date', 'severity'], error_rows)
     
     # Create line chart of errors over time
     error_trend_fig = px.line(
@@ -32,7 +114,7 @@ def create_error_detection_layout(data):
     )
     
     # Count errors by endpoint
-    errors_by_endpoint = error_logs.groupby(['endpoint', 'severity']).size().reset_index(name='count')
+    errors_by_endpoint = aggregator.group_by(log_store, ['endpoint', 'severity'], error_rows)
     errors_by_endpoint = errors_by_endpoint.sort_values('count', ascending=False)
     
     endpoint_error_fig = px.bar(
@@ -48,6 +130,53 @@ def create_error_detection_layout(data):
         }
     )
     
+    # Group errors by their mined template instead of by message text
+    miner = data["template_miner"]
+    template_counts = aggregator.group_by(log_store, ['template_id'], error_rows)
+    top_templates = template_counts.sort_values('count', ascending=False, kind='stable').head(10).reset_index(drop=True)
+    top_templates['template'] = top_templates['template_id'].map(miner.template)
+    
+    top_templates_fig = px.bar(
+        top_templates,
+        x='count',
+        y='template',
+        orientation='h',
+        title='Top Error Templates',
+        labels={'count': 'Number of Errors', 'template': 'Template'},
+        color_discrete_sequence=['#F44336']
+    )
+    top_templates_fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    
+    # Daily trend for the top templates
+    template_trend = aggregator.group_by(log_store, ['date', 'template_id'], error_rows)
+    template_trend = template_trend[template_trend['template_id'].isin(top_templates['template_id'])]
+    template_trend['template'] = template_trend['template_id'].map(miner.template)
+    
+    template_trend_fig = px.line(
+        template_trend,
+        x='date',
+        y='count',
+        color='template',
+        title='Error Template Trends',
+        labels={'count': 'Number of Errors', 'date': 'Date', 'template': 'Template'}
+    )
+    
+    # Default investigation: the busiest error bin across all endpoints
+    infra_store = data["infra_store"]
+    bin_ns = sampling_step(infra_store)
+    all_error_times = pd.to_datetime(error_logs['timestamp']).values.astype(np.int64)
+    spike_bins, spike_counts = error_timeline(all_error_times, bin_ns)
+    spike_time = find_spike(spike_counts, spike_bins)
+    error_spike_fig = create_error_spike_figure(spike_bins, spike_counts, spike_time)
+    
+    if spike_time is not None:
+        suspects_df, timeline_df = rank_suspects(all_error_times, infra_store, spike_time)
+    else:
+        suspects_df, timeline_df = rank_suspects([], infra_store, pd.Timestamp.now())
+    suspect_timeline_fig = create_suspect_timeline_figure(timeline_df)
+    
+    first_page, page_count = log_store.page(error_logs)
+    
     # Create table for error logs
     error_table = dash_table.DataTable(
         id='error-table',
@@ -56,10 +185,14 @@ def create_error_detection_layout(data):
             {"name": "Severity", "id": "severity"},
             {"name": "Endpoint", "id": "endpoint"},
             {"name": "User ID", "id": "user_id"},
+            {"name": "Template ID", "id": "template_id"},
             {"name": "Message", "id": "message"}
         ],
-        data=error_logs.to_dict('records'),
+        data=first_page,
+        page_action="custom",
+        page_current=0,
         page_size=10,
+        page_count=page_count,
         style_table={'overflowX': 'auto'},
         style_cell={
             'textAlign': 'left',
@@ -85,8 +218,8 @@ def create_error_detection_layout(data):
                 'fontWeight': 'bold'
             }
         ],
-        filter_action="native",
-        sort_action="native",
+        filter_action="custom",
+        sort_action="custom",
     )
     
     # Create layout
@@ -137,6 +270,86 @@ def create_error_detection_layout(data):
                 ], className="column-right"),
             ], className="row"),
             
+            html.Div([
+                html.Div([
+                    html.Div([
+                        html.H3("Top Error Templates"),
+                        dcc.Graph(
+                            id='top-templates-graph',
+                            figure=top_templates_fig
+                        ),
+                    ], className="card"),
+                ], className="column-left"),
+                
+                html.Div([
+                    html.Div([
+                        html.H3("Error Template Trends"),
+                        dcc.Graph(
+                            id='template-trend-graph',
+                            figure=template_trend_fig
+                        ),
+                    ], className="card"),
+                ], className="column-right"),
+            ], className="row"),
+            
+            # Spike investigation
+            html.Div([
+                html.Div([
+                    html.H3("Spike Investigation"),
+                    html.Div([
+                        html.Label("Endpoint:"),
+                        dcc.Dropdown(
+                            id='spike-endpoint',
+                            options=[ALL_ENDPOINTS_OPTION] + data["endpoint_index"].options(limit=INITIAL_OPTIONS),
+                            value='all',
+                            clearable=False,
+                            className="filter-dropdown-inline"
+                        ),
+                    ], className="filters-inline"),
+                    dcc.Graph(
+                        id='error-spike-graph',
+                        figure=error_spike_fig
+                    ),
+                ], className="card full-width"),
+            ], className="row"),
+            
+            html.Div([
+                html.Div([
+                    html.Div([
+                        html.H3("Suspected Causes"),
+                        dash_table.DataTable(
+                            id='suspects-table',
+                            columns=[
+                                {"name": "Server", "id": "server"},
+                                {"name": "Metric", "id": "metric"},
+                                {"name": "Correlation", "id": "correlation"},
+                                {"name": "Leads Errors By (min)", "id": "lead_minutes"}
+                            ],
+                            data=create_suspect_records(suspects_df),
+                            page_size=10,
+                            style_table={'overflowX': 'auto'},
+                            style_cell={
+                                'textAlign': 'left',
+                                'padding': '10px',
+                            },
+                            style_header={
+                                'backgroundColor': 'rgb(240, 240, 240)',
+                                'fontWeight': 'bold'
+                            },
+                        ),
+                    ], className="card"),
+                ], className="column-left"),
+                
+                html.Div([
+                    html.Div([
+                        dcc.Graph(
+                            id='suspect-timeline-graph',
+                            figure=suspect_timeline_fig
+                        ),
+                    ], className="card"),
+                ], className="column-right"),
+            ], className="row"),
+            
             html.Div([
                 html.Div([
                     html.H3("Error Logs"),
@@ -155,12 +368,25 @@ def create_error_detection_layout(data):
                         html.Label("Filter by Endpoint:"),
                         dcc.Dropdown(
                             id='error-endpoint-filter',
-                            options=[{'label': ep, 'value': ep} for ep in data["endpoints"]],
+                            options=data["endpoint_index"].options(limit=INITIAL_OPTIONS),
+                            multi=True,
+                            value=[],
+                            className="filter-dropdown-inline"
+                        ),
+                        html.Label("Filter by Template:"),
+                        dcc.Dropdown(
+                            id='error-template-filter',
+                            options=[
+                                {'label': row['template'], 'value': row['template_id']}
+                                for _, row in top_templates.iterrows()
+                            ],
                             multi=True,
                             value=[],
                             className="filter-dropdown-inline"
                         ),
                     ], className="filters-inline"),
+                    create_query_box('error'),
+                    html.Div(create_export_links('errors'), id='error-export-links', className="export-links"),
                     error_table,
                 ], className="card full-width"),
             ], className="row"),
@@ -0,0 +1,12 @@
+from dash import html
+
+from data.export import EXPORT_FORMATS, export_href
+
+def create_export_links(view, **filters):
+    """
+    Creates download links for a view in every export format, carrying the current filters
+    """
+    links = [html.Span("Export:", className="export-label")]
+    for fmt in EXPORT_FORMATS:
+        links.append(html.A(fmt.upper(), href=export_href(view, fmt, **filters), className="export-link"))
+    return links
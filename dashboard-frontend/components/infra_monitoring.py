@@ -1,60 +1,155 @@
-from dash import html, dcc
+from dash import html, dcc, dash_table
 import plotly.express as px
 import plotly.graph_objs as go
 import pandas as pd
+import numpy as np
 
-def create_infrastructure_monitoring_layout(data):
+FLEET_METRICS = {
+    'cpu_usage': 'CPU Usage (%)',
+    'memory_usage': 'Memory Usage (%)',
+    'disk_usage': 'Disk Usage (%)',
+    'network_in': 'Network In (Mbps)',
+    'network_out': 'Network Out (Mbps)',
+}
+PERCENT_METRICS = {'cpu_usage', 'memory_usage', 'disk_usage'}
+
+# Above this many servers, neighbouring servers share a heatmap cell
+FLEET_MAX_CELLS = 2500
+
+def create_fleet_heatmap(infra_store, metric='cpu_usage', sort_by='value', max_cells=FLEET_MAX_CELLS):
     """
-    Creates the layout for infrastructure monitoring visualization
+    Creates a single heatmap of the latest value of a metric across the whole fleet.
+    
+    Cells are laid out in a square grid, hottest first or by name, and once the
+    fleet exceeds max_cells each cell shows the hottest of a run of servers so
+    the figure size stays bounded.
     """
-    # Convert infrastructure metrics to DataFrame
-    infra_df = pd.DataFrame(data["infra_metrics"])
-    infra_df['timestamp'] = pd.to_datetime(infra_df['timestamp'])
+    latest = infra_store.latest(metric)
+    values = latest.values.astype(float)
+    names = np.asarray(latest.index, dtype=object)
     
-    # Get the most recent data
-    last_timestamp = infra_df['timestamp'].max()
-    recent_data = infra_df[infra_df['timestamp'] == last_timestamp]
+    if sort_by == 'name':
+        order = np.argsort(names, kind='stable')
+    else:
+        order = np.argsort(-np.nan_to_num(values, nan=-np.inf), kind='stable')
+    values, names = values[order], names[order]
     
-    # Create CPU usage gauge charts
-    cpu_gauges = []
+    num_servers = len(values)
+    group = max(1, -(-num_servers // max_cells))
+    num_cells = -(-num_servers // group)
+    padded = np.full(num_cells * group, np.nan)
+    padded[:num_servers] = values
+    cell_values = np.fmax.reduce(padded.reshape(num_cells, group), axis=1)
     
-    for server in data["servers"]:
-        server_data = recent_data[recent_data['server'] == server]
-        if not server_data.empty:
-            cpu_value = server_data['cpu_usage'].values[0]
-            
-            gauge = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=cpu_value,
-                domain={'x': [0, 1], 'y': [0, 1]},
-                title={'text': server},
-                gauge={
-                    'axis': {'range': [0, 100]},
-                    'bar': {'color': "#1f77b4"},
-                    'steps': [
-                        {'range': [0, 60], 'color': "lightgreen"},
-                        {'range': [60, 80], 'color': "lightyellow"},
-                        {'range': [80, 100], 'color': "lightcoral"}
-                    ],
-                    'threshold': {
-                        'line': {'color': "red", 'width': 4},
-                        'thickness': 0.75,
-                        'value': 90
-                    }
-                }
-            ))
-            
-            gauge.update_layout(height=200, margin=dict(l=10, r=10, t=50, b=10))
-            
-            cpu_gauges.append(
-                html.Div([
-                    dcc.Graph(figure=gauge, config={'displayModeBar': False})
-                ], className="gauge-chart")
-            )
+    if group == 1:
+        cell_labels = names
+    else:
+        firsts = names[::group]
+        lasts = names[np.minimum(np.arange(num_cells) * group + group, num_servers) - 1]
+        sizes = np.minimum(group, num_servers - np.arange(num_cells) * group)
+        cell_labels = np.array([
+            f"{first} … {last} ({size} servers)" for first, last, size in zip(firsts, lasts, sizes)
+        ], dtype=object)
+    
+    columns = max(1, int(np.ceil(np.sqrt(num_cells))))
+    rows = max(1, -(-num_cells // columns))
+    grid = np.full(rows * columns, np.nan)
+    grid[:num_cells] = cell_values
+    labels = np.full(rows * columns, "", dtype=object)
+    labels[:num_cells] = cell_labels
+    
+    zrange = {'zmin': 0, 'zmax': 100} if metric in PERCENT_METRICS else {}
+    fig = go.Figure(go.Heatmap(
+        z=grid.reshape(rows, columns),
+        text=labels.reshape(rows, columns),
+        hovertemplate='%{text}<br>%{z:.1f}<extra></extra>',
+        colorscale=[[0, 'lightgreen'], [0.6, 'lightyellow'], [0.8, 'lightcoral'], [1, 'red']],
+        colorbar={'title': FLEET_METRICS.get(metric, metric)},
+        xgap=1,
+        ygap=1,
+        **zrange
+    ))
+    fig.update_layout(
+        title=f'{FLEET_METRICS.get(metric, metric)} across {num_servers} servers',
+        xaxis={'visible': False},
+        yaxis={'visible': False, 'autorange': 'reversed'},
+        height=400,
+        margin=dict(l=10, r=10, t=50, b=10)
+    )
+    return fig
+
+def create_hottest_servers_figure(infra_store, metric='cpu_usage', top_n=10):
+    """
+    Creates a bar chart of the top-N servers by the latest value of a metric
+    """
+    hottest = infra_store.hottest(metric, top_n)
+    hottest_df = hottest.rename_axis('server').reset_index(name=metric)
+    
+    fig = px.bar(
+        hottest_df,
+        x=metric,
+        y='server',
+        orientation='h',
+        title=f'Top {top_n} Hottest Servers',
+        labels={metric: FLEET_METRICS.get(metric, metric), 'server': 'Server'},
+        color=metric,
+        color_continuous_scale=px.colors.sequential.Reds
+    )
+    fig.update_layout(yaxis={'autorange': 'reversed'})
+    return fig
+
+def add_forecast_traces(fig, forecaster, server, metric):
+    """
+    Adds the Holt-Winters and linear capacity forecasts for a server to a trend figure
+    """
+    forecast_df = forecaster.path(server, metric)
+    if forecast_df.empty:
+        return fig
+    
+    fig.add_trace(go.Scatter(
+        x=forecast_df['timestamp'],
+        y=forecast_df['holt_winters'],
+        name='Forecast (Holt-Winters)',
+        line={'dash': 'dash'}
+    ))
+    fig.add_trace(go.Scatter(
+        x=forecast_df['timestamp'],
+        y=forecast_df['linear'],
+        name='Forecast (linear trend)',
+        line={'dash': 'dot'}
+    ))
+    return fig
+
+def create_capacity_forecast_records(forecaster, n=10):
+    """
+    Creates table rows for the server metrics projected to fill up soonest
+    """
+    soonest = forecaster.soonest(n)
+    return [
+        {
+            'server': row.server,
+            'metric': FLEET_METRICS.get(row.metric, row.metric),
+            'current': round(row.current, 1),
+            'trend_per_day': round(row.trend_per_day, 2),
+            'hours_to_full': round(row.hours_to_full, 1),
+            'full_at': row.full_at.strftime('%Y-%m-%d %H:%M'),
+        }
+        for row in soonest.itertuples(index=False)
+    ]
+
+def create_infrastructure_monitoring_layout(data):
+    """
+    Creates the layout for infrastructure monitoring visualization
+    """
+    infra_store = data["infra_store"]
+    
+    # Whole-fleet overview built from one vectorized read of the latest values
+    fleet_fig = create_fleet_heatmap(infra_store)
+    hottest_fig = create_hottest_servers_figure(infra_store)
     
     # Create time series for a selected server
     default_server = data["servers"][0]
-    server_data = infra_df[infra_df['server'] == default_server].sort_values('timestamp')
+    server_data = data["infra_rollups"].query(default_server)
     
     # CPU Usage over time
     cpu_fig = px.line(
@@ -73,6 +168,7 @@ def create_infrastructure_monitoring_layout(data):
         title=f'Memory Usage Over Time - {default_server}',
         labels={'memory_usage': 'Memory Usage (%)', 'timestamp': 'Time'}
     )
+    add_forecast_traces(memory_fig, data["capacity_forecaster"], default_server, 'memory_usage')
     
     # Disk Usage over time
     disk_fig = px.line(
@@ -82,6 +178,7 @@ def create_infrastructure_monitoring_layout(data):
         title=f'Disk Usage Over Time - {default_server}',
         labels={'disk_usage': 'Disk Usage (%)', 'timestamp': 'Time'}
     )
+    add_forecast_traces(disk_fig, data["capacity_forecaster"], default_server, 'disk_usage')
     
     # Network IO over time
     network_fig = go.Figure()
@@ -131,20 +228,125 @@ def create_infrastructure_monitoring_layout(data):
                             options=[
                                 {'label': 'Last 24 Hours', 'value': '24h'},
                                 {'label': 'Last 3 Days', 'value': '3d'},
-                                {'label': 'Last Week', 'value': '1w'}
+                                {'label': 'Last Week', 'value': '1w'},
+                                {'label': 'Custom', 'value': 'custom'}
                             ],
                             value='24h',
                             className="radio-items"
                         ),
+                        dcc.Input(
+                            id='time-range-custom',
+                            type='text',
+                            placeholder='e.g. -6h, 2d or 2024-05-01 10:00 to 2024-05-01 12:00',
+                            debounce=True,
+                            className="search-box"
+                        ),
+                    ], className="filters-container"),
+                ], className="card full-width"),
+            ], className="row"),
+            
+            # Fleet overview
+            html.Div([
+                html.Div([
+                    html.H3("Fleet Overview"),
+                    html.Div([
+                        html.Div([
+                            html.Label("Metric:"),
+                            dcc.Dropdown(
+                                id='fleet-metric',
+                                options=[{'label': label, 'value': metric} for metric, label in FLEET_METRICS.items()],
+                                value='cpu_usage',
+                                clearable=False,
+                                className="filter-dropdown"
+                            ),
+                        ], className="filter-item"),
+                        
+                        html.Div([
+                            html.Label("Sort By:"),
+                            dcc.RadioItems(
+                                id='fleet-sort',
+                                options=[
+                                    {'label': 'Hottest First', 'value': 'value'},
+                                    {'label': 'Server Name', 'value': 'name'}
+                                ],
+                                value='value',
+                                className="radio-items"
+                            ),
+                        ], className="filter-item"),
+                        
+                        html.Div([
+                            html.Label("Hottest Servers:"),
+                            dcc.Dropdown(
+                                id='fleet-top-n',
+                                options=[{'label': f'Top {n}', 'value': n} for n in [10, 25, 50, 100]],
+                                value=10,
+                                clearable=False,
+                                className="filter-dropdown"
+                            ),
+                        ], className="filter-item"),
                     ], className="filters-container"),
                 ], className="card full-width"),
             ], className="row"),
             
-            # CPU Usage Gauges
             html.Div([
                 html.Div([
-                    html.H3("CPU Usage by Server"),
-                    html.Div(cpu_gauges, className="gauges-container"),
+                    html.Div([
+                        dcc.Graph(
+                            id='fleet-heatmap',
+                            figure=fleet_fig
+                        ),
+                    ], className="card"),
+                ], className="column-left"),
+                
+                html.Div([
+                    html.Div([
+                        dcc.Graph(
+                            id='hottest-servers-graph',
+                            figure=hottest_fig
+                        ),
+                    ], className="card"),
+                ], className="column-right"),
+            ], className="row"),
+            
+            # Capacity forecast
+            html.Div([
+                html.Div([
+                    html.H3("Capacity Forecast"),
+                    dash_table.DataTable(
+                        id='capacity-forecast-table',
+                        columns=[
+                            {"name": "Server", "id": "server"},
+                            {"name": "Metric", "id": "metric"},
+                            {"name": "Current (%)", "id": "current"},
+                            {"name": "Trend (%/day)", "id": "trend_per_day"},
+                            {"name": "Hours to Full", "id": "hours_to_full"},
+                            {"name": "Projected Full At", "id": "full_at"}
+                        ],
+                        data=create_capacity_forecast_records(data["capacity_forecaster"]),
+                        page_size=10,
+                        style_table={'overflowX': 'auto'},
+                        style_cell={
+                            'textAlign': 'left',
+                            'padding': '10px',
+                        },
+                        style_header={
+                            'backgroundColor': 'rgb(240, 240, 240)',
+                            'fontWeight': 'bold'
+                        },
+                        style_data_conditional=[
+                            {
+                                'if': {'filter_query': '{hours_to_full} <= 24'},
+                                'backgroundColor': 'rgba(244, 67, 54, 0.15)',
+                                'color': '#F44336'
+                            },
+                            {
+                                'if': {'filter_query': '{hours_to_full} > 24 && {hours_to_full} <= 72'},
+                                'backgroundColor': 'rgba(255, 152, 0, 0.15)',
+                                'color': '#FF9800'
+                            },
+                        ],
+                        sort_action="native",
+                    ),
                 ], className="card full-width"),
             ], className="row"),
             
@@ -4,16 +4,24 @@ import plotly.graph_objs as go
 import pandas as pd
 from datetime import datetime
 
+from components.export_links import create_export_links
+from components.query_box import create_query_box
+
 def create_log_classification_layout(data):
     """
     Creates the layout for log classification visualization
     """
-    # Convert logs to DataFrame for easier manipulation
-    logs_df = pd.DataFrame(data["logs"])
+    # Columns of the log store; messages are only rebuilt for the rows the table shows
+    log_store = data["logs"]
+    logs_df = log_store.frame()
     
-    # Classification distribution
-    classification_counts = logs_df['log_class'].value_counts().reset_index()
-    classification_counts.columns = ['Class', 'Count']
+    # Counts come from intersecting the class and severity bitmaps, weighting sampled rows by the logs they stand for
+    log_classes = sorted(log_store.dictionaries['log_class'].values)
+    severities = sorted(log_store.dictionaries['severity'].values)
+    classification_counts = pd.DataFrame({
+        'Class': log_classes,
+        'Count': [round(log_store.count(weighted=True, log_class=[cls])) for cls in log_classes],
+    })
     
     class_fig = px.pie(
         classification_counts,
@@ -25,7 +33,14 @@ def create_log_classification_layout(data):
     )
     
     # Classification by severity
-    class_by_severity = pd.crosstab(logs_df['log_class'], logs_df['severity'])
+    class_by_severity = pd.DataFrame(
+        [
+            [round(log_store.count(weighted=True, log_class=[cls], severity=[sev])) for sev in severities]
+            for cls in log_classes
+        ],
+        index=pd.Index(log_classes, name='log_class'),
+        columns=pd.Index(severities, name='severity')
+    )
     class_by_severity_fig = px.bar(
         class_by_severity,
         title='Log Classification by Severity',
@@ -38,6 +53,8 @@ def create_log_classification_layout(data):
         }
     )
     
+    first_page, page_count = log_store.page(logs_df)
+    
     # Create filterable data table for logs with classification
     table = dash_table.DataTable(
         id='classification-table',
@@ -48,8 +65,11 @@ def create_log_classification_layout(data):
             {"name": "Endpoint", "id": "endpoint"},
             {"name": "Message", "id": "message"}
         ],
-        data=logs_df.to_dict('records'),
+        data=first_page,
+        page_action="custom",
+        page_current=0,
         page_size=10,
+        page_count=page_count,
         style_table={'overflowX': 'auto'},
         style_cell={
             'textAlign': 'left',
@@ -75,8 +95,8 @@ def create_log_classification_layout(data):
                 'fontWeight': 'bold'
             }
         ],
-        filter_action="native",
-        sort_action="native",
+        filter_action="custom",
+        sort_action="custom",
     )
     
     # Create layout
@@ -148,12 +168,14 @@ def create_log_classification_layout(data):
                             className="filter-button"
                         ),
                     ], className="filters-container"),
+                    create_query_box('classification'),
                 ], className="card full-width"),
             ], className="row"),
             
             html.Div([
                 html.Div([
                     html.H3("Classified Logs"),
+                    html.Div(create_export_links('classification'), id='classification-export-links', className="export-links"),
                     table,
                 ], className="card full-width"),
             ], className="row"),
@@ -4,18 +4,19 @@ import plotly.graph_objs as go
 import pandas as pd
 from collections import Counter
 
+from components.export_links import create_export_links
+from components.query_box import create_query_box
+
 def create_log_ingestion_layout(data):
     """
     Creates the layout for log ingestion visualization
     """
-    # Convert logs to DataFrame for easier manipulation
-    logs_df = pd.DataFrame(data["logs"])
-    
-    # Add date column extracted from timestamp
-    logs_df['date'] = pd.to_datetime(logs_df['timestamp']).dt.date
+    # Columns of the log store; messages are only rebuilt for the rows the table shows
+    log_store = data["logs"]
     
-    # Count logs by date and severity
-    logs_by_date = logs_df.groupby(['date', 'severity']).size().reset_index(name='count')
+    # Count logs by date and severity, weighting sampled rows by the logs they stand for
+    logs_by_date = data["aggregator"].group_by(log_store, ['date', 'severity'], metrics=['weight'])
+    logs_by_date['count'] = logs_by_date.pop('weight').round()
     
     # Create bar chart of logs by severity over time
     log_volume_fig = px.bar(
@@ -33,9 +34,8 @@ def create_log_ingestion_layout(data):
         }
     )
     
-    # Count logs by endpoint
-    logs_by_endpoint = logs_df.groupby('endpoint').size().reset_index(name='count')
-    logs_by_endpoint = logs_by_endpoint.sort_values('count', ascending=False)
+    # Busiest endpoints from the heavy-hitter summaries, which count every log before sampling
+    logs_by_endpoint = pd.DataFrame(data["top_endpoints"].top(20), columns=['endpoint', 'count'])
     
     endpoint_fig = px.bar(
         logs_by_endpoint,
@@ -46,6 +46,9 @@ def create_log_ingestion_layout(data):
         labels={'count': 'Number of Logs', 'endpoint': 'API Endpoint'}
     )
     
+    # Newest logs first, paged on the server
+    first_page, page_count = log_store.page(log_store.frame(), newest_first=True)
+    
     # Create filterable data table for logs
     table = dash_table.DataTable(
         id='log-table',
@@ -56,8 +59,11 @@ def create_log_ingestion_layout(data):
             {"name": "User ID", "id": "user_id"},
             {"name": "Message", "id": "message"}
         ],
-        data=logs_df.tail(100).to_dict('records'),
+        data=first_page,
+        page_action="custom",
+        page_current=0,
         page_size=10,
+        page_count=page_count,
         style_table={'overflowX': 'auto'},
         style_cell={
             'textAlign': 'left',
@@ -87,8 +93,8 @@ def create_log_ingestion_layout(data):
                 'backgroundColor': 'rgba(255, 165, 0, 0.1)',
             }
         ],
-        filter_action="native",
-        sort_action="native",
+        filter_action="custom",
+        sort_action="custom",
     )
     
     # Create layout
@@ -140,6 +146,8 @@ def create_log_ingestion_layout(data):
                             className="search-box"
                         ),
                     ], className="search-container"),
+                    create_query_box('log'),
+                    html.Div(create_export_links('logs'), id='log-export-links', className="export-links"),
                     table,
                 ], className="card full-width"),
             ], className="row"),
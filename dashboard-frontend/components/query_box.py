@@ -0,0 +1,19 @@
+from dash import html, dcc
+
+QUERY_PLACEHOLDER = 'e.g. severity:ERROR AND endpoint:/api/payments* AND msg~"timeout" AND ts>-2h'
+
+def create_query_box(prefix):
+    """
+    Creates a log query input, applied on Enter, with a line for parse errors
+    """
+    return html.Div([
+        html.Label("Query:"),
+        dcc.Input(
+            id=f"{prefix}-query",
+            type="text",
+            debounce=True,
+            placeholder=QUERY_PLACEHOLDER,
+            className="search-box"
+        ),
+        html.Div(id=f"{prefix}-query-error", className="query-error"),
+    ], className="search-container")
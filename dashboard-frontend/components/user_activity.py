@@ -3,6 +3,9 @@ import plotly.express as px
 import plotly.graph_objs as go
 import pandas as pd
 
+from components.export_links import create_export_links
+from data.detection import SUSPICIOUS_REASONS
+
 def create_user_activity_layout(data):
     """
     Creates the layout for user activity tracking visualization
@@ -49,9 +52,8 @@ def create_user_activity_layout(data):
         color_discrete_sequence=['#ff7f0e']
     )
     
-    # Most active users
-    user_activity_counts = activity_df.groupby('user_id').size().reset_index(name='count')
-    top_users = user_activity_counts.sort_values('count', ascending=False).head(10)
+    # Most active users from the heavy-hitter summaries maintained at ingest
+    top_users = pd.DataFrame(data["top_users"].top(10), columns=['user_id', 'count'])
     
     users_fig = px.bar(
         top_users,
@@ -61,6 +63,59 @@ def create_user_activity_layout(data):
         labels={'count': 'Number of Activities', 'user_id': 'User ID'}
     )
     
+    # Distinct users and IPs from the hourly HyperLogLog sketches
+    unique_users_by_action = data["unique_users_by_action"]
+    unique_users = unique_users_by_action.overall().count()
+    unique_ips = data["unique_ips_by_action"].overall().count()
+    
+    unique_by_action = pd.DataFrame(
+        list(unique_users_by_action.counts().items()),
+        columns=['action', 'unique_users']
+    ).sort_values('unique_users', ascending=False)
+    
+    unique_action_fig = px.bar(
+        unique_by_action,
+        x='action',
+        y='unique_users',
+        title='Unique Users by Action',
+        labels={'unique_users': 'Unique Users', 'action': 'Action'},
+        color_discrete_sequence=['#3F51B5']
+    )
+    
+    # Most active IP addresses
+    top_ips = pd.DataFrame(data["top_ips"].top(10), columns=['ip_address', 'count'])
+    
+    ips_fig = px.bar(
+        top_ips,
+        x='ip_address',
+        y='count',
+        title='Top 10 Most Active IP Addresses',
+        labels={'count': 'Number of Activities', 'ip_address': 'IP Address'},
+        color_discrete_sequence=['#009688']
+    )
+    
+    # Session-level views from the activity sessionizer
+    sessions_df = data["session_tracker"].sessions()
+    
+    session_length_fig = px.histogram(
+        sessions_df,
+        x='duration_minutes',
+        nbins=30,
+        title='Session Length Distribution',
+        labels={'duration_minutes': 'Session Length (minutes)'},
+        color_discrete_sequence=['#3F51B5']
+    )
+    session_length_fig.update_layout(yaxis_title='Number of Sessions')
+    
+    session_actions_fig = px.histogram(
+        sessions_df,
+        x='events',
+        title='Actions per Session',
+        labels={'events': 'Actions'},
+        color_discrete_sequence=['#009688']
+    )
+    session_actions_fig.update_layout(yaxis_title='Number of Sessions')
+    
     # Create table for suspicious activities
     suspicious_table = dash_table.DataTable(
         id='suspicious-table',
@@ -115,7 +170,7 @@ def create_user_activity_layout(data):
                             html.P("Total Activities"),
                         ], className="summary-box total"),
                         html.Div([
-                            html.H4(f"{len(activity_df['user_id'].unique())}"),
+                            html.H4(f"{unique_users}"),
                             html.P("Unique Users"),
                         ], className="summary-box users"),
                         html.Div([
@@ -123,9 +178,17 @@ def create_user_activity_layout(data):
                             html.P("Suspicious Activities"),
                         ], className="summary-box suspicious"),
                         html.Div([
-                            html.H4(f"{len(activity_df['ip_address'].unique())}"),
+                            html.H4(f"{unique_ips}"),
                             html.P("Unique IP Addresses"),
                         ], className="summary-box ips"),
+                        html.Div([
+                            html.H4(f"{len(sessions_df)}"),
+                            html.P("Sessions"),
+                        ], className="summary-box total"),
+                        html.Div([
+                            html.H4(f"{sessions_df['duration_minutes'].mean():.1f} min"),
+                            html.P("Avg Session Length"),
+                        ], className="summary-box users"),
                     ], className="summary-container"),
                 ], className="card full-width"),
             ], className="row"),
@@ -174,6 +237,50 @@ def create_user_activity_layout(data):
                 ], className="column-right"),
             ], className="row"),
             
+            html.Div([
+                html.Div([
+                    html.Div([
+                        html.H3("Unique Users by Action"),
+                        dcc.Graph(
+                            id='unique-action-users-chart',
+                            figure=unique_action_fig
+                        ),
+                    ], className="card"),
+                ], className="column-left"),
+                
+                html.Div([
+                    html.Div([
+                        html.H3("Top Active IP Addresses"),
+                        dcc.Graph(
+                            id='top-ips-chart',
+                            figure=ips_fig
+                        ),
+                    ], className="card"),
+                ], className="column-right"),
+            ], className="row"),
+            
+            html.Div([
+                html.Div([
+                    html.Div([
+                        html.H3("Session Length"),
+                        dcc.Graph(
+                            id='session-length-chart',
+                            figure=session_length_fig
+                        ),
+                    ], className="card"),
+                ], className="column-left"),
+                
+                html.Div([
+                    html.Div([
+                        html.H3("Actions per Session"),
+                        dcc.Graph(
+                            id='session-actions-chart',
+                            figure=session_actions_fig
+                        ),
+                    ], className="card"),
+                ], className="column-right"),
+            ], className="row"),
+            
             html.Div([
                 html.Div([
                     html.H3("Suspicious Activities"),
@@ -181,8 +288,7 @@ def create_user_activity_layout(data):
                         html.Label("Filter by Reason:"),
                         dcc.Dropdown(
                             id='reason-filter',
-                            options=[{'label': reason, 'value': reason} 
-                                     for reason in suspicious_df['reason'].unique() if reason],
+                            options=[{'label': reason, 'value': reason} for reason in SUSPICIOUS_REASONS],
                             multi=True,
                             value=[],
                             className="filter-dropdown-inline"
@@ -193,6 +299,7 @@ def create_user_activity_layout(data):
                             className="filter-button-inline"
                         ),
                     ], className="filters-inline"),
+                    html.Div(create_export_links('suspicious'), id='suspicious-export-links', className="export-links"),
                     suspicious_table,
                 ], className="card full-width"),
             ], className="row"),
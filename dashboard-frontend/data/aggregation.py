@@ -0,0 +1,148 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Time buckets usable as group keys -> bucket width in nanoseconds
+TIME_KEYS = {
+    'date': 24 * 3600 * 10**9,
+    'hour': 3600 * 10**9,
+}
+
+# Partial results are dense arrays up to this many groups, and sorted (key, value) runs beyond it
+DENSE_GROUPS = 1 << 20
+
+# Metric -> ufunc that merges two partial values of it
+_MERGES = {'count': np.add, 'weight': np.add, 'first': np.minimum, 'last': np.maximum}
+
+
+def _reduce_runs(keys, values):
+    # Sorts by key and reduces each run of equal keys with the metric's merge
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(keys)) + 1] if len(keys) else np.zeros(0, dtype=np.int64)
+    return keys[starts], {
+        metric: _MERGES[metric].reduceat(column[order], starts) if len(starts) else column[:0]
+        for metric, column in values.items()
+    }
+
+
+class ParallelAggregator:
+    """
+    Partitioned group-by over the columns of a LogStore.
+
+    Rows are split into one partition per worker; each partition encodes its
+    group keys as integers and computes partial counts, weight sums and
+    first/last timestamps with NumPy kernels that release the GIL
+    (bincount, sort, reduceat), so the partitions run in parallel in a
+    thread pool without copying the columns. The partials are then merged
+    in the calling thread. map() also runs sketch merges over keys.
+    """
+
+    def __init__(self, max_workers=None, min_partition_rows=100000):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_partition_rows = min_partition_rows
+        self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="aggregate")
+
+    def map(self, function, items):
+        """
+        Applies function to every item in the pool, returning the results in order
+        """
+        items = list(items)
+        if len(items) <= 1 or self.max_workers == 1:
+            return [function(item) for item in items]
+        return list(self.executor.map(function, items))
+
+    def partitions(self, rows):
+        """
+        Splits a row count (as slices) or an array of row numbers into partitions, one per worker at most
+        """
+        size = rows if isinstance(rows, int) else len(rows)
+        count = max(1, min(self.max_workers, size // self.min_partition_rows))
+        bounds = np.linspace(0, size, count + 1).astype(np.int64).tolist()
+        if isinstance(rows, int):
+            return [slice(start, end) for start, end in zip(bounds, bounds[1:])]
+        return [rows[start:end] for start, end in zip(bounds, bounds[1:])]
+
+    def group_by(self, store, by, rows=None, metrics=('count',)):
+        """
+        Returns a DataFrame with one row per group of the by columns and the requested metrics.
+
+        by may name dictionary columns, template_id, or the 'date' and 'hour'
+        buckets of the timestamp. Metrics are 'count' (rows), 'weight' (sum
+        of sample weights), and 'first' and 'last' (earliest and latest
+        timestamp).
+        """
+        size = len(store)
+        parts = self.partitions(size if rows is None else np.asarray(rows, dtype=np.int64))
+        timestamps = store.timestamps.view()[:size]
+        keys = [self._key(store, column, timestamps, parts, size) for column in by]
+        groups = int(np.prod([radix for _, radix, _ in keys], dtype=np.int64))
+        dense = groups <= DENSE_GROUPS and not {'first', 'last'} & set(metrics)
+
+        def encode(part):
+            encoded = np.zeros(len(timestamps[part]), dtype=np.int64)
+            for codes, radix, _ in keys:
+                encoded = encoded * radix + codes(part)
+            return encoded
+
+        def partial(part):
+            encoded = encode(part)
+            if dense:
+                result = {'count': np.bincount(encoded, minlength=groups)}
+                if 'weight' in metrics:
+                    result['weight'] = np.bincount(encoded, store.weights.view()[:size][part], minlength=groups)
+                return result
+            values = {'count': np.ones(len(encoded), dtype=np.int64)}
+            if 'weight' in metrics:
+                values['weight'] = store.weights.view()[:size][part].astype(np.float64)
+            for metric in ('first', 'last'):
+                if metric in metrics:
+                    values[metric] = timestamps[part]
+            return _reduce_runs(encoded, values)
+
+        partials = self.map(partial, parts)
+        if dense:
+            merged = {metric: np.sum([result[metric] for result in partials], axis=0) for metric in partials[0]}
+            present = np.flatnonzero(merged['count'])
+            encoded = present
+            merged = {metric: column[present] for metric, column in merged.items()}
+        else:
+            encoded, merged = _reduce_runs(
+                np.concatenate([result[0] for result in partials]),
+                {metric: np.concatenate([result[1][metric] for result in partials]) for metric in partials[0][1]}
+            )
+
+        frame = {}
+        for column, (_, radix, labels) in reversed(list(zip(by, keys))):
+            frame[column] = labels(encoded % radix)
+            encoded = encoded // radix
+        frame = pd.DataFrame({column: frame[column] for column in by})
+        for metric in metrics:
+            values = merged[metric]
+            frame[metric] = pd.to_datetime(values) if metric in ('first', 'last') else values
+        return frame.sort_values(list(by), ignore_index=True)
+
+    def _key(self, store, column, timestamps, parts, size):
+        # Returns (codes of a partition, number of distinct codes, labels of codes) for one group column
+        if column in TIME_KEYS:
+            width = TIME_KEYS[column]
+            bounds = self.map(lambda part: (timestamps[part].min(), timestamps[part].max()) if len(timestamps[part]) else None, parts)
+            bounds = [bound for bound in bounds if bound is not None]
+            if not bounds:
+                return (lambda part: np.zeros(0, dtype=np.int64)), 1, (lambda codes: codes)
+            base = min(low for low, _ in bounds) // width
+            radix = int(max(high for _, high in bounds) // width - base + 1)
+            starts = lambda codes: pd.to_datetime((codes + base) * width)
+            labels = (lambda codes: starts(codes).date) if column == 'date' else starts
+            return (lambda part: timestamps[part] // width - base), radix, labels
+
+        if column == 'template_id':
+            template_ids = store.template_ids.view()[:size]
+            radix = max(self.map(lambda part: int(template_ids[part].max(initial=0)), parts)) + 1
+            return (lambda part: template_ids[part].astype(np.int64)), radix, (lambda codes: codes)
+
+        codes = store.codes[column].view()[:size]
+        values = store.dictionaries[column].array()
+        return (lambda part: codes[part].astype(np.int64)), max(1, len(values)), (lambda found: values[found])
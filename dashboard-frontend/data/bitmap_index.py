@@ -0,0 +1,187 @@
+import threading
+
+import numpy as np
+
+# Rows are split into chunks of 2**16; a chunk with more rows than ARRAY_LIMIT is stored as a bitset
+CHUNK_BITS = 16
+ARRAY_LIMIT = 4096
+
+_POPCOUNT16 = np.array([bin(value).count("1") for value in range(1 << 16)], dtype=np.uint8)
+
+
+def _popcount(words):
+    return int(_POPCOUNT16[words.view(np.uint16)].sum(dtype=np.int64))
+
+
+def _to_words(lows):
+    bits = np.zeros(1 << CHUNK_BITS, dtype=bool)
+    bits[lows] = True
+    return np.packbits(bits, bitorder='little').view(np.uint64)
+
+
+def _to_lows(words):
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder='little')).astype(np.uint16)
+
+
+def _container(values, cardinality=None):
+    # Dense containers are bitsets and sparse ones sorted arrays, whichever is smaller
+    if values.dtype == np.uint64:
+        cardinality = _popcount(values) if cardinality is None else cardinality
+        if cardinality <= ARRAY_LIMIT:
+            return _to_lows(values), cardinality
+        return values, cardinality
+    if len(values) > ARRAY_LIMIT:
+        return _to_words(values), len(values)
+    return values, len(values)
+
+
+def _and(left, right):
+    if left.dtype == np.uint64 and right.dtype == np.uint64:
+        return _container(left & right)
+    if left.dtype == np.uint64:
+        left, right = right, left
+    if right.dtype == np.uint64:
+        lows = left.astype(np.int64)
+        bits = (right[lows >> 6] >> (lows & 63).astype(np.uint64)) & np.uint64(1)
+        return _container(left[bits == 1])
+    return _container(np.intersect1d(left, right, assume_unique=True))
+
+
+def _or(left, right):
+    if left.dtype != np.uint64 and right.dtype != np.uint64:
+        return _container(np.union1d(left, right))
+    if left.dtype != np.uint64:
+        left = _to_words(left)
+    if right.dtype != np.uint64:
+        right = _to_words(right)
+    return _container(left | right)
+
+
+class RoaringBitmap:
+    """
+    Compressed set of row numbers in the style of Roaring bitmaps.
+
+    Rows are grouped by their high 16 bits; each group is a sorted uint16
+    array while sparse and a 1024-word bitset once it holds more than
+    ARRAY_LIMIT rows. Intersections and unions work chunk by chunk, and
+    the cardinality of each chunk is kept, so counting never looks at rows.
+    """
+
+    __slots__ = ("containers", "cardinalities")
+
+    def __init__(self, containers=None, cardinalities=None):
+        self.containers = containers or {}
+        self.cardinalities = cardinalities or {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        bitmap = cls()
+        bitmap.add_many(rows)
+        return bitmap
+
+    def add_many(self, rows):
+        """
+        Adds row numbers, given in ascending order
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        keys = rows >> CHUNK_BITS
+        lows = (rows & 0xFFFF).astype(np.uint16)
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        for key, chunk in zip(keys[np.r_[0, boundaries]].tolist(), np.split(lows, boundaries)):
+            existing = self.containers.get(key)
+            if existing is None:
+                self.containers[key], self.cardinalities[key] = _container(chunk)
+            else:
+                self.containers[key], self.cardinalities[key] = _or(existing, chunk)
+
+    def __len__(self):
+        return sum(self.cardinalities.values())
+
+    def __and__(self, other):
+        result = RoaringBitmap()
+        for key in self.containers.keys() & other.containers.keys():
+            container, cardinality = _and(self.containers[key], other.containers[key])
+            if cardinality:
+                result.containers[key], result.cardinalities[key] = container, cardinality
+        return result
+
+    def __or__(self, other):
+        result = RoaringBitmap(dict(self.containers), dict(self.cardinalities))
+        for key, container in other.containers.items():
+            if key in result.containers:
+                result.containers[key], result.cardinalities[key] = _or(result.containers[key], container)
+            else:
+                result.containers[key], result.cardinalities[key] = container, other.cardinalities[key]
+        return result
+
+    def to_array(self, size=None):
+        """
+        Returns the row numbers in ascending order, only those below size if given
+        """
+        parts = []
+        for key in sorted(self.containers):
+            if size is not None and key << CHUNK_BITS >= size:
+                break
+            container = self.containers[key]
+            lows = _to_lows(container) if container.dtype == np.uint64 else container
+            parts.append((key << CHUNK_BITS) + lows.astype(np.int64))
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+        return rows if size is None else rows[:np.searchsorted(rows, size)]
+
+    def to_mask(self, size):
+        # Rows appended after size was read may already be indexed
+        mask = np.zeros(size, dtype=bool)
+        mask[self.to_array(size)] = True
+        return mask
+
+    @property
+    def nbytes(self):
+        return sum(container.nbytes for container in self.containers.values())
+
+
+class BitmapIndex:
+    """
+    One RoaringBitmap per dictionary code of a column, kept up to date as rows are appended.
+
+    Appends come from the ingest writer and lookups from dashboard threads,
+    so both hold a lock while they touch the bitmaps' containers.
+    """
+
+    def __init__(self):
+        self.bitmaps = []
+        self._lock = threading.Lock()
+
+    def add(self, codes, first_row):
+        """
+        Indexes a batch of codes for the rows starting at first_row
+        """
+        codes = np.asarray(codes)
+        if not len(codes):
+            return
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+        with self._lock:
+            while len(self.bitmaps) <= sorted_codes[-1]:
+                self.bitmaps.append(RoaringBitmap())
+            # A stable sort keeps each code's rows in ascending order
+            for code, positions in zip(sorted_codes[np.r_[0, boundaries]].tolist(), np.split(order, boundaries)):
+                self.bitmaps[code].add_many(first_row + positions)
+
+    def lookup(self, codes):
+        """
+        Returns the union of the bitmaps of the given codes
+        """
+        result = RoaringBitmap()
+        with self._lock:
+            for code in codes:
+                if 0 <= code < len(self.bitmaps):
+                    result = result | self.bitmaps[code]
+        return result
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(bitmap.nbytes for bitmap in self.bitmaps)
@@ -0,0 +1,162 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from scipy import fft
+
+from data.time_range import DEFAULT_MAX_POINTS
+
+CORRELATION_METRICS = ['cpu_usage', 'memory_usage', 'network_in', 'network_out']
+
+SUSPECT_COLUMNS = ['server', 'metric', 'correlation', 'lead_minutes', 'samples']
+
+
+def sampling_step(store, sample=64):
+    """
+    Returns the typical interval between samples in a ring buffer store, in nanoseconds
+    """
+    times, _ = store.recent(store.metrics[0], sample)
+    present = (times[:, :-1] > 0) & (times[:, 1:] > 0)
+    steps = np.diff(times, axis=1)[present]
+    steps = steps[steps > 0]
+    return int(np.median(steps)) if len(steps) else 60 * 10**9
+
+
+def bin_width(span_ns, step_ns, max_points=DEFAULT_MAX_POINTS):
+    """
+    Returns the smallest whole multiple of step_ns that covers span_ns in at most max_points bins
+    """
+    step_ns = max(int(step_ns), 1)
+    return step_ns * max(1, -(-int(span_ns) // (step_ns * max(int(max_points), 1))))
+
+
+def bin_events(times, start, bin_ns, num_bins):
+    """
+    Counts event timestamps (int64 ns) into num_bins fixed bins from start
+    """
+    index = (np.asarray(times, dtype=np.int64) - start) // bin_ns
+    index = index[(index >= 0) & (index < num_bins)]
+    return np.bincount(index, minlength=num_bins).astype(np.float64)
+
+
+def bin_samples(times, values, start, bin_ns, num_bins):
+    """
+    Averages a (rows, samples) matrix into (rows, num_bins) fixed bins; empty bins are NaN
+    """
+    rows = np.broadcast_to(np.arange(times.shape[0])[:, None], times.shape)
+    index = (times - start) // bin_ns
+    keep = (index >= 0) & (index < num_bins) & ~np.isnan(values)
+    flat = rows[keep] * num_bins + index[keep]
+
+    size = times.shape[0] * num_bins
+    sums = np.bincount(flat, weights=values[keep], minlength=size)
+    counts = np.bincount(flat, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums / counts).reshape(times.shape[0], num_bins)
+
+
+def _standardize(matrix):
+    valid = ~np.isnan(matrix)
+    counts = np.maximum(valid.sum(axis=-1, keepdims=True), 1)
+    centered = np.where(valid, matrix - np.nansum(matrix, axis=-1, keepdims=True) / counts, 0)
+    std = np.sqrt((centered ** 2).sum(axis=-1, keepdims=True) / counts)
+    return np.divide(centered, std, out=np.zeros_like(centered), where=std > 0)
+
+
+def lagged_correlation(target, candidates, max_lag):
+    """
+    Cross-correlates one series against every row of a matrix at leads 0..max_lag.
+
+    All rows are correlated in a single batched FFT. A lead of k means the
+    candidate at time t - k lines up with the target at time t, so positive
+    leads are candidates that moved before the target did. Returns the
+    (rows, max_lag + 1) Pearson-style correlations and the leads.
+    """
+    length = len(target)
+    x = _standardize(np.asarray(target, dtype=np.float64)[None, :])[0]
+    y = _standardize(np.atleast_2d(candidates).astype(np.float64))
+
+    # Padding to length + max_lag is enough to keep the wanted leads free of wrap-around
+    leads = np.arange(min(max_lag, length - 1) + 1)
+    size = fft.next_fast_len(length + len(leads))
+    spectrum = fft.rfft(y, size, axis=1, workers=-1) * np.conj(fft.rfft(x, size))[None, :]
+    raw = fft.irfft(spectrum, size, axis=1, workers=-1)
+
+    # raw[k] = sum_t x[t] * y[t + k], so a lead of k sits at index -k
+    overlap = length - leads
+    return raw[:, (-leads) % size] / overlap[None, :], leads
+
+
+def find_spike(counts, bins):
+    """
+    Returns the time of the busiest bin, or None when there are no events
+    """
+    if not len(counts) or counts.max() <= 0:
+        return None
+    return bins[int(np.argmax(counts))]
+
+
+def rank_suspects(
+    error_times,
+    store,
+    spike_time,
+    window=timedelta(hours=24),
+    bin_size=None,
+    max_lag=6,
+    metrics=CORRELATION_METRICS,
+    top_n=10,
+    max_points=DEFAULT_MAX_POINTS,
+):
+    """
+    Ranks server metrics by how strongly they lead the errors around a spike.
+
+    Errors and every server's metrics are binned onto the same grid spanning
+    window either side of the spike, then correlated in one FFT batch. Bins
+    are the sampling step (or bin_size), widened so the grid has at most
+    about max_points bins whatever the window. Returns the suspects
+    DataFrame and a timeline of the error counts alongside the top suspects'
+    series for plotting.
+    """
+    step = sampling_step(store)
+    spike = pd.Timestamp(spike_time).value
+    window_ns = int(window.total_seconds() * 1e9)
+    bin_ns = bin_width(2 * window_ns, int(bin_size.total_seconds() * 1e9) if bin_size else step, max_points)
+    start = (spike - window_ns) // bin_ns * bin_ns
+    num_bins = max(2, (spike + window_ns - start) // bin_ns + 1)
+    bins = pd.to_datetime(start + np.arange(num_bins) * bin_ns)
+
+    errors = bin_events(error_times, start, bin_ns, num_bins)
+    timeline_df = pd.DataFrame({'timestamp': bins, 'errors': errors})
+    if not len(store) or errors.sum() == 0:
+        return pd.DataFrame(columns=SUSPECT_COLUMNS), timeline_df
+
+    # Only read back as many samples per server as reach the start of the window
+    latest = store.latest_timestamp().value
+    needed = min(store.capacity, max(1, (latest - start) // step + 2))
+
+    matrices, labels = [], []
+    for metric in metrics:
+        times, values = store.recent(metric, needed)
+        matrices.append(bin_samples(times, values, start, bin_ns, num_bins))
+        labels.extend((server, metric) for server in store.servers)
+    series = np.vstack(matrices)
+
+    correlations, leads = lagged_correlation(errors, series, max_lag)
+    best = np.argmax(np.abs(correlations), axis=1)
+    rows = np.arange(len(series))
+    best_corr = correlations[rows, best]
+
+    suspects_df = pd.DataFrame({
+        'server': [server for server, _ in labels],
+        'metric': [metric for _, metric in labels],
+        'correlation': best_corr,
+        'lead_minutes': leads[best] * bin_ns / 60e9,
+        'samples': (~np.isnan(series)).sum(axis=1),
+    }, columns=SUSPECT_COLUMNS)
+
+    top = suspects_df['correlation'].abs().sort_values(ascending=False).index[:top_n]
+    suspects_df = suspects_df.loc[top].reset_index(drop=True)
+    for index in top[:3]:
+        server, metric = labels[index]
+        timeline_df[f'{server} {metric}'] = series[index]
+    return suspects_df, timeline_df
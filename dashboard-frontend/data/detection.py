@@ -0,0 +1,217 @@
+from array import array
+from datetime import datetime
+
+REASON_FAILED_LOGINS = "Multiple failed login attempts"
+REASON_EXPORT_VOLUME = "Unusual data export volume"
+REASON_DELETIONS = "Multiple resource deletions"
+REASON_NEW_LOCATION = "Access from new location"
+REASON_ACCESS_TIME = "Unusual access time"
+
+SUSPICIOUS_REASONS = [
+    REASON_FAILED_LOGINS,
+    REASON_EXPORT_VOLUME,
+    REASON_DELETIONS,
+    REASON_NEW_LOCATION,
+    REASON_ACCESS_TIME,
+]
+
+
+class SlidingWindowCounter:
+    """
+    Event count over a sliding window, kept in a ring buffer of fixed-width slots.
+
+    Slots that fall out of the window are cleared as the head advances, so
+    each update is amortized O(1) and memory is one int per slot.
+    """
+
+    __slots__ = ("counts", "head", "total")
+
+    def __init__(self, num_slots):
+        self.counts = array("i", bytes(4 * num_slots))
+        self.head = None
+        self.total = 0
+
+    def add(self, tick, count=1):
+        """
+        Records events at the given slot tick and returns the count within the window
+        """
+        counts = self.counts
+        num_slots = len(counts)
+
+        if self.head is None:
+            self.head = tick
+        elif tick > self.head:
+            # Clear the slots the window slid past, at most one full turn
+            for expired in range(self.head + 1, min(tick, self.head + num_slots) + 1):
+                index = expired % num_slots
+                self.total -= counts[index]
+                counts[index] = 0
+            self.head = tick
+        elif tick <= self.head - num_slots:
+            # Too late to land inside the window
+            return self.total
+
+        counts[tick % num_slots] += count
+        self.total += count
+        return self.total
+
+
+class TimeWheel:
+    """
+    Hashed timing wheel that reports keys idle for longer than a ttl
+    """
+
+    def __init__(self, ttl_ticks):
+        self.slots = [set() for _ in range(ttl_ticks + 1)]
+        self.last_seen = {}
+        self.current = None
+
+    def touch(self, key, tick):
+        self.last_seen[key] = tick
+        self.slots[tick % len(self.slots)].add(key)
+
+    def advance(self, tick):
+        """
+        Moves the wheel to tick and returns the keys that have expired
+        """
+        if self.current is None:
+            self.current = tick
+            return []
+        if tick <= self.current:
+            return []
+
+        num_slots = len(self.slots)
+        ttl = num_slots - 1
+        expired = []
+        for step in range(self.current + 1, min(tick, self.current + num_slots) + 1):
+            slot = self.slots[step % num_slots]
+            for key in slot:
+                if self.last_seen.get(key, tick) <= tick - ttl:
+                    del self.last_seen[key]
+                    expired.append(key)
+            slot.clear()
+        self.current = tick
+        return expired
+
+
+class UserProfile:
+    """
+    Compact behavioural baseline for one user
+    """
+
+    __slots__ = ("hours", "locations", "events")
+
+    def __init__(self):
+        self.hours = array("I", bytes(4 * 24))
+        self.locations = []
+        self.events = 0
+
+
+class SuspiciousActivityDetector:
+    """
+    Streaming rules that derive suspicious-activity reasons from user events.
+
+    Windowed rules use per-user and per-IP sliding counters, and idle state is
+    dropped through timing wheels, so each event costs O(1) regardless of how
+    many users or IPs have been seen.
+    """
+
+    def __init__(
+        self,
+        slot_seconds=60,
+        failed_login_threshold=5,
+        failed_login_window=600,
+        export_threshold=5,
+        export_window=3600,
+        deletion_threshold=5,
+        deletion_window=3600,
+        quiet_hours=(0, 1, 2, 3, 4, 5),
+        min_history=5,
+        max_locations=4,
+        profile_ttl=7 * 24 * 3600,
+    ):
+        self.slot_seconds = slot_seconds
+        self.rules = {
+            "failed_login_user": (failed_login_window // slot_seconds, failed_login_threshold),
+            "failed_login_ip": (failed_login_window // slot_seconds, failed_login_threshold),
+            "export": (export_window // slot_seconds, export_threshold),
+            "deletion": (deletion_window // slot_seconds, deletion_threshold),
+        }
+        self.quiet_hours = set(quiet_hours)
+        self.min_history = min_history
+        self.max_locations = max_locations
+
+        self.windows = {}
+        self.profiles = {}
+        max_window = max(num_slots for num_slots, _ in self.rules.values())
+        self.window_wheel = TimeWheel(max_window)
+        self.profile_wheel = TimeWheel(profile_ttl // slot_seconds)
+
+    def process(self, record):
+        """
+        Updates the detector with one activity record and returns a reason if it is suspicious
+        """
+        moment = record["timestamp"]
+        if isinstance(moment, str):
+            moment = datetime.fromisoformat(moment)
+        tick = int(moment.timestamp()) // self.slot_seconds
+        self._expire(tick)
+
+        user_id = record["user_id"]
+        ip_address = record["ip_address"]
+        action = record["action"]
+        reason = None
+
+        if action == "login" and record.get("status") == "failed":
+            by_user = self._count("failed_login_user", user_id, tick)
+            by_ip = self._count("failed_login_ip", ip_address, tick)
+            if by_user or by_ip:
+                reason = REASON_FAILED_LOGINS
+        elif action == "export_data":
+            if self._count("export", user_id, tick):
+                reason = REASON_EXPORT_VOLUME
+        elif action == "delete_resource":
+            if self._count("deletion", user_id, tick):
+                reason = REASON_DELETIONS
+
+        profile_reason = self._update_profile(user_id, ip_address, moment.hour, tick)
+        return reason or profile_reason
+
+    def _count(self, rule, key, tick):
+        num_slots, threshold = self.rules[rule]
+        window_key = (rule, key)
+        window = self.windows.get(window_key)
+        if window is None:
+            window = self.windows[window_key] = SlidingWindowCounter(num_slots)
+        self.window_wheel.touch(window_key, tick)
+        return window.add(tick) >= threshold
+
+    def _update_profile(self, user_id, ip_address, hour, tick):
+        profile = self.profiles.get(user_id)
+        if profile is None:
+            profile = self.profiles[user_id] = UserProfile()
+        self.profile_wheel.touch(user_id, tick)
+
+        # Treat the /16 network as the location of an address
+        location = ip_address.rsplit(".", 2)[0]
+
+        reason = None
+        if profile.events >= self.min_history:
+            if location not in profile.locations:
+                reason = REASON_NEW_LOCATION
+            elif hour in self.quiet_hours and profile.hours[hour] == 0:
+                reason = REASON_ACCESS_TIME
+
+        if location in profile.locations:
+            profile.locations.remove(location)
+        profile.locations.append(location)
+        del profile.locations[:-self.max_locations]
+        profile.hours[hour] += 1
+        profile.events += 1
+        return reason
+
+    def _expire(self, tick):
+        for window_key in self.window_wheel.advance(tick):
+            self.windows.pop(window_key, None)
+        for user_id in self.profile_wheel.advance(tick):
+            self.profiles.pop(user_id, None)
@@ -0,0 +1,104 @@
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+# Number of endpoints offered in a dropdown before anything is typed
+INITIAL_OPTIONS = 10
+
+
+class EndpointIndex:
+    """
+    Sorted prefix index over endpoint names, ranked by traffic.
+
+    Every endpoint is indexed under its full path and under each suffix that
+    starts at a path segment, so "ord" finds "/api/orders/{id}". A query is
+    two binary searches over the sorted keys, and the matches are ranked by
+    request count with a partial sort, so lookups stay fast with tens of
+    thousands of routes. The ingest writer adds endpoints while dashboard
+    threads search, so both hold a lock.
+    """
+
+    def __init__(self, endpoints=()):
+        self.endpoints = []
+        self.ids = {}
+        self.traffic = np.zeros(0, dtype=np.int64)
+        self._keys = []
+        self._key_ids = np.zeros(0, dtype=np.int64)
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.add_many(endpoints)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def add_many(self, endpoints, counts=None):
+        """
+        Adds endpoints, or adds to their traffic when they are already indexed
+        """
+        endpoints = list(endpoints)
+        with self._lock:
+            ids = np.fromiter((self._id(endpoint) for endpoint in endpoints), dtype=np.int64, count=len(endpoints))
+            if len(self.traffic) < len(self.endpoints):
+                self.traffic = np.concatenate([
+                    self.traffic, np.zeros(len(self.endpoints) - len(self.traffic), dtype=np.int64)
+                ])
+            if counts is not None:
+                np.add.at(self.traffic, ids, np.asarray(counts, dtype=np.int64))
+
+    def add_traffic(self, endpoints):
+        """
+        Counts one request for each endpoint in the list
+        """
+        self.add_many(endpoints, np.ones(len(endpoints), dtype=np.int64))
+
+    def search(self, query, limit=20):
+        """
+        Returns up to limit endpoints matching the query, busiest first
+        """
+        query = (query or "").strip().lower()
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+
+            if not query:
+                ids = np.arange(len(self.endpoints))
+            else:
+                lo = bisect_left(self._keys, query)
+                hi = bisect_left(self._keys, query + "\uffff", lo)
+                ids = np.unique(self._key_ids[lo:hi])
+
+            if len(ids) > limit:
+                # Partial selection of the busiest, then a sort of just those
+                ids = ids[np.argpartition(-self.traffic[ids], limit - 1)[:limit]]
+            ids = ids[np.lexsort((ids, -self.traffic[ids]))]
+            return [self.endpoints[i] for i in ids]
+
+    def options(self, query=None, limit=20, selected=()):
+        """
+        Returns dropdown options for the matches, keeping selected values in the list
+        """
+        matches = self.search(query, limit)
+        extra = [value for value in selected if value not in matches]
+        return [{'label': endpoint, 'value': endpoint} for endpoint in extra + matches]
+
+    def _id(self, endpoint):
+        endpoint_id = self.ids.get(endpoint)
+        if endpoint_id is None:
+            endpoint_id = self.ids[endpoint] = len(self.endpoints)
+            self.endpoints.append(endpoint)
+            self._dirty = True
+        return endpoint_id
+
+    def _rebuild(self):
+        entries = []
+        for endpoint_id, endpoint in enumerate(self.endpoints):
+            name = endpoint.lower()
+            entries.append((name, endpoint_id))
+            for position, char in enumerate(name):
+                if char == "/" and position + 1 < len(name):
+                    entries.append((name[position + 1:], endpoint_id))
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._key_ids = np.array([endpoint_id for _, endpoint_id in entries], dtype=np.int64)
+        self._dirty = False
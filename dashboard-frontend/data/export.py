@@ -0,0 +1,234 @@
+import io
+from datetime import datetime
+from urllib.parse import urlencode
+
+import pandas as pd
+
+from data.filters import (
+    apply_table_query, filter_alerts, filter_classified_logs, filter_error_logs, filter_suspicious_activities
+)
+from data.log_query import compile_query
+from data.log_store import LogStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+EXPORT_CHUNK_SIZE = 50000
+
+
+class ExportError(ValueError):
+    """
+    Raised for export query parameters that cannot be read, before anything is streamed
+    """
+
+
+def _date_args(args):
+    start_date, end_date = args.get('start_date'), args.get('end_date')
+    for value in (start_date, end_date):
+        try:
+            if value:
+                datetime.strptime(value[:10], '%Y-%m-%d')
+        except ValueError:
+            raise ExportError(f"Invalid date {value!r}, expected YYYY-MM-DD") from None
+    return start_date, end_date
+
+
+def _int_args(args, name):
+    try:
+        return [int(value) for value in args.getlist(name)]
+    except ValueError:
+        raise ExportError(f"{name} must be an integer") from None
+
+
+def _with_table_query(args, logs, apply_filter):
+    filter_query = args.get('filter_query')
+    if not filter_query:
+        return apply_filter
+    # Tried on an empty frame of the store's columns so a bad comparison value fails before streaming starts
+    try:
+        apply_table_query(logs.frame(rows=slice(0, 0)), filter_query)
+    except ValueError as error:
+        raise ExportError(f"Invalid filter_query: {error}") from error
+    message_masks = {}
+    return lambda frame: apply_table_query(apply_filter(frame), filter_query, logs, message_masks)
+
+
+def _with_mask(compute_mask, apply_filter):
+    masks = []
+
+    def apply(frame):
+        # Computed once over the whole store, on the first chunk, after the chunks were read from it
+        if not masks:
+            masks.append(compute_mask())
+        return apply_filter(frame[masks[0][frame.index.to_numpy()]])
+    return apply
+
+
+def _with_query(args, logs, apply_filter):
+    apply_filter = _with_table_query(args, logs, apply_filter)
+    if not args.get('query'):
+        return apply_filter
+    # Parsed up front so a bad query fails before streaming starts
+    query = compile_query(args['query'])
+    return _with_mask(lambda: query.mask(logs), apply_filter)
+
+
+def _log_filters(args, logs):
+    search = args.get('search')
+    if not search:
+        return _with_query(args, logs, lambda frame: frame)
+    return _with_query(args, logs, _with_mask(lambda: logs.contains(search), lambda frame: frame))
+
+
+def _classification_filters(args, logs):
+    start_date, end_date = _date_args(args)
+    return _with_query(args, logs, lambda frame: filter_classified_logs(
+        frame, args.getlist('class'), args.getlist('severity'), start_date, end_date
+    ))
+
+
+def _error_filters(args, logs):
+    template_ids = _int_args(args, 'template_id')
+    return _with_query(args, logs, lambda frame: filter_error_logs(
+        frame, args.get('severity', 'all'), args.getlist('endpoint'), template_ids
+    ))
+
+
+def _suspicious_filters(args, activities):
+    return lambda frame: filter_suspicious_activities(frame, args.getlist('reason'))
+
+
+def _alert_filters(args, alerts):
+    return lambda frame: filter_alerts(frame, args.get('status', 'all'), args.get('priority', 'all'))
+
+
+# View name -> (key of the records in the data dict, builder of the chunk filter from query args and the records);
+# builders raise ExportError or QueryError for bad arguments
+EXPORT_VIEWS = {
+    'logs': ("logs", _log_filters),
+    'classification': ("logs", _classification_filters),
+    'errors': ("logs", _error_filters),
+    'suspicious': ("suspicious_activities", _suspicious_filters),
+    'alerts': ("alerts", _alert_filters),
+}
+
+
+def export_href(view, fmt='csv', **params):
+    """
+    Returns the export URL for a view with the given filter values as query parameters
+    """
+    params = {key: value for key, value in params.items() if value not in (None, '', [])}
+    query = urlencode(params, doseq=True)
+    return f"/export/{view}.{fmt}" + (f"?{query}" if query else "")
+
+
+def iter_frames(records, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields DataFrames over consecutive slices of a list of records or a LogStore
+    """
+    if isinstance(records, LogStore):
+        yield from records.iter_frames(chunk_size)
+        return
+
+    for offset in range(0, len(records), chunk_size):
+        frame = pd.DataFrame(records[offset:offset + chunk_size])
+        if 'timestamp' in frame:
+            frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+        yield frame
+
+
+def stream_csv(frames):
+    header = True
+    for frame in frames:
+        if len(frame) or header:
+            yield frame.to_csv(index=False, header=header, date_format='%Y-%m-%d %H:%M:%S').encode()
+            header = False
+
+
+def stream_ndjson(frames):
+    for frame in frames:
+        if len(frame):
+            lines = frame.to_json(orient='records', lines=True, date_format='iso')
+            yield (lines if lines.endswith("\n") else lines + "\n").encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file object that hands back what was written since the last drain
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_parquet(frames):
+    """
+    Writes each frame as a Parquet row group and yields the bytes as they are produced
+    """
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+
+    for frame in frames:
+        # Object columns become nullable strings so every chunk shares one schema
+        frame = frame.astype({column: 'string' for column in frame.columns[frame.dtypes == object]})
+        if writer is None:
+            schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            writer = pq.ParquetWriter(sink, schema)
+        if len(frame):
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            yield sink.drain()
+
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+    'parquet': stream_parquet,
+}
+
+
+def export_view(data, view, fmt, args, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Returns a generator of the encoded, filtered rows of a view, one chunk at a time.
+
+    The arguments are all read before the generator is returned, so a bad one
+    raises ExportError or QueryError here rather than partway through a response.
+    """
+    source, build_filter = EXPORT_VIEWS[view]
+    records = data[source]
+    apply_filter = build_filter(args, records)
+    frames = (apply_filter(frame) for frame in iter_frames(records, chunk_size))
+    if isinstance(records, LogStore):
+        # Messages are rebuilt only for the rows that passed the filters
+        frames = (records.with_messages(frame) for frame in frames)
+    return STREAMERS[fmt](frames)
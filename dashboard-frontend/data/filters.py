@@ -0,0 +1,171 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data.log_query import compile_query
+
+ERROR_SEVERITIES = ['ERROR', 'CRITICAL']
+
+# DataTable filter operators, longest spelling first so ">=" is not read as ">"
+_TABLE_OPERATORS = [
+    ('>=', 'ge'), ('<=', 'le'), ('!=', 'ne'), ('>', 'gt'), ('<', 'lt'), ('=', 'eq'),
+    ('ge ', 'ge'), ('le ', 'le'), ('ne ', 'ne'), ('gt ', 'gt'), ('lt ', 'lt'), ('eq ', 'eq'),
+    ('ieq ', 'eq'), ('seq ', 'eq'), ('ine ', 'ne'), ('sne ', 'ne'),
+    ('contains ', 'contains'), ('icontains ', 'contains'), ('scontains ', 'contains'),
+    ('datestartswith ', 'datestartswith'),
+]
+
+
+def search_logs(logs_df, search_term, log_store=None):
+    """
+    Keeps logs whose message, endpoint, request path or user id contains the search term.
+
+    Frames from a LogStore have no message column; pass the store to search it.
+    """
+    if not search_term:
+        return logs_df
+
+    if log_store is not None:
+        return logs_df[log_store.contains(search_term)[logs_df.index.to_numpy()]]
+
+    matches = (
+        logs_df['message'].str.contains(search_term, case=False, regex=False) |
+        logs_df['endpoint'].str.contains(search_term, case=False, regex=False) |
+        logs_df['user_id'].str.contains(search_term, case=False, regex=False)
+    )
+    if 'path' in logs_df:
+        matches |= logs_df['path'].str.contains(search_term, case=False, regex=False)
+    return logs_df[matches]
+
+
+def query_logs(logs_df, query, log_store):
+    """
+    Keeps logs matching a query such as 'severity:ERROR AND msg~"timeout" AND ts>-2h'.
+
+    The query is compiled once and evaluated on the store's columns for the
+    rows of logs_df only; raises QueryError if it cannot be parsed.
+    """
+    if not query or not query.strip():
+        return logs_df
+    return logs_df[compile_query(query).mask(log_store, logs_df.index.to_numpy())]
+
+
+def filter_classified_logs(logs_df, classes=None, severities=None, start_date=None, end_date=None):
+    """
+    Keeps logs of the given classes and severities within the date range (dates as YYYY-MM-DD)
+    """
+    if classes:
+        logs_df = logs_df[logs_df['log_class'].isin(classes)]
+
+    if severities:
+        logs_df = logs_df[logs_df['severity'].isin(severities)]
+
+    if start_date and end_date:
+        start_date = datetime.strptime(start_date[:10], '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date[:10], '%Y-%m-%d').date()
+        logs_df = logs_df[
+            (logs_df['timestamp'].dt.date >= start_date) &
+            (logs_df['timestamp'].dt.date <= end_date)
+        ]
+
+    return logs_df
+
+
+def filter_error_logs(logs_df, severity='all', endpoints=None, template_ids=None):
+    """
+    Keeps error and critical logs, optionally narrowed by severity, endpoint and template
+    """
+    logs_df = logs_df[logs_df['severity'].isin(ERROR_SEVERITIES)]
+
+    if severity and severity != 'all':
+        logs_df = logs_df[logs_df['severity'] == severity]
+
+    if endpoints:
+        logs_df = logs_df[logs_df['endpoint'].isin(endpoints)]
+
+    if template_ids:
+        logs_df = logs_df[logs_df['template_id'].isin(template_ids)]
+
+    return logs_df
+
+
+def filter_suspicious_activities(activities_df, reasons=None):
+    """
+    Keeps suspicious activities flagged for one of the given reasons
+    """
+    if reasons:
+        activities_df = activities_df[activities_df['reason'].isin(reasons)]
+    return activities_df
+
+
+def filter_alerts(alerts_df, status='all', priority='all'):
+    """
+    Keeps alerts with the given status and priority
+    """
+    if status and status != 'all':
+        alerts_df = alerts_df[alerts_df['status'] == status]
+
+    if priority and priority != 'all':
+        alerts_df = alerts_df[alerts_df['priority'] == priority]
+
+    return alerts_df
+
+
+def _split_table_filter(part):
+    # The operator follows the {column} name, so a value may contain operator characters
+    name, _, rest = part.strip().partition('}')
+    rest = rest.lstrip()
+    for spelling, operator in _TABLE_OPERATORS:
+        if rest.startswith(spelling):
+            name = name[name.find('{') + 1:]
+            value = rest[len(spelling):].strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"`":
+                value = value[1:-1].replace('\\' + value[0], value[0])
+            return name, operator, value
+    return None, None, None
+
+
+def apply_table_query(logs_df, filter_query, log_store=None, message_masks=None):
+    """
+    Applies a DataTable filter_query, such as '{severity} = ERROR && {message} contains timeout'.
+
+    Pass a dict as message_masks to keep the store-wide message matches between
+    calls over chunks of the same store, so each term is only searched once.
+    """
+    for part in (filter_query or "").split(' && '):
+        column, operator, value = _split_table_filter(part)
+        if column is None or (column not in logs_df and (column != 'message' or log_store is None)):
+            continue
+
+        if column == 'message' and operator == 'contains' and log_store is not None:
+            if message_masks is None:
+                matches = log_store.message_contains(value)
+            elif value in message_masks:
+                matches = message_masks[value]
+            else:
+                matches = message_masks[value] = log_store.message_contains(value)
+            logs_df = logs_df[matches[logs_df.index.to_numpy()]]
+            continue
+        if column == 'message' and log_store is not None:
+            values = pd.Series(log_store.messages(logs_df.index.to_numpy()), index=logs_df.index)
+        else:
+            values = logs_df[column]
+
+        if operator == 'contains':
+            keep = values.astype(str).str.contains(value, case=False, regex=False)
+        elif operator == 'datestartswith':
+            keep = values.astype(str).str.startswith(value)
+        else:
+            if pd.api.types.is_datetime64_any_dtype(values):
+                value = pd.Timestamp(value)
+            elif pd.api.types.is_numeric_dtype(values):
+                value = pd.to_numeric(value, errors='coerce')
+            keep = {
+                'eq': values == value, 'ne': values != value,
+                'lt': values < value, 'le': values <= value,
+                'gt': values > value, 'ge': values >= value,
+            }[operator]
+        logs_df = logs_df[np.asarray(keep, dtype=bool)]
+
+    return logs_df
@@ -0,0 +1,197 @@
+import numpy as np
+
+from data.aggregation import ParallelAggregator
+from data.detection import SuspiciousActivityDetector
+from data.endpoint_index import EndpointIndex
+from data.forecasting import CapacityForecaster
+from data.log_query import compile_query, query_cache_nbytes
+from data.log_store import LogStore
+from data.memory import MemoryBudget
+from data.route_normalizer import RouteNormalizer
+from data.rollups import TieredMetricStore
+from data.sampling import AdaptiveLogSampler
+from data.sessions import SessionTracker
+from data.sketches import DistinctCountStore, HeavyHitterStore, LatencySketchStore
+from data.template_miner import LogTemplateMiner
+from data.timeseries import INFRA_METRICS, RingBufferStore
+
+API_METRICS = ['response_time', 'error_rate', 'throughput']
+
+# Stores counted against the memory budget, in the order they are asked to spill
+MEMORY_STORES = [
+    'logs', 'latency_sketches', 'unique_users_by_endpoint', 'unique_users_by_action', 'unique_ips_by_action',
+    'top_endpoints', 'top_users', 'top_ips', 'infra_store', 'infra_rollups', 'api_rollups'
+]
+
+
+def init_ingest_state(data):
+    """
+    Creates the derived stores and replays the records already in data through them
+    """
+    data["aggregator"] = ParallelAggregator()
+    data["template_miner"] = LogTemplateMiner()
+    data["log_sampler"] = AdaptiveLogSampler()
+    data["route_normalizer"] = RouteNormalizer(data.get("routes", data["endpoints"]))
+    data["endpoint_index"] = EndpointIndex(data["endpoints"])
+    data["latency_sketches"] = LatencySketchStore()
+    data["unique_users_by_endpoint"] = DistinctCountStore()
+    data["unique_users_by_action"] = DistinctCountStore()
+    data["unique_ips_by_action"] = DistinctCountStore()
+    data["top_endpoints"] = HeavyHitterStore()
+    data["top_users"] = HeavyHitterStore()
+    data["top_ips"] = HeavyHitterStore()
+    data["suspicious_detector"] = SuspiciousActivityDetector()
+    data["suspicious_activities"] = []
+    data["session_tracker"] = SessionTracker()
+    data["infra_store"] = RingBufferStore()
+    # Raw infra samples stay in the ring buffers, as far back as they reach; only the rollup tiers live here
+    data["infra_rollups"] = TieredMetricStore(
+        INFRA_METRICS,
+        keep_raw=False,
+        raw_reader=data["infra_store"].window,
+        raw_since=data["infra_store"].retained_since
+    )
+    data["api_rollups"] = TieredMetricStore(API_METRICS)
+    data["capacity_forecaster"] = CapacityForecaster()
+
+    # Logs are kept in a columnar store with template-compressed messages
+    logs, data["logs"] = data["logs"], LogStore()
+    init_memory_budget(data)
+    ingest_logs(data, logs)
+
+    # Metric samples are kept by the tiered stores rather than as raw lists
+    ingest_api_metrics(data, data.pop("api_metrics"))
+    ingest_infra_metrics(data, data.pop("infra_metrics"))
+    refresh_capacity_forecasts(data)
+
+    # The detector's sliding windows expect events in time order
+    user_activities, data["user_activities"] = data["user_activities"], []
+    user_activities.sort(key=lambda record: record["timestamp"])
+    ingest_user_activities(data, user_activities)
+
+    return data
+
+
+def init_memory_budget(data):
+    """
+    Registers the stores and caches with a memory budget, unlimited until a limit is set
+    """
+    budget = data["memory_budget"] = MemoryBudget()
+    for name in MEMORY_STORES:
+        budget.register(name, data[name])
+
+    route_normalizer, miner = data["route_normalizer"], data["template_miner"]
+    budget.register_cache("route_cache", lambda: route_normalizer.cache_nbytes, route_normalizer.clear_cache)
+    budget.register_cache("template_cache", lambda: miner.cache_nbytes, miner.clear_cache)
+    budget.register_cache("query_cache", query_cache_nbytes, compile_query.cache_clear)
+    return budget
+
+
+def ingest_logs(data, records):
+    """
+    Appends log records to the log store and updates every structure derived from them
+    """
+    miner = data["template_miner"]
+
+    # Raw paths are kept for search; everything downstream groups by route template
+    paths = [record["endpoint"] for record in records]
+    endpoints = data["route_normalizer"].normalize_many(paths)
+    timestamps = [record["timestamp"] for record in records]
+    severities = [record["severity"] for record in records]
+    user_ids = [record["user_id"] for record in records]
+
+    # The summaries see every log; only the stored rows are sampled
+    data["unique_users_by_endpoint"].add_many(endpoints, timestamps, user_ids)
+    data["top_endpoints"].add_many(severities, timestamps, endpoints)
+    data["endpoint_index"].add_traffic(endpoints)
+
+    keep, weights = data["log_sampler"].sample(endpoints, severities, timestamps)
+    kept = np.flatnonzero(keep).tolist()
+    messages = [records[i]["message"] for i in kept]
+    template_ids = miner.add_messages(messages)
+
+    columns = {
+        'timestamp': [timestamps[i] for i in kept],
+        'severity': [severities[i] for i in kept],
+        'endpoint': [endpoints[i] for i in kept],
+        'path': [paths[i] for i in kept],
+        'user_id': [user_ids[i] for i in kept],
+        'log_class': [records[i]["log_class"] for i in kept],
+        'template_id': template_ids,
+        'weight': weights,
+    }
+    # Templates are read after the whole batch is mined, so each covers every message that joined it
+    data["logs"].append(columns, messages, [miner.clusters[template_id].tokens for template_id in template_ids])
+
+
+def ingest_api_metrics(data, records):
+    """
+    Adds API metric records to the tiered store and the per-endpoint latency sketches
+    """
+    endpoints = data["route_normalizer"].normalize_many([record["endpoint"] for record in records])
+    timestamps = [record["timestamp"] for record in records]
+    for record, template in zip(records, endpoints):
+        record["endpoint"] = template
+
+    data["latency_sketches"].add_many(endpoints, timestamps, [record["response_time"] for record in records])
+    data["api_rollups"].add_many(
+        endpoints,
+        timestamps,
+        {metric: [record.get(metric) for record in records] for metric in API_METRICS}
+    )
+
+
+def ingest_infra_metrics(data, records):
+    """
+    Adds infrastructure samples to the per-server ring buffers and rollup tiers
+    """
+    servers = [record["server"] for record in records]
+    timestamps = [record["timestamp"] for record in records]
+    values = {metric: [record.get(metric) for record in records] for metric in INFRA_METRICS}
+
+    data["infra_store"].append_many(servers, timestamps, values)
+    data["infra_rollups"].add_many(servers, timestamps, values)
+
+
+def refresh_capacity_forecasts(data):
+    """
+    Refits the fleet capacity forecasts and replaces the predictive alerts they raised last time
+    """
+    forecaster = data["capacity_forecaster"]
+    forecaster.fit(data["infra_rollups"])
+
+    previous = {id(alert) for alert in data.get("predictive_alerts", [])}
+    data["predictive_alerts"] = forecaster.alerts()
+    data["alerts"] = [alert for alert in data["alerts"] if id(alert) not in previous]
+    data["alerts"].extend(data["predictive_alerts"])
+
+
+def ingest_user_activities(data, records):
+    """
+    Appends user activity records, flags suspicious ones and updates the sketches
+    """
+    detector = data["suspicious_detector"]
+    suspicious = data["suspicious_activities"]
+
+    for record in records:
+        record["reason"] = detector.process(record)
+        record["is_suspicious"] = record["reason"] is not None
+        if record["is_suspicious"]:
+            suspicious.append(record)
+
+    actions = [record["action"] for record in records]
+    timestamps = [record["timestamp"] for record in records]
+    user_ids = [record["user_id"] for record in records]
+    ip_addresses = [record["ip_address"] for record in records]
+    data["unique_users_by_action"].add_many(actions, timestamps, user_ids)
+    data["unique_ips_by_action"].add_many(actions, timestamps, ip_addresses)
+    data["top_users"].add_many(actions, timestamps, user_ids)
+    data["top_ips"].add_many(actions, timestamps, ip_addresses)
+
+    # Sessions idle for longer than the gap, as of the newest event ingested, are closed
+    session_tracker = data["session_tracker"]
+    session_tracker.add_batch(user_ids, timestamps)
+    if session_tracker.latest is not None:
+        session_tracker.expire(session_tracker.latest)
+
+    data["user_activities"].extend(records)
@@ -0,0 +1,303 @@
+import math
+import queue
+import threading
+import time
+import traceback
+import zlib
+from collections import Counter, deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data.ingest import (
+    API_METRICS, ingest_api_metrics, ingest_infra_metrics, ingest_logs, ingest_user_activities,
+    refresh_capacity_forecasts
+)
+from data.timeseries import INFRA_METRICS
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+# Record kind -> (ingest function, fields every record must carry)
+INGEST_KINDS = {
+    'logs': (ingest_logs, ('timestamp', 'severity', 'endpoint', 'user_id', 'message', 'log_class')),
+    'api_metrics': (ingest_api_metrics, ('timestamp', 'endpoint', 'response_time')),
+    'infra_metrics': (ingest_infra_metrics, ('timestamp', 'server')),
+    'user_activities': (ingest_user_activities, ('timestamp', 'user_id', 'action', 'ip_address')),
+}
+
+# Fields that must be strings or numbers whenever a record carries them
+STRING_FIELDS = {'severity', 'endpoint', 'user_id', 'message', 'log_class', 'server', 'action', 'ip_address'}
+NUMBER_FIELDS = set(API_METRICS) | set(INFRA_METRICS)
+
+# Largest accepted batch once decompressed, so a small gzip body cannot expand without bound
+MAX_BATCH_BYTES = 64 * 1024 * 1024
+
+
+class BatchError(ValueError):
+    """
+    Raised when a batch cannot be decoded or is missing required fields
+    """
+
+
+def decode_batch(body, gzipped=False, max_bytes=MAX_BATCH_BYTES):
+    """
+    Decodes an optionally gzip'd NDJSON body into a list of records with a single parser call
+    """
+    if gzipped or body[:2] == b"\x1f\x8b":
+        try:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = decompressor.decompress(body, max_bytes)
+        except zlib.error as error:
+            raise BatchError(f"Invalid gzip body: {error}")
+        if decompressor.unconsumed_tail:
+            raise BatchError(f"Batch is larger than {max_bytes} bytes")
+        if not decompressor.eof:
+            # A body cut short would otherwise lose the records after the last complete line
+            raise BatchError("Truncated gzip body")
+    elif len(body) > max_bytes:
+        raise BatchError(f"Batch is larger than {max_bytes} bytes")
+
+    # Joining the lines into one array lets the decoder parse the whole batch at once
+    lines = [line for line in body.split(b"\n") if line.strip()]
+    try:
+        records = _json.loads(b"[" + b",".join(lines) + b"]")
+    except ValueError as error:
+        raise BatchError(f"Invalid NDJSON: {error}")
+
+    if not all(isinstance(record, dict) for record in records):
+        raise BatchError("Every line must be a JSON object")
+    return records
+
+
+def encode_batch(records):
+    """
+    Encodes records as NDJSON, the inverse of decode_batch
+    """
+    # Timestamps read back from Parquet snapshots are written as strings
+    lines = (_json.dumps(record, default=str) for record in records)
+    if _json.__name__ == "json":
+        lines = (line.encode() for line in lines)
+    return b"\n".join(lines)
+
+
+def parse_timestamps(values):
+    """
+    Parses ISO 8601 strings and datetimes into naive datetimes, with offsets converted to UTC;
+    anything else becomes NaT
+    """
+    values = pd.Series([value if isinstance(value, (str, datetime)) else None for value in values], dtype=object)
+    return pd.to_datetime(values, errors='coerce', utc=True, format='ISO8601').dt.tz_localize(None)
+
+
+def format_timestamps(timestamps):
+    """
+    Formats parsed timestamps as uniform ISO 8601 strings, which the stores parse far quicker than datetimes
+    """
+    values = timestamps.to_numpy()
+    whole_seconds = not (values.astype(np.int64) % 10**9).any()
+    return np.datetime_as_string(values, unit='s' if whole_seconds else 'us').tolist()
+
+
+def validate_batch(kind, records):
+    """
+    Checks that every record carries the fields its kind requires with the right types, and rewrites
+    timestamps in one ISO 8601 form, so a batch never fails halfway through ingest
+    """
+    _, fields = INGEST_KINDS[kind]
+    # Fields are checked a column at a time, which is much quicker than record by record
+    checked = set(fields) | ((STRING_FIELDS | NUMBER_FIELDS) & set().union(*records))
+    columns = {field: [record.get(field) for record in records] for field in checked}
+    incomplete = [values.index(None) for field, values in columns.items() if field in fields and None in values]
+    if incomplete:
+        number = min(incomplete)
+        missing = [field for field in fields if records[number].get(field) is None]
+        raise BatchError(f"Record {number + 1} is missing {', '.join(missing)}")
+
+    # Bools are not numbers here
+    for field, allowed, expected in (
+        *((field, (str, type(None)), "a string") for field in STRING_FIELDS & columns.keys()),
+        *((field, (int, float, type(None)), "a number") for field in NUMBER_FIELDS & columns.keys()),
+    ):
+        values = columns[field]
+        if not set(map(type, values)) <= set(allowed):
+            number = next(i for i, value in enumerate(values, 1) if type(value) not in allowed)
+            raise BatchError(f"Record {number}: {field} must be {expected}")
+
+    timestamps = parse_timestamps(columns['timestamp'])
+    invalid = timestamps.isna().to_numpy()
+    if invalid.any():
+        raise BatchError(f"Record {invalid.argmax() + 1} has an invalid timestamp")
+    for record, timestamp in zip(records, format_timestamps(timestamps)):
+        record["timestamp"] = timestamp
+
+
+class IngestPipeline:
+    """
+    Bounded queue of record batches drained by a single writer thread.
+
+    Request handlers only decode and enqueue; the writer coalesces whatever is
+    queued into one bulk ingest per record kind, so the stores are updated
+    from one thread with large vectorized batches. Batches must have passed
+    validate_batch before they are submitted. When the queue is full,
+    submit() refuses the batch so the route can answer 429 instead of
+    buffering without limit. With a write-ahead log attached, every
+    accepted batch is appended to it before it is queued.
+    """
+
+    def __init__(self, data, wal=None, max_batches=256, throughput_window=60, forecast_interval=300):
+        self.data = data
+        self.wal = wal
+        self.queue = queue.Queue(max_batches)
+        self.throughput_window = throughput_window
+        self.forecast_interval = forecast_interval
+        self.ingested = Counter()
+        self.rejected = 0
+        self.failed = 0
+        self._history = deque()
+        self._started_at = None
+        self._forecast_at = time.monotonic()
+        self._submitted = 0
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        self._started_at = time.monotonic()
+        threading.Thread(target=self._loop, name="ingest-writer", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def submit(self, kind, records, payload=None):
+        """
+        Queues a batch and returns its sequence number, or None when the queue is full.
+
+        payload is the batch's NDJSON body, if the caller already has it, for the write-ahead log.
+        """
+        if self.wal is not None and payload is None:
+            payload = encode_batch(records)
+
+        with self._submit_lock:
+            # Only the writer takes from the queue, so it cannot fill up between the check and the put
+            if self.queue.full():
+                with self._lock:
+                    self.rejected += 1
+                return None
+            if self.wal is not None:
+                sequence = self.wal.append(kind, payload)
+            else:
+                self._submitted += 1
+                sequence = self._submitted
+            self.queue.put_nowait((kind, records))
+        return sequence
+
+    def wait_durable(self, sequence, timeout=None):
+        """
+        Blocks until a submitted batch is in the write-ahead log on disk; returns False on timeout
+        """
+        return self.wal is None or self.wal.wait(sequence, timeout)
+
+    def events_per_second(self, now=None):
+        """
+        Returns the ingest rate over the throughput window
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._trim(now)
+            events = sum(count for _, count in self._history)
+        elapsed = min(self.throughput_window, now - (self._started_at or now))
+        return events / elapsed if elapsed > 0 else 0.0
+
+    def retry_after(self):
+        """
+        Returns the seconds a rejected client should wait, from the queue depth and recent rate
+        """
+        rate = self.events_per_second()
+        queued = sum(len(records) for _, records in list(self.queue.queue))
+        return max(1, math.ceil(queued / rate)) if rate > 0 else 1
+
+    def stats(self):
+        with self._lock:
+            ingested = dict(self.ingested)
+            rejected, failed = self.rejected, self.failed
+        return {
+            'queued_batches': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'ingested': ingested,
+            'rejected_batches': rejected,
+            'failed_batches': failed,
+            'late_infra_samples': self.data["infra_store"].late,
+            'events_per_second': round(self.events_per_second(), 1),
+        }
+
+    def drain(self, timeout=None):
+        """
+        Ingests everything queued, waiting up to timeout for the first batch; returns the event count
+        """
+        try:
+            batches = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return 0
+        while True:
+            try:
+                batches.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        by_kind = {}
+        for kind, records in batches:
+            by_kind.setdefault(kind, []).append(records)
+
+        total = 0
+        for kind, kind_batches in by_kind.items():
+            # Batches were validated when accepted, so the merged call cannot fail on one of them halfway through
+            merged = [record for records in kind_batches for record in records]
+            if self._ingest(kind, merged):
+                total += len(merged)
+
+        now = time.monotonic()
+        with self._lock:
+            self._history.append((now, total))
+            self._trim(now)
+
+        if 'infra_metrics' in by_kind and now - self._forecast_at >= self.forecast_interval:
+            refresh_capacity_forecasts(self.data)
+            self._forecast_at = now
+
+        # Growth is checked once per drain; over the budget, caches are dropped and cold columns spilled
+        self.data["memory_budget"].enforce()
+        return total
+
+    def _ingest(self, kind, records):
+        # Returns whether the records were ingested; failures are counted per call
+        ingest, _ = INGEST_KINDS[kind]
+        if kind == 'user_activities':
+            # The detector's sliding windows expect events in time order
+            records = sorted(records, key=lambda record: record["timestamp"])
+        try:
+            ingest(self.data, records)
+        except Exception:
+            traceback.print_exc()
+            with self._lock:
+                self.failed += 1
+            return False
+        with self._lock:
+            self.ingested[kind] += len(records)
+        return True
+
+    def _trim(self, now):
+        while self._history and now - self._history[0][0] > self.throughput_window:
+            self._history.popleft()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.drain(timeout=1)
+            except Exception:
+                # A bad batch must not stop the writer
+                traceback.print_exc()
@@ -0,0 +1,435 @@
+import fnmatch
+import operator
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache, reduce
+
+import numpy as np
+import pandas as pd
+
+# Field names accepted in queries -> log store column
+QUERY_FIELDS = {
+    'severity': 'severity', 'sev': 'severity', 'level': 'severity',
+    'endpoint': 'endpoint', 'ep': 'endpoint', 'route': 'endpoint',
+    'path': 'path',
+    'user': 'user_id', 'user_id': 'user_id',
+    'class': 'log_class', 'log_class': 'log_class',
+    'template': 'template_id', 'template_id': 'template_id',
+    'msg': 'message', 'message': 'message',
+    'ts': 'timestamp', 'time': 'timestamp', 'timestamp': 'timestamp',
+    'weight': 'weight',
+}
+
+_DICTIONARY_FIELDS = {'severity', 'endpoint', 'path', 'user_id', 'log_class'}
+_NUMERIC_FIELDS = {'template_id', 'weight'}
+
+# Relative cost of evaluating a predicate per row; AND evaluates the cheapest first
+_COSTS = {'dictionary': 1, 'numeric': 1, 'timestamp': 2, 'message': 10, 'text': 20}
+
+# Rough size of a cached query with the lookup tables it builds per store
+CACHED_QUERY_BYTES = 16 * 1024
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<paren>[()])
+      | (?P<field>[A-Za-z_]+)\s*(?P<op>!=|!~|!:|>=|<=|:|~|=|>|<)\s*(?P<value>"(?:[^"\\]|\\.)*"|[^\s()]+)
+      | (?P<word>"(?:[^"\\]|\\.)*"|[^\s()]+)
+    )''', re.VERBOSE)
+_RELATIVE = re.compile(r'^-(\d+(?:\.\d+)?)([smhdw])$', re.IGNORECASE)
+_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+# Length of a timestamp prefix -> the span ts:<prefix> covers, e.g. ts:2024-05-01 is that whole day
+_PREFIX_SPANS = {
+    4: pd.DateOffset(years=1), 7: pd.DateOffset(months=1), 10: pd.DateOffset(days=1),
+    13: pd.DateOffset(hours=1), 16: pd.DateOffset(minutes=1),
+}
+
+
+class QueryError(ValueError):
+    """
+    Raised when a log query cannot be parsed
+    """
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise QueryError(f"Cannot read the query at {text[position:]!r}")
+        position = match.end()
+        if match.group('paren'):
+            tokens.append(('paren', match.group('paren')))
+        elif match.group('field'):
+            tokens.append(('predicate', (match.group('field').lower(), match.group('op'), _unquote(match.group('value')))))
+        else:
+            word = match.group('word')
+            if word.upper() in ('AND', 'OR', 'NOT'):
+                tokens.append(('keyword', word.upper()))
+            else:
+                tokens.append(('text', _unquote(word)))
+    return tokens
+
+
+def parse_query(text):
+    """
+    Parses a query into a tree of ('and'|'or', children), ('not', child), ('predicate', field, op, value)
+    and ('text', term) nodes.
+
+    Predicates are field:value (equals; * matches anything, commas separate
+    alternatives), field~value (contains), != and !~ (their negations), and
+    <, <=, >, >= on ts, template and weight. Times are absolute or relative
+    to now, as in ts>-2h. Bare words search every text column. Terms are
+    combined with AND (also implied by a space), OR, NOT and parentheses.
+    """
+    tokens = _tokenize(text or "")
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else (None, None)
+
+    def parse_or():
+        nonlocal position
+        children = [parse_and()]
+        while peek() == ('keyword', 'OR'):
+            position += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ('or', tuple(children))
+
+    def parse_and():
+        nonlocal position
+        children = [parse_not()]
+        while True:
+            kind, value = peek()
+            if (kind, value) == ('keyword', 'AND'):
+                position += 1
+            elif kind is None or (kind, value) in (('keyword', 'OR'), ('paren', ')')):
+                break
+            children.append(parse_not())
+        return children[0] if len(children) == 1 else ('and', tuple(children))
+
+    def parse_not():
+        nonlocal position
+        kind, value = peek()
+        if (kind, value) == ('keyword', 'NOT'):
+            position += 1
+            return ('not', parse_not())
+        if (kind, value) == ('paren', '('):
+            position += 1
+            node = parse_or()
+            if peek() != ('paren', ')'):
+                raise QueryError("Missing closing parenthesis")
+            position += 1
+            return node
+        if kind == 'predicate':
+            position += 1
+            return _check_predicate(*value)
+        if kind == 'text':
+            position += 1
+            return ('text', value)
+        raise QueryError(f"Expected a search term, found {value or 'the end of the query'!r}")
+
+    if not tokens:
+        raise QueryError("Empty query")
+    node = parse_or()
+    if position < len(tokens):
+        raise QueryError(f"Unexpected {tokens[position][1]!r}")
+    return node
+
+
+def _check_predicate(field, op, value):
+    column = QUERY_FIELDS.get(field)
+    if column is None:
+        raise QueryError(f"Unknown field {field!r}; expected one of {', '.join(sorted(set(QUERY_FIELDS)))}")
+    op = {'=': ':', '!:': '!='}.get(op, op)
+    if op in ('<', '<=', '>', '>=') and column not in ('timestamp', 'template_id', 'weight'):
+        raise QueryError(f"{field} cannot be compared with {op}")
+    if op in ('~', '!~') and column in _NUMERIC_FIELDS | {'timestamp'}:
+        raise QueryError(f"{field} cannot be searched with {op}")
+    if column == 'timestamp':
+        _time_bound(value, datetime.now(), op)
+    elif column in _NUMERIC_FIELDS:
+        for number in value.split(','):
+            try:
+                float(number)
+            except ValueError:
+                raise QueryError(f"{field} needs a number, not {number!r}")
+    return ('predicate', column, op, value)
+
+
+def _time_bound(value, now, op):
+    """
+    Returns the bound of a time comparison, or the (start, end) covered by ts:<value>, as int64 nanoseconds
+    """
+    match = _RELATIVE.match(value)
+    try:
+        if match:
+            moment = pd.Timestamp(now - timedelta(**{_UNITS[match.group(2).lower()]: float(match.group(1))}))
+        else:
+            moment = pd.Timestamp(value.replace('T', ' '))
+    except (ValueError, TypeError):
+        raise QueryError(f"Unrecognised time {value!r}")
+
+    if op not in (':', '!='):
+        return moment.value
+    # A relative time covers everything since then
+    end = pd.Timestamp(now) if match else moment + _PREFIX_SPANS.get(len(value), pd.DateOffset(seconds=1))
+    return moment.value, end.value
+
+
+class _Plan:
+    """
+    Compiled query node; evaluates to a boolean mask over a set of candidate rows
+    """
+
+    cost = 1
+
+    def selectivity(self, store):
+        return 0.5
+
+    def bitmap(self, store):
+        """
+        Returns the matching rows as a RoaringBitmap when the bitmap indexes can answer alone, else None
+        """
+        return None
+
+    def evaluate(self, store, rows, now):
+        raise NotImplementedError
+
+
+class _And(_Plan):
+    def __init__(self, children):
+        self.children = children
+        self.cost = sum(child.cost for child in children)
+
+    def selectivity(self, store):
+        return float(np.prod([child.selectivity(store) for child in self.children]))
+
+    def bitmap(self, store):
+        bitmaps = [child.bitmap(store) for child in self.children]
+        if any(bitmap is None for bitmap in bitmaps):
+            return None
+        return reduce(operator.and_, bitmaps)
+
+    def evaluate(self, store, rows, now):
+        # Cheap and selective predicates first; later ones only see the rows still matching
+        ordered = sorted(self.children, key=lambda child: (child.cost, child.selectivity(store)))
+        positions = np.arange(len(rows))
+        if len(rows) == len(store):
+            # Over the whole store, indexed conditions are intersected as bitmaps before any row is read
+            bitmaps = [child.bitmap(store) for child in ordered]
+            indexed = [bitmap for bitmap in bitmaps if bitmap is not None]
+            if indexed:
+                positions = reduce(operator.and_, indexed).to_array(len(rows))
+                ordered = [child for child, bitmap in zip(ordered, bitmaps) if bitmap is None]
+        for child in ordered:
+            positions = positions[child.evaluate(store, rows[positions], now)]
+            if not len(positions):
+                break
+        mask = np.zeros(len(rows), dtype=bool)
+        mask[positions] = True
+        return mask
+
+
+class _Or(_Plan):
+    def __init__(self, children):
+        self.children = children
+        self.cost = sum(child.cost for child in children)
+
+    def selectivity(self, store):
+        return 1 - float(np.prod([1 - child.selectivity(store) for child in self.children]))
+
+    def bitmap(self, store):
+        bitmaps = [child.bitmap(store) for child in self.children]
+        if any(bitmap is None for bitmap in bitmaps):
+            return None
+        return reduce(operator.or_, bitmaps)
+
+    def evaluate(self, store, rows, now):
+        # Rows already matched are not checked against the remaining alternatives
+        mask = np.zeros(len(rows), dtype=bool)
+        for child in sorted(self.children, key=lambda child: child.cost):
+            remaining = np.flatnonzero(~mask)
+            if not len(remaining):
+                break
+            mask[remaining[child.evaluate(store, rows[remaining], now)]] = True
+        return mask
+
+
+class _Not(_Plan):
+    def __init__(self, child):
+        self.child = child
+        self.cost = child.cost
+
+    def selectivity(self, store):
+        return 1 - self.child.selectivity(store)
+
+    def evaluate(self, store, rows, now):
+        return ~self.child.evaluate(store, rows, now)
+
+
+class _DictionaryPredicate(_Plan):
+    cost = _COSTS['dictionary']
+
+    def __init__(self, column, op, value):
+        self.column = column
+        self.negated = op.startswith('!')
+        if op in ('~', '!~'):
+            term = value.lower()
+            self.test = lambda candidate: term in candidate.lower()
+        else:
+            patterns = [pattern.lower() for pattern in value.split(',')]
+            self.test = lambda candidate: any(fnmatch.fnmatchcase(candidate.lower(), pattern) for pattern in patterns)
+        self._matched = {}
+
+    def _table(self, store):
+        # The dictionary is small, so matching it is cheap; only values added since the last query are tested
+        values = store.dictionaries[self.column].values
+        table = self._matched.get(id(store))
+        if table is None or len(table) < len(values):
+            start = 0 if table is None else len(table)
+            extra = np.fromiter((self.test(str(value)) for value in values[start:]), dtype=bool,
+                                count=len(values) - start)
+            table = extra if table is None else np.concatenate([table, extra])
+            self._matched[id(store)] = table
+        return table
+
+    def selectivity(self, store):
+        table = self._table(store)
+        matched = table.mean() if len(table) else 0.0
+        return 1 - matched if self.negated else matched
+
+    def bitmap(self, store):
+        if self.negated or self.column not in store.indexes:
+            return None
+        return store.indexes[self.column].lookup(np.flatnonzero(self._table(store)).tolist())
+
+    def evaluate(self, store, rows, now):
+        table = self._table(store)
+        mask = table[store.codes[self.column].view()[rows]] if len(table) else np.zeros(len(rows), dtype=bool)
+        return ~mask if self.negated else mask
+
+
+class _NumericPredicate(_Plan):
+    cost = _COSTS['numeric']
+
+    def __init__(self, column, op, value):
+        self.column = column
+        self.op = op
+        self.values = np.array([float(number) for number in value.split(',')])
+
+    def evaluate(self, store, rows, now):
+        array = store.template_ids if self.column == 'template_id' else store.weights
+        column = array.view()[rows]
+        if self.op in (':', '!='):
+            mask = np.isin(column, self.values)
+            return ~mask if self.op == '!=' else mask
+        return _compare(column, self.op, self.values[0])
+
+
+class _TimestampPredicate(_Plan):
+    cost = _COSTS['timestamp']
+
+    def __init__(self, op, value):
+        self.op = op
+        self.value = value
+
+    def evaluate(self, store, rows, now):
+        column = store.timestamps.view()[rows]
+        bound = _time_bound(self.value, now, self.op)
+        if self.op in (':', '!='):
+            start, end = bound
+            mask = (column >= start) & (column < end)
+            return ~mask if self.op == '!=' else mask
+        return _compare(column, self.op, bound)
+
+
+class _MessagePredicate(_Plan):
+    cost = _COSTS['message']
+
+    def __init__(self, op, value):
+        self.negated = op.startswith('!')
+        self.term = value
+
+    def evaluate(self, store, rows, now):
+        mask = store.message_contains(self.term, rows)
+        return ~mask if self.negated else mask
+
+
+class _TextPredicate(_Plan):
+    cost = _COSTS['text']
+
+    def __init__(self, term):
+        self.term = term
+
+    def evaluate(self, store, rows, now):
+        return store.contains(self.term, rows=rows)
+
+
+def _compare(column, op, value):
+    return {'<': column < value, '<=': column <= value, '>': column > value, '>=': column >= value}[op]
+
+
+def _compile(node):
+    kind = node[0]
+    if kind == 'and':
+        return _And([_compile(child) for child in node[1]])
+    if kind == 'or':
+        return _Or([_compile(child) for child in node[1]])
+    if kind == 'not':
+        return _Not(_compile(node[1]))
+    if kind == 'text':
+        return _TextPredicate(node[1])
+
+    _, column, op, value = node
+    if column in _DICTIONARY_FIELDS:
+        return _DictionaryPredicate(column, op, value)
+    if column in _NUMERIC_FIELDS:
+        return _NumericPredicate(column, op, value)
+    if column == 'timestamp':
+        return _TimestampPredicate(op, value)
+    return _MessagePredicate(op, value)
+
+
+class LogQuery:
+    """
+    A parsed and compiled log query
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tree = parse_query(text)
+        self.plan = _compile(self.tree)
+
+    def mask(self, store, rows=None, now=None):
+        """
+        Returns a boolean mask over rows (all rows by default) of the store that match the query
+        """
+        rows = np.arange(len(store)) if rows is None else np.asarray(rows, dtype=np.int64)
+        if len(rows) == len(store):
+            bitmap = self.plan.bitmap(store)
+            if bitmap is not None:
+                return bitmap.to_mask(len(store))
+        return self.plan.evaluate(store, rows, now or datetime.now())
+
+
+@lru_cache(maxsize=256)
+def compile_query(text):
+    """
+    Returns the LogQuery for a query string, parsing each distinct string once
+    """
+    return LogQuery(text.strip())
+
+
+def query_cache_nbytes():
+    """
+    Rough memory held by the compiled query cache, plans and value lookup tables included
+    """
+    return compile_query.cache_info().currsize * CACHED_QUERY_BYTES
@@ -0,0 +1,471 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from data.bitmap_index import BitmapIndex
+from data.template_miner import WILDCARD
+
+# Joins the parameters of one message; never produced by str.split()
+PARAM_SEPARATOR = "\x1f"
+
+# Low-cardinality columns kept as int32 codes into a per-column dictionary
+DICTIONARY_COLUMNS = ['severity', 'endpoint', 'path', 'user_id', 'log_class']
+
+# Dictionary columns with a bitmap per value, for filters and counts that never scan the rows
+INDEXED_COLUMNS = ['severity', 'log_class', 'endpoint']
+
+# Column order of materialized records
+RECORD_COLUMNS = ['timestamp', 'severity', 'endpoint', 'path', 'user_id', 'log_class', 'template_id', 'weight', 'message']
+
+# Columns moved to memory-mapped files when over the memory budget, least read first
+SPILL_ORDER = [
+    'params', 'message_codes', 'param_offsets', 'path', 'user_id', 'template_id', 'weight',
+    'log_class', 'endpoint', 'severity', 'timestamp'
+]
+
+
+class _GrowableArray:
+    """
+    Numpy array with amortized appends, optionally backed by a memory-mapped file
+    """
+
+    def __init__(self, dtype, capacity=1024):
+        self.buffer = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+        self.path = None
+        self.file = None
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.buffer.dtype)
+        end = self.size + len(values)
+        if end > len(self.buffer):
+            self._reallocate(max(end, 2 * len(self.buffer)))
+        self.buffer[self.size:end] = values
+        self.size = end
+
+    def view(self):
+        return self.buffer[:self.size]
+
+    def spill(self, path):
+        """
+        Moves the buffer to a memory-mapped file, so the OS can page it out; returns the bytes freed
+        """
+        if self.path is not None:
+            return 0
+        freed = self.buffer.nbytes
+        self.path = path
+        self._reallocate(len(self.buffer))
+        return freed
+
+    def _reallocate(self, capacity):
+        # Views taken before a reallocation keep the old buffer alive, so it is never written over
+        previous_file = self.file
+        if self.path is None:
+            grown = np.zeros(capacity, dtype=self.buffer.dtype)
+        else:
+            self.file = f"{self.path}.{capacity}"
+            grown = np.asarray(np.memmap(self.file, dtype=self.buffer.dtype, mode='w+', shape=(capacity,)))
+        grown[:self.size] = self.buffer[:self.size]
+        self.buffer = grown
+        if previous_file is not None:
+            try:
+                # The mapping stays valid for readers still holding it
+                os.remove(previous_file)
+            except OSError:
+                pass
+
+    @property
+    def nbytes(self):
+        return 0 if self.path is not None else self.buffer.nbytes
+
+    @property
+    def spilled_nbytes(self):
+        return self.buffer.nbytes if self.path is not None else 0
+
+
+class _Dictionary:
+    """
+    Distinct values of a column and the code of each
+    """
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+        self._array = np.zeros(0, dtype=object)
+
+    def encode(self, values):
+        # Each distinct value of the batch is looked up once
+        batch_codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            code = self.ids.get(value)
+            if code is None:
+                code = self.ids[value] = len(self.values)
+                self.values.append(value)
+            mapping[i] = code
+        return mapping[batch_codes]
+
+    def array(self):
+        if len(self._array) != len(self.values):
+            self._array = np.array(self.values, dtype=object)
+        return self._array
+
+    def matching(self, term):
+        """
+        Returns the codes of the values containing term, ignoring case
+        """
+        term = term.lower()
+        return np.array([code for code, value in enumerate(self.values) if term in str(value).lower()], dtype=np.int32)
+
+
+class MessageDictionary:
+    """
+    Shared dictionary of message templates.
+
+    A message is stored as the code of a template, whose <*> tokens mark
+    where it differs from the other messages of its cluster, plus the
+    tokens at those positions. Messages that would not round-trip exactly
+    (irregular whitespace, or a literal <*>) are kept whole under code -1.
+    """
+
+    def __init__(self):
+        self.templates = []
+        self.ids = {}
+        self._literals = []
+
+    def encode(self, messages, templates):
+        """
+        Returns the template codes and joined parameters of messages, given the template tokens each joined
+        """
+        codes = np.empty(len(messages), dtype=np.int32)
+        params = []
+        for i, (message, template) in enumerate(zip(messages, templates)):
+            tokens = message.split()
+            if len(tokens) != len(template) or WILDCARD in message or " ".join(tokens) != message:
+                codes[i] = -1
+                params.append(message)
+                continue
+
+            template = tuple(template)
+            code = self.ids.get(template)
+            if code is None:
+                code = self.ids[template] = len(self.templates)
+                self.templates.append(template)
+                self._literals.append(" ".join(template).split(WILDCARD))
+            codes[i] = code
+            params.append(PARAM_SEPARATOR.join(
+                token for token, template_token in zip(tokens, template) if template_token == WILDCARD
+            ))
+        return codes, params
+
+    def decode(self, codes, params):
+        """
+        Rebuilds the original messages
+        """
+        messages = []
+        for code, joined in zip(codes, params):
+            if code < 0:
+                messages.append(joined)
+                continue
+            literals = self._literals[code]
+            if len(literals) == 1:
+                messages.append(literals[0])
+                continue
+            values = joined.split(PARAM_SEPARATOR)
+            parts = [literals[0]]
+            for value, literal in zip(values, literals[1:]):
+                parts.append(value)
+                parts.append(literal)
+            messages.append("".join(parts))
+        return messages
+
+    def literal_match(self, term):
+        """
+        Returns a boolean array over template codes, True where a literal stretch of the template contains term
+        """
+        term = term.lower()
+        return np.array(
+            [any(term in literal.lower() for literal in literals) for literals in self._literals], dtype=bool
+        )
+
+
+class LogStore:
+    """
+    Columnar, append-only store of log records.
+
+    Timestamps and template ids are numpy columns, repetitive string columns
+    are dictionary codes, and messages are template codes plus a shared
+    buffer of parameters. Filters run on integer columns, and full records,
+    messages included, are only rebuilt for the rows that are displayed or
+    exported.
+    """
+
+    def __init__(self):
+        self.timestamps = _GrowableArray(np.int64)
+        self.template_ids = _GrowableArray(np.int32)
+        # Number of original logs each stored row stands for, after sampling at ingest
+        self.weights = _GrowableArray(np.float32)
+        self.codes = {column: _GrowableArray(np.int32) for column in DICTIONARY_COLUMNS}
+        self.dictionaries = {column: _Dictionary() for column in DICTIONARY_COLUMNS}
+        self.indexes = {column: BitmapIndex() for column in INDEXED_COLUMNS}
+        self.message_dictionary = MessageDictionary()
+        self.message_codes = _GrowableArray(np.int32)
+        self.param_offsets = _GrowableArray(np.int64)
+        self.param_offsets.extend([0])
+        self.params = _GrowableArray(np.uint8)
+        # Rows every column holds; set last in append, so readers on other threads never see a partial row
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, columns, messages, templates):
+        """
+        Appends a batch; columns holds the timestamp, dictionary, template_id and optional weight columns
+        aligned with messages
+        """
+        if not len(messages):
+            return
+
+        first_row = len(self)
+        self.timestamps.extend(pd.to_datetime(pd.Series(columns['timestamp'])).values.astype(np.int64))
+        self.template_ids.extend(columns['template_id'])
+        self.weights.extend(columns.get('weight', np.ones(len(messages))))
+        for column in DICTIONARY_COLUMNS:
+            codes = self.dictionaries[column].encode(columns[column])
+            self.codes[column].extend(codes)
+            if column in self.indexes:
+                self.indexes[column].add(codes, first_row)
+
+        codes, params = self.message_dictionary.encode(messages, templates)
+        encoded = [param.encode() for param in params]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        self.message_codes.extend(codes)
+        self.param_offsets.extend(self.params.size + np.cumsum(lengths))
+        self.params.extend(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self.size = first_row + len(messages)
+
+    def bitmap(self, **filters):
+        """
+        Returns the RoaringBitmap of rows whose indexed columns hold one of the given values, e.g.
+        bitmap(severity=['ERROR'], endpoint=['/api/orders']), or None when no filter is set
+        """
+        result = None
+        for column, values in filters.items():
+            if not values:
+                continue
+            ids = self.dictionaries[column].ids
+            selected = self.indexes[column].lookup([ids[value] for value in values if value in ids])
+            result = selected if result is None else result & selected
+        return result
+
+    def rows(self, **filters):
+        """
+        Returns the row numbers matching bitmap(**filters), in ascending order
+        """
+        size = len(self)
+        selected = self.bitmap(**filters)
+        return np.arange(size) if selected is None else selected.to_array(size)
+
+    def count(self, weighted=False, **filters):
+        """
+        Counts the rows matching bitmap(**filters) from the bitmap cardinalities; weighted sums the sample
+        weights of those rows instead
+        """
+        size = len(self)
+        selected = self.bitmap(**filters)
+        if weighted:
+            weights = self.weights.view()[:size]
+            return float(weights.sum() if selected is None else weights[selected.to_array(size)].sum())
+        return size if selected is None else len(selected)
+
+    def frame(self, columns=None, rows=None):
+        """
+        Returns the rows (all by default) as a DataFrame indexed by row number, without the message column
+        """
+        columns = columns or [column for column in RECORD_COLUMNS if column != 'message']
+        if rows is None:
+            rows = slice(None)
+        elif not isinstance(rows, slice):
+            rows = np.asarray(rows, dtype=np.int64)
+        # Every column is cut to the same row count, read once, while the writer may be appending
+        size = len(self)
+        frame = {}
+        for column in columns:
+            if column == 'timestamp':
+                frame[column] = self.timestamps.view()[:size][rows].astype('datetime64[ns]')
+            elif column == 'template_id':
+                frame[column] = self.template_ids.view()[:size][rows]
+            elif column == 'weight':
+                frame[column] = self.weights.view()[:size][rows]
+            else:
+                frame[column] = self.dictionaries[column].array()[self.codes[column].view()[:size][rows]]
+        index = np.arange(size)[rows]
+        return pd.DataFrame(frame, columns=columns, index=index)
+
+    def iter_frames(self, chunk_size):
+        """
+        Yields the rows as DataFrames of at most chunk_size rows, building one chunk at a time
+        """
+        size = len(self)
+        for offset in range(0, size, chunk_size):
+            yield self.frame(rows=slice(offset, min(offset + chunk_size, size)))
+
+    def messages(self, rows):
+        """
+        Rebuilds the messages of the given row numbers
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        offsets = self.param_offsets.view()
+        params = self.params.view()
+        joined = [
+            params[start:end].tobytes().decode() for start, end in zip(offsets[rows].tolist(), offsets[rows + 1].tolist())
+        ]
+        return self.message_dictionary.decode(self.message_codes.view()[rows].tolist(), joined)
+
+    def with_messages(self, frame):
+        """
+        Returns a copy of a frame from this store with the message column rebuilt for its rows
+        """
+        frame = frame.copy()
+        frame['message'] = self.messages(frame.index.to_numpy())
+        return frame
+
+    def records(self, rows):
+        """
+        Rebuilds full records for the given row numbers, as shown in the log tables
+        """
+        frame = self.with_messages(self.frame(rows=rows))
+        frame['timestamp'] = frame['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        return frame.to_dict('records')
+
+    def page(self, logs_df, page_current=0, page_size=10, sort_by=None, newest_first=False):
+        """
+        Returns (records, page_count) for one page of a DataTable over a frame from this store.
+
+        Sorting only rebuilds messages when the table is sorted by message,
+        and only the rows on the page are materialized.
+        """
+        if sort_by:
+            keys = []
+            for sort in sort_by:
+                column = sort['column_id']
+                if column == 'message':
+                    logs_df = logs_df.assign(message=self.messages(logs_df.index.to_numpy()))
+                keys.append(column)
+            logs_df = logs_df.sort_values(
+                keys, ascending=[sort['direction'] == 'asc' for sort in sort_by], kind='stable'
+            )
+        elif newest_first:
+            logs_df = logs_df.sort_values('timestamp', ascending=False, kind='stable')
+
+        page_size = page_size or 10
+        page_count = max(1, -(-len(logs_df) // page_size))
+        page_current = min(page_current or 0, page_count - 1)
+        rows = logs_df.index.to_numpy()[page_current * page_size:(page_current + 1) * page_size]
+        return self.records(rows), page_count
+
+    def message_contains(self, term, rows=None):
+        """
+        Returns a boolean mask over the rows (all by default) whose message contains term, ignoring case.
+
+        Rows whose template has the term in its literal text match without
+        being rebuilt. A term without whitespace otherwise has to sit inside a
+        single parameter, which one regex scan of the parameter buffer finds;
+        terms spanning several tokens rebuild the messages that contain each
+        of their pieces.
+        A small set of rows is checked by rebuilding just those messages.
+        """
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            if len(rows) * 8 >= len(self):
+                return self.message_contains(term)[rows]
+
+        stored = len(self)
+        size = stored if rows is None else len(rows)
+        if not term:
+            return np.ones(size, dtype=bool)
+
+        codes = self.message_codes.view()[:stored] if rows is None else self.message_codes.view()[rows]
+        literal = self.message_dictionary.literal_match(term)
+        templated = codes >= 0
+        mask = np.zeros(size, dtype=bool)
+        mask[templated] = literal[codes[templated]]
+
+        if rows is None and term.split() == [term]:
+            offsets = self.param_offsets.view()[:stored + 1]
+            params = self.params.view()[:offsets[-1]]
+            pattern = re.compile(re.escape(term.encode()), re.IGNORECASE)
+            found = [match.span() for match in pattern.finditer(params)]
+            if found:
+                starts, ends = np.array(found).T
+                first = np.searchsorted(offsets, starts, side='right') - 1
+                last = np.searchsorted(offsets, ends - 1, side='right') - 1
+                # Rows are packed back to back, so drop matches that run into the next row
+                mask[first[first == last]] = True
+                # Such a match may have used up the start of a real one in the rows it ran into; look again there
+                for start, row in zip(starts[first != last].tolist(), last[first != last].tolist()):
+                    for match in pattern.finditer(params, start + 1, int(offsets[row + 1])):
+                        inside = int(np.searchsorted(offsets, match.start(), side='right')) - 1
+                        if match.end() <= offsets[inside + 1]:
+                            mask[inside] = True
+            # Messages kept whole hold their text in the parameter buffer, so the scan covered them too
+            return mask
+
+        rest = np.flatnonzero(~mask)
+        if rows is None:
+            # Each piece of the term between spaces is in every matching message, and is quick to look up
+            for piece in term.split():
+                rest = rest[self.message_contains(piece)[rest]]
+        term = term.lower()
+        rebuilt = self.messages(rest if rows is None else rows[rest])
+        mask[rest] = [term in message.lower() for message in rebuilt]
+        return mask
+
+    def contains(self, term, columns=('message', 'endpoint', 'path', 'user_id'), rows=None):
+        """
+        Returns a boolean mask over the rows (all by default) where any of the columns contains term, ignoring case
+        """
+        size = len(self)
+        mask = np.zeros(size if rows is None else len(rows), dtype=bool)
+        for column in columns:
+            if column == 'message':
+                mask |= self.message_contains(term, rows)[:len(mask)]
+            else:
+                codes = self.codes[column].view()
+                mask |= np.isin(codes[:size] if rows is None else codes[rows], self.dictionaries[column].matching(term))
+        return mask
+
+    def spill(self, directory, needed):
+        """
+        Moves whole columns, least read first, to memory-mapped files in directory until at least needed
+        bytes are freed; returns the bytes freed
+        """
+        freed = 0
+        for name in SPILL_ORDER:
+            if freed >= needed:
+                break
+            freed += self._columns()[name].spill(os.path.join(directory, name))
+        return freed
+
+    def _columns(self):
+        columns = {
+            'timestamp': self.timestamps, 'template_id': self.template_ids, 'weight': self.weights,
+            'message_codes': self.message_codes, 'param_offsets': self.param_offsets, 'params': self.params,
+        }
+        columns.update(self.codes)
+        return columns
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the columns and bitmap indexes, excluding the dictionaries and spilled columns
+        """
+        arrays = [*self._columns().values(), *self.indexes.values()]
+        return sum(array.nbytes for array in arrays)
+
+    @property
+    def spilled_nbytes(self):
+        return sum(array.spilled_nbytes for array in self._columns().values())
@@ -0,0 +1,115 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+SPILL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "spill")
+
+
+def dict_nbytes(mapping, sample=64):
+    """
+    Estimates the memory held by a dict of strings or tuples of strings from a sample of its entries
+    """
+    if not mapping:
+        return sys.getsizeof(mapping)
+    entries = [item for _, item in zip(range(sample), mapping.items())]
+    per_entry = sum(_object_nbytes(key) + _object_nbytes(value) for key, value in entries) / len(entries)
+    return sys.getsizeof(mapping) + int(per_entry * len(mapping))
+
+
+def _object_nbytes(value):
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class MemoryBudget:
+    """
+    Accounts for the memory held by the stores and caches, and keeps it under a budget.
+
+    Stores are registered with anything exposing nbytes; those that also
+    have spill(directory, needed) can move cold data to memory-mapped files.
+    Caches are registered as (size, clear) callables. When the total goes
+    over the limit, caches are cleared first, largest first, and then stores
+    spill in registration order until enough has been freed. Spilled data is
+    still read in place, so the dashboard gets slower instead of running
+    out of memory.
+    """
+
+    def __init__(self, limit=None, spill_dir=SPILL_DIR):
+        self.limit = limit
+        self.spill_dir = spill_dir
+        self.stores = {}
+        self.caches = {}
+        self.evictions = 0
+        self._directory = None
+        self._lock = threading.Lock()
+
+    def register(self, name, store):
+        self.stores[name] = store
+
+    def register_cache(self, name, size, clear):
+        self.caches[name] = (size, clear)
+
+    def usage(self):
+        """
+        Returns a dict of component name to the bytes it holds in memory
+        """
+        usage = {name: int(store.nbytes) for name, store in self.stores.items()}
+        usage.update({name: int(size()) for name, (size, _) in self.caches.items()})
+        return usage
+
+    def enforce(self):
+        """
+        Clears caches and then spills stores until the total is within the limit; returns the bytes freed
+        """
+        if self.limit is None:
+            return 0
+        with self._lock:
+            usage = self.usage()
+            excess = sum(usage.values()) - self.limit
+            if excess <= 0:
+                return 0
+
+            freed = 0
+            for name in sorted(self.caches, key=usage.get, reverse=True):
+                if freed >= excess or not usage[name]:
+                    break
+                self.caches[name][1]()
+                freed += usage[name]
+                self.evictions += 1
+
+            for name, store in self.stores.items():
+                if freed >= excess:
+                    break
+                if hasattr(store, 'spill'):
+                    directory = os.path.join(self._spill_directory(), name)
+                    os.makedirs(directory, exist_ok=True)
+                    freed += store.spill(directory, excess - freed)
+            return freed
+
+    def stats(self):
+        """
+        Returns the limit, the total and the per-component bytes held in memory and spilled to disk
+        """
+        usage = self.usage()
+        return {
+            'limit': self.limit,
+            'total': sum(usage.values()),
+            'components': usage,
+            'spilled': {
+                name: int(store.spilled_nbytes)
+                for name, store in self.stores.items() if hasattr(store, 'spilled_nbytes')
+            },
+            'cache_evictions': self.evictions,
+        }
+
+    def _spill_directory(self):
+        # One directory per process, removed at exit; spilled data is rebuilt from the WAL on restart
+        if self._directory is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._directory = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=self.spill_dir)
+            atexit.register(shutil.rmtree, self._directory, ignore_errors=True)
+        return self._directory
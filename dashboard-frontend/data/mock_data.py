@@ -2,6 +2,9 @@ from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
 import random
+import uuid
+
+from data.ingest import init_ingest_state
 
 # Generate timestamps for the past week
 now = datetime.now()
@@ -18,6 +21,28 @@ api_endpoints = [
     "/api/analytics"
 ]
 
+# Parameterized routes; requests to these carry ids in the raw path
+route_templates = [
+    "/api/users/{user_id}",
+    "/api/products/{product_id}",
+    "/api/orders/{order_id}",
+    "/api/users/{user_id}/orders/{order_id}",
+]
+
+
+def raw_request_path(endpoint):
+    """
+    Returns the path a client would request, filling ids into some resource endpoints
+    """
+    if endpoint in ("/api/users", "/api/products") and random.random() < 0.4:
+        return f"{endpoint}/{random.randint(1, 5000)}"
+    if endpoint == "/api/orders" and random.random() < 0.4:
+        order_id = uuid.UUID(int=random.getrandbits(128), version=4)
+        if random.random() < 0.5:
+            return f"/api/users/{random.randint(1, 5000)}/orders/{order_id}"
+        return f"{endpoint}/{order_id}"
+    return endpoint
+
 # Log severity levels
 severity_levels = ["INFO", "WARNING", "ERROR", "CRITICAL"]
 log_classes = ["Authentication", "Database", "Network", "Authorization", "Input Validation"]
@@ -27,7 +52,7 @@ logs = []
 for i in range(500):
     timestamp = random.choice(timestamps)
     severity = random.choice(severity_levels)
-    endpoint = random.choice(api_endpoints)
+    endpoint = raw_request_path(random.choice(api_endpoints))
     user_id = f"user_{random.randint(1, 100)}"
     message = f"API request to {endpoint}"
     if severity == "ERROR":
@@ -71,18 +96,28 @@ for timestamp in timestamps:
 
 # Generate infrastructure metrics
 infra_metrics = []
+incident_hours = range(120, 126)
 server_names = ["server-1", "server-2", "server-3", "api-server", "db-server"]
 
-for timestamp in timestamps:
+for hour, timestamp in enumerate(timestamps):
     for server in server_names:
-        # CPU usage between 0% and 100%
-        cpu_usage = max(0, min(100, np.random.normal(60, 15)))
+        # CPU usage between 0% and 100%, saturated on the database server during the incident
+        if server == "db-server" and hour in incident_hours:
+            cpu_usage = max(0, min(100, np.random.normal(95, 3)))
+        else:
+            cpu_usage = max(0, min(100, np.random.normal(60, 15)))
         
-        # Memory usage between 0% and 100%
-        memory_usage = max(0, min(100, np.random.normal(70, 10)))
+        # Memory usage between 0% and 100%, leaking steadily on the API server
+        if server == "api-server":
+            memory_usage = max(0, min(100, np.random.normal(50 + 0.25 * hour, 3)))
+        else:
+            memory_usage = max(0, min(100, np.random.normal(70, 10)))
         
-        # Disk usage between 20% and 95%
-        disk_usage = max(20, min(95, np.random.normal(65, 10)))
+        # Disk usage between 20% and 95%, filling up on the database server
+        if server == "db-server":
+            disk_usage = max(20, min(95, np.random.normal(60 + 0.2 * hour, 2)))
+        else:
+            disk_usage = max(20, min(95, np.random.normal(65, 10)))
         
         # Network IO in Mbps between 1 and 1000
         network_in = max(1, min(1000, np.random.normal(200, 150)))
@@ -98,6 +133,19 @@ for timestamp in timestamps:
             "network_out": network_out
         })
 
+# Order failures follow the database CPU saturation by about an hour
+for hour in incident_hours:
+    incident_start = datetime.strptime(timestamps[hour + 1], "%Y-%m-%d %H:%M:%S")
+    for minute in range(0, 60, 6):
+        logs.append({
+            "timestamp": (incident_start + timedelta(minutes=minute)).strftime("%Y-%m-%d %H:%M:%S"),
+            "severity": "CRITICAL",
+            "endpoint": "/api/orders",
+            "user_id": f"user_{random.randint(1, 100)}",
+            "message": "Service unavailable at /api/orders: Database connection timeout",
+            "log_class": "Database",
+        })
+
 # Generate user activity data
 user_activities = []
 actions = ["login", "logout", "view_page", "edit_resource", "delete_resource", "create_resource", "export_data"]
@@ -109,29 +157,32 @@ for i in range(300):
     action = random.choice(actions)
     ip_address = random.choice(ips)
     
-    # Flag some activities as suspicious
-    is_suspicious = random.random() < 0.1
-    reason = None
-    
-    if is_suspicious:
-        reasons = [
-            "Multiple failed login attempts",
-            "Unusual access time",
-            "Access from new location",
-            "Unusual data export volume",
-            "Multiple resource deletions"
-        ]
-        reason = random.choice(reasons)
+    # Some logins fail
+    status = "failed" if action == "login" and random.random() < 0.2 else "success"
     
     user_activities.append({
         "timestamp": timestamp,
         "user_id": user_id,
         "action": action,
         "ip_address": ip_address,
-        "is_suspicious": is_suspicious,
-        "reason": reason
+        "status": status
     })
 
+# Add a few bursts of failed logins, exports and deletions for the detector to flag
+for burst_action in ["login", "export_data", "delete_resource"] * 2:
+    start = datetime.strptime(random.choice(timestamps), "%Y-%m-%d %H:%M:%S")
+    user_id = f"user_{random.randint(1, 100)}"
+    ip_address = random.choice(ips)
+    
+    for minute in range(6):
+        user_activities.append({
+            "timestamp": (start + timedelta(minutes=minute)).strftime("%Y-%m-%d %H:%M:%S"),
+            "user_id": user_id,
+            "action": burst_action,
+            "ip_address": ip_address,
+            "status": "failed" if burst_action == "login" else "success"
+        })
+
 # Generate alerts
 alerts = []
 alert_types = ["High Error Rate", "Service Unavailable", "Slow Response Time", "High CPU Usage", "Memory Leak", "Suspicious Activity"]
@@ -173,7 +224,11 @@ mock_data = {
     "user_activities": user_activities,
     "alerts": alerts,
     "endpoints": api_endpoints,
+    "routes": api_endpoints + route_templates,
     "severity_levels": severity_levels,
     "servers": server_names,
     "log_classes": log_classes
 }
+
+# Build the derived stores from the generated records
+init_ingest_state(mock_data)
@@ -0,0 +1,464 @@
+import threading
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+AGGREGATES = ['min', 'max', 'sum', 'count', 'last']
+
+NS_PER_SECOND = 10 ** 9
+
+
+class _SeriesArrays:
+    """
+    Growable, time-sorted arrays of rows for one series
+    """
+
+    __slots__ = ("times", "rows", "size")
+
+    def __init__(self, width, capacity=64):
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.rows = np.zeros((capacity, width), dtype=np.float64)
+        self.size = 0
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed > len(self.times):
+            capacity = max(needed, 2 * len(self.times))
+            times = np.zeros(capacity, dtype=np.int64)
+            rows = np.zeros((capacity, self.rows.shape[1]), dtype=np.float64)
+            times[:self.size] = self.times[:self.size]
+            rows[:self.size] = self.rows[:self.size]
+            self.times, self.rows = times, rows
+
+    def append(self, times, rows):
+        """
+        Adds time-sorted rows, inserting any that arrive out of order
+        """
+        if not len(times):
+            return
+        if self.size and times[0] < self.times[self.size - 1]:
+            merged_times = np.concatenate([self.times[:self.size], times])
+            order = np.argsort(merged_times, kind='stable')
+            merged_rows = np.concatenate([self.rows[:self.size], rows])[order]
+            self.size = 0
+            times, rows = merged_times[order], merged_rows
+        self._reserve(len(times))
+        self.times[self.size:self.size + len(times)] = times
+        self.rows[self.size:self.size + len(times)] = rows
+        self.size += len(times)
+
+    def trim(self, before):
+        """
+        Drops rows older than the given time
+        """
+        cut = np.searchsorted(self.times[:self.size], before, side='left')
+        if cut:
+            keep = self.size - cut
+            self.times[:keep] = self.times[cut:self.size]
+            self.rows[:keep] = self.rows[cut:self.size]
+            self.size = keep
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.rows.nbytes
+
+    def slice(self, start=None, end=None):
+        times = self.times[:self.size]
+        lo = np.searchsorted(times, start, side='left') if start is not None else 0
+        hi = np.searchsorted(times, end, side='right') if end is not None else self.size
+        return times[lo:hi], self.rows[lo:hi]
+
+
+class RollupTier:
+    """
+    min/max/sum/count/last aggregates per series at one fixed resolution.
+
+    The current bucket of every series lives in one shared matrix, so the
+    steady stream of samples for the open bucket is combined in a single
+    vectorized step; a series' closed buckets move to its own arrays when
+    the bucket rolls over.
+    """
+
+    def __init__(self, resolution, retention, metrics, initial_series=64):
+        self.resolution = resolution
+        self.retention = retention
+        self.metrics = metrics
+        # Per metric: min, max, sum, count, last, plus the timestamp of last
+        self.width = len(metrics) * len(AGGREGATES) + 1
+        self._columns = [
+            np.arange(len(metrics)) * len(AGGREGATES) + offset
+            for offset in range(len(AGGREGATES))
+        ]
+
+        self.keys = []
+        self.key_rows = {}
+        self.series = {}
+        self.open_buckets = np.full(initial_series, -1, dtype=np.int64)
+        self.open_rows = np.zeros((initial_series, self.width), dtype=np.float64)
+
+    def add(self, keys, codes, times, values):
+        """
+        Folds raw samples, sorted by series code then time, into their buckets
+        """
+        step = self.resolution * NS_PER_SECOND
+        buckets = times - times % step
+        new_group = np.r_[True, (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])]
+        starts = np.flatnonzero(new_group)
+        ends = np.r_[starts[1:], len(buckets)]
+
+        partial = np.empty((len(starts), self.width))
+        for i in range(len(self.metrics)):
+            column = values[:, i]
+            valid = ~np.isnan(column)
+            base = i * len(AGGREGATES)
+            partial[:, base] = np.fmin.reduceat(column, starts)
+            partial[:, base + 1] = np.fmax.reduceat(column, starts)
+            partial[:, base + 2] = np.add.reduceat(np.where(valid, column, 0.0), starts)
+            partial[:, base + 3] = np.add.reduceat(valid.astype(np.float64), starts)
+            partial[:, base + 4] = column[ends - 1]
+        partial[:, -1] = times[ends - 1]
+
+        group_codes = codes[starts]
+        group_buckets = buckets[starts]
+        key_rows = np.array([self._row(key) for key in keys], dtype=np.int64)
+        rows = key_rows[group_codes]
+        is_last = np.r_[group_codes[1:] != group_codes[:-1], True]
+        open_buckets = self.open_buckets[rows]
+
+        # Samples for the bucket that is already open combine in place
+        same = group_buckets == open_buckets
+        self.open_rows[rows[same]] = self._combine(self.open_rows[rows[same]], partial[same])
+
+        # A newer last bucket becomes the open one; the old open bucket is closed
+        rollover = is_last & (group_buckets > open_buckets)
+        to_series = ~same & ~rollover
+        closing = rows[rollover & (open_buckets >= 0)]
+        pending = {}
+        for row in closing.tolist():
+            pending.setdefault(row, []).append((self.open_buckets[row], self.open_rows[row].copy()))
+        for i in np.flatnonzero(to_series).tolist():
+            pending.setdefault(int(rows[i]), []).append((group_buckets[i], partial[i]))
+
+        self.open_buckets[rows[rollover]] = group_buckets[rollover]
+        self.open_rows[rows[rollover]] = partial[rollover]
+
+        for row, items in pending.items():
+            items.sort(key=lambda item: item[0])
+            key = self.keys[row]
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = _SeriesArrays(self.width)
+            self._merge(
+                series,
+                np.array([bucket for bucket, _ in items], dtype=np.int64),
+                np.array([row_values for _, row_values in items])
+            )
+
+    def _row(self, key):
+        row = self.key_rows.get(key)
+        if row is None:
+            row = self.key_rows[key] = len(self.keys)
+            self.keys.append(key)
+            if row >= len(self.open_buckets):
+                grow = len(self.open_buckets)
+                self.open_buckets = np.concatenate([self.open_buckets, np.full(grow, -1, dtype=np.int64)])
+                self.open_rows = np.vstack([self.open_rows, np.zeros((grow, self.width))])
+        return row
+
+    def _combine(self, rows, incoming):
+        mins, maxs, sums, counts, lasts = self._columns
+        rows[:, mins] = np.fmin(rows[:, mins], incoming[:, mins])
+        rows[:, maxs] = np.fmax(rows[:, maxs], incoming[:, maxs])
+        rows[:, sums] += incoming[:, sums]
+        rows[:, counts] += incoming[:, counts]
+        newer = incoming[:, -1] >= rows[:, -1]
+        rows[np.ix_(newer, lasts)] = incoming[np.ix_(newer, lasts)]
+        rows[:, -1] = np.maximum(rows[:, -1], incoming[:, -1])
+        return rows
+
+    def _merge(self, series, buckets, partial):
+        size = series.size
+        if size == 0 or buckets[0] > series.times[size - 1]:
+            series.append(buckets, partial)
+            return
+
+        positions = np.searchsorted(series.times[:size], buckets)
+        hits = positions < size
+        hits[hits] = series.times[positions[hits]] == buckets[hits]
+
+        if hits.any():
+            positions = positions[hits]
+            series.rows[positions] = self._combine(series.rows[positions], partial[hits])
+
+        if not hits.all():
+            series.append(buckets[~hits], partial[~hits])
+
+    @property
+    def nbytes(self):
+        return (
+            self.open_buckets.nbytes + self.open_rows.nbytes
+            + sum(series.nbytes for series in self.series.values())
+        )
+
+    def trim(self, before):
+        """
+        Drops buckets that start before the given time
+        """
+        for series in self.series.values():
+            series.trim(before)
+        stale = (self.open_buckets >= 0) & (self.open_buckets < before)
+        self.open_buckets[stale] = -1
+
+    def rows(self, key, start=None, end=None):
+        """
+        Returns the bucket times and aggregate rows of a series within [start, end]
+        """
+        series = self.series.get(key)
+        if series is None:
+            times, rows = np.zeros(0, dtype=np.int64), np.zeros((0, self.width))
+        else:
+            times, rows = series.slice(start, end)
+
+        row = self.key_rows.get(key)
+        if row is not None:
+            bucket = self.open_buckets[row]
+            if bucket >= 0 and (start is None or bucket >= start) and (end is None or bucket <= end):
+                times = np.r_[times, bucket]
+                rows = np.vstack([rows, self.open_rows[row]])
+        return times, rows
+
+    def downsample(self, times, rows, step):
+        """
+        Re-aggregates time-sorted bucket rows into coarser buckets of step nanoseconds
+        """
+        if not len(times):
+            return times, rows
+        buckets = times - times % step
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)]
+
+        mins, maxs, sums, counts, lasts = self._columns
+        merged = np.empty((len(starts), self.width))
+        merged[:, mins] = np.fmin.reduceat(rows[:, mins], starts, axis=0)
+        merged[:, maxs] = np.fmax.reduceat(rows[:, maxs], starts, axis=0)
+        merged[:, sums] = np.add.reduceat(rows[:, sums], starts, axis=0)
+        merged[:, counts] = np.add.reduceat(rows[:, counts], starts, axis=0)
+        merged[:, lasts] = rows[ends - 1][:, lasts]
+        merged[:, -1] = rows[ends - 1, -1]
+        return buckets[starts], merged
+
+    def frame(self, times, rows):
+        frame = pd.DataFrame({'timestamp': pd.to_datetime(times)})
+        for i, metric in enumerate(self.metrics):
+            base = i * len(AGGREGATES)
+            count = rows[:, base + 3]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                frame[metric] = rows[:, base + 2] / count
+            frame[f'{metric}_min'] = rows[:, base]
+            frame[f'{metric}_max'] = rows[:, base + 1]
+            frame[f'{metric}_count'] = count
+            frame[f'{metric}_last'] = rows[:, base + 4]
+        return frame
+
+
+class TieredMetricStore:
+    """
+    Rolls raw samples up into 1-minute and 1-hour tiers with per-tier retention.
+
+    Queries use the coarsest tier that still meets the requested resolution,
+    so long ranges read hundreds of pre-aggregated points instead of every
+    raw sample. The ingest writer and the dashboard and report threads
+    share a lock around every update and query.
+    """
+
+    def __init__(
+        self,
+        metrics,
+        tiers=((60, timedelta(days=30)), (3600, timedelta(days=400))),
+        raw_retention=timedelta(days=2),
+        keep_raw=True,
+        raw_reader=None,
+        raw_since=None,
+    ):
+        self.metrics = list(metrics)
+        self.tiers = [RollupTier(resolution, retention, self.metrics) for resolution, retention in tiers]
+        self.raw_retention = raw_retention
+        self.keep_raw = keep_raw
+        # Callable (key, start, end) -> DataFrame for raw samples kept elsewhere
+        self.raw_reader = raw_reader
+        # Callable () -> the time raw_reader holds every sample from, or None while it holds them all
+        self.raw_since = raw_since
+        self.raw = {}
+        self.latest = None
+        self._retained_at = None
+        self._lock = threading.RLock()
+
+    def keys(self):
+        with self._lock:
+            return list(self.tiers[0].keys)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(tier.nbytes for tier in self.tiers) + sum(raw.nbytes for raw in self.raw.values())
+
+    def add_many(self, keys, timestamps, values):
+        """
+        Adds a batch of raw samples; values is a dict of metric to an array aligned with keys
+        """
+        if len(keys) == 0:
+            return
+
+        times = pd.to_datetime(pd.Series(timestamps)).values.astype(np.int64)
+        codes, uniques = pd.factorize(np.asarray(keys, dtype=object))
+        matrix = np.column_stack([
+            np.asarray(values.get(metric, np.full(len(keys), np.nan)), dtype=np.float64)
+            for metric in self.metrics
+        ])
+
+        order = np.lexsort((times, codes))
+        codes, times, matrix = codes[order], times[order], matrix[order]
+
+        with self._lock:
+            if self.keep_raw:
+                bounds = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1], True])
+                for lo, hi in zip(bounds[:-1], bounds[1:]):
+                    key = uniques[codes[lo]]
+                    raw = self.raw.get(key)
+                    if raw is None:
+                        raw = self.raw[key] = _SeriesArrays(len(self.metrics))
+                    raw.append(times[lo:hi], matrix[lo:hi])
+
+            for tier in self.tiers:
+                tier.add(uniques, codes, times, matrix)
+
+            latest = pd.Timestamp(times.max())
+            if self.latest is None or latest > self.latest:
+                self.latest = latest
+
+            # Retention only needs to move once per finest-tier bucket
+            step = timedelta(seconds=min(tier.resolution for tier in self.tiers))
+            if self._retained_at is None or self.latest - self._retained_at >= step:
+                self.apply_retention(self.latest)
+                self._retained_at = self.latest
+
+    def apply_retention(self, now):
+        """
+        Drops raw samples and aggregates older than each tier's retention
+        """
+        with self._lock:
+            now = pd.Timestamp(now).value
+            if self.keep_raw:
+                cutoff = now - int(self.raw_retention.total_seconds() * NS_PER_SECOND)
+                for raw in self.raw.values():
+                    raw.trim(cutoff)
+            for tier in self.tiers:
+                cutoff = now - int(tier.retention.total_seconds() * NS_PER_SECOND)
+                tier.trim(cutoff)
+
+    def pick_tier(self, start, end, max_points):
+        """
+        Returns the coarsest tier whose resolution still gives max_points over the range, or None for raw.
+
+        Raw samples are used only when they still reach back to start; otherwise the finest tier holding it is.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        needed = (end - start).total_seconds() / max(max_points, 1)
+        # How far back the range reaches, which decides the tiers that still hold it
+        age = (self.latest or end) - start
+        candidates = [
+            tier for tier in self.tiers
+            if tier.resolution <= needed and tier.retention >= age
+        ]
+        if candidates:
+            return max(candidates, key=lambda tier: tier.resolution)
+        if (self.keep_raw or self.raw_reader) and self.raw_retention >= age and self._raw_reaches(start):
+            return None
+        retained = [tier for tier in self.tiers if tier.retention >= age] or self.tiers
+        return min(retained, key=lambda tier: tier.resolution)
+
+    def _raw_reaches(self, start):
+        # A raw reader with bounded storage may have dropped samples well within raw_retention
+        since = self.raw_since() if self.raw_since is not None else None
+        return since is None or since <= start
+
+    def query(self, key, start=None, end=None, max_points=300):
+        """
+        Returns a DataFrame of a series over [start, end] with at most max_points rows.
+
+        The tier is chosen by pick_tier, and if it still holds more buckets than
+        max_points they are merged into the smallest multiple of its resolution
+        that fits.
+        """
+        with self._lock:
+            end = pd.Timestamp(end) if end is not None else (self.latest or pd.Timestamp.now())
+            start = pd.Timestamp(start) if start is not None else end - timedelta(days=7)
+            max_points = max(int(max_points), 1)
+            needed = (end - start).total_seconds() / max_points
+            tier = self.pick_tier(start, end, max_points)
+
+            if tier is None:
+                if self.raw_reader is not None:
+                    frame = self.raw_reader(key, start, end)
+                else:
+                    raw = self.raw.get(key)
+                    times, rows = raw.slice(start.value, end.value) if raw is not None else ([], [])
+                    frame = pd.DataFrame(np.asarray(rows).reshape(-1, len(self.metrics)), columns=self.metrics, copy=True)
+                    frame.insert(0, 'timestamp', pd.to_datetime(np.asarray(times, dtype=np.int64)))
+                if len(frame) > max_points:
+                    step = pd.Timedelta(seconds=max(1, int(np.ceil(needed))))
+                    frame = frame.set_index('timestamp').resample(step).mean().dropna(how='all').reset_index()
+                return frame
+
+            times, rows = tier.rows(key, start.value, end.value)
+            if len(times) > max_points:
+                multiple = int(np.ceil(needed / tier.resolution))
+                times, rows = tier.downsample(times, rows, multiple * tier.resolution * NS_PER_SECOND)
+            return tier.frame(times, rows)
+
+    def recent(self, metric, n, keys=None, resolution=None):
+        """
+        Returns (times, values) matrices of a metric's mean over the last n buckets of a tier, oldest first.
+
+        The tier is the coarsest unless a resolution is given. Every row
+        shares one regular grid of buckets ending at the newest one, and
+        buckets without samples are NaN. Rows follow keys, all keys by default.
+        """
+        with self._lock:
+            tiers = [tier for tier in self.tiers if resolution is None or tier.resolution == resolution]
+            tier = max(tiers, key=lambda tier: tier.resolution)
+            keys = list(tier.keys) if keys is None else list(keys)
+            step = tier.resolution * NS_PER_SECOND
+            values = np.full((len(keys), n), np.nan)
+            if self.latest is None:
+                return np.zeros((len(keys), n), dtype=np.int64), values
+
+            end = self.latest.value - self.latest.value % step
+            grid = end - step * np.arange(n - 1, -1, -1, dtype=np.int64)
+            base = self.metrics.index(metric) * len(AGGREGATES)
+            for row, key in enumerate(keys):
+                times, rows = tier.rows(key, grid[0], end)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values[row, (times - grid[0]) // step] = rows[:, base + 2] / rows[:, base + 3]
+            return np.tile(grid, (len(keys), 1)), values
+
+    def summary(self, start=None, end=None):
+        """
+        Returns a DataFrame indexed by key with the mean of each metric over the range
+        """
+        tier = self.tiers[-1]
+        start = pd.Timestamp(start).value if start is not None else None
+        end = pd.Timestamp(end).value if end is not None else None
+
+        with self._lock:
+            records = []
+            for key in tier.keys:
+                _, rows = tier.rows(key, start, end)
+                record = {'key': key}
+                for i, metric in enumerate(self.metrics):
+                    base = i * len(AGGREGATES)
+                    count = rows[:, base + 3].sum()
+                    record[metric] = rows[:, base + 2].sum() / count if count else np.nan
+                records.append(record)
+            return pd.DataFrame(records, columns=['key'] + self.metrics).set_index('key')
@@ -0,0 +1,117 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from data.memory import dict_nbytes
+
+PARAM = "{id}"
+
+# Segments that look like identifiers rather than route names
+_ID_SEGMENT = re.compile(
+    r"^(?:"
+    r"\d+"                                                            # numeric ids
+    r"|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"  # UUIDs
+    r"|[0-9a-fA-F]{16,}"                                              # hashes and object ids
+    r"|(?=[^/]*\d)[A-Za-z0-9_-]{20,}"                                 # long opaque tokens
+    r")$"
+)
+
+
+class _RouteNode:
+    __slots__ = ("children", "param", "template")
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.template = None
+
+
+class RouteNormalizer:
+    """
+    Maps raw request paths to route templates.
+
+    Known routes are compiled into a segment trie where literal segments win
+    over parameters, so "/api/users/me" and "/api/users/{user_id}" can both
+    be registered. Paths no route matches fall back to replacing numeric,
+    UUID and other id-like segments with {id}. Results are memoized, and
+    batches are factorized first so each distinct path is normalized once.
+    """
+
+    def __init__(self, routes=(), cache_size=1 << 18):
+        self.root = _RouteNode()
+        self.cache_size = cache_size
+        self._cache = {}
+        for route in routes:
+            self.add_route(route)
+
+    def add_route(self, template):
+        """
+        Registers a route template; segments in braces or starting with ":" are parameters
+        """
+        node = self.root
+        for segment in self._segments(template):
+            if segment.startswith("{") or segment.startswith(":"):
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _RouteNode())
+        node.template = "/" + "/".join(
+            "{" + segment[1:] + "}" if segment.startswith(":") else segment
+            for segment in self._segments(template)
+        )
+        self._cache.clear()
+
+    @property
+    def cache_nbytes(self):
+        return dict_nbytes(self._cache)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def normalize(self, path):
+        """
+        Returns the route template for a raw path
+        """
+        template = self._cache.get(path)
+        if template is None:
+            segments = self._segments(path)
+            template = self._match(self.root, segments, 0)
+            if template is None:
+                template = "/" + "/".join(
+                    PARAM if _ID_SEGMENT.match(segment) else segment for segment in segments
+                )
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[path] = template
+        return template
+
+    def normalize_many(self, paths):
+        """
+        Returns the route templates for a sequence of paths, normalizing each distinct path once
+        """
+        codes, uniques = pd.factorize(pd.Series(paths, dtype=object), use_na_sentinel=False)
+        templates = np.array([self.normalize(path) for path in uniques], dtype=object)
+        return templates[codes]
+
+    def _match(self, node, segments, position):
+        # Depth-first walk that prefers literal segments and backtracks to parameters
+        if position == len(segments):
+            return node.template
+
+        child = node.children.get(segments[position])
+        if child is not None:
+            template = self._match(child, segments, position + 1)
+            if template is not None:
+                return template
+
+        if node.param is not None:
+            return self._match(node.param, segments, position + 1)
+        return None
+
+    @staticmethod
+    def _segments(path):
+        # Drop the query string, fragment and empty segments from doubled or trailing slashes
+        path = path.split("?", 1)[0].split("#", 1)[0]
+        return [segment for segment in path.split("/") if segment]
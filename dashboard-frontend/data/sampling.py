@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Severities that are always kept in full
+KEEP_SEVERITIES = ('ERROR', 'CRITICAL')
+
+
+class AdaptiveLogSampler:
+    """
+    Per-endpoint adaptive sampling of low-severity logs.
+
+    ERROR and CRITICAL rows are always kept. Other rows are kept with
+    probability target_per_minute / (rows seen so far for the endpoint in
+    that minute), so a quiet endpoint keeps everything while a busy one is
+    cut down to roughly the target rate. Each kept row carries the weight
+    1 / probability, and summing weights instead of counting rows gives an
+    unbiased estimate of the original volume.
+    """
+
+    def __init__(self, target_per_minute=60, retention_minutes=120, seed=None):
+        self.target_per_minute = target_per_minute
+        self.retention_minutes = retention_minutes
+        self.rng = np.random.default_rng(seed)
+        self.seen = {}
+        self.latest_minute = None
+
+    def sample(self, endpoints, severities, timestamps):
+        """
+        Returns (keep mask, weights of the kept rows) for a batch
+        """
+        frame = pd.DataFrame({
+            'endpoint': pd.Series(endpoints, dtype=object),
+            'minute': pd.to_datetime(pd.Series(timestamps)).values.astype('datetime64[m]').astype(np.int64),
+        })
+        sampled = ~pd.Series(severities, dtype=object).isin(KEEP_SEVERITIES).to_numpy()
+        probabilities = np.ones(len(frame))
+        if not sampled.any():
+            return np.ones(len(frame), dtype=bool), probabilities
+
+        # Rows seen per endpoint and minute, including this batch, set that bucket's rate
+        counts = frame[sampled].groupby(['endpoint', 'minute']).size()
+        bucket_probabilities = {}
+        for key, count in counts.items():
+            seen = self.seen.get(key, 0) + count
+            self.seen[key] = seen
+            bucket_probabilities[key] = min(1.0, self.target_per_minute / seen)
+
+        rows = frame[sampled]
+        probabilities[sampled] = pd.Series(
+            bucket_probabilities
+        ).reindex(pd.MultiIndex.from_frame(rows)).to_numpy()
+
+        keep = self.rng.random(len(frame)) < probabilities
+        self._expire(int(frame['minute'].max()))
+        return keep, 1.0 / probabilities[keep]
+
+    def _expire(self, minute):
+        # Buckets older than the retention are forgotten, so late rows for them are judged by their own batch
+        if self.latest_minute is not None and minute <= self.latest_minute:
+            return
+        self.latest_minute = minute
+        cutoff = minute - self.retention_minutes
+        self.seen = {key: seen for key, seen in self.seen.items() if key[1] >= cutoff}
@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+SESSION_COLUMNS = ['user_id', 'start', 'end', 'events']
+
+
+class SessionTracker:
+    """
+    Groups user activity into sessions separated by inactivity gaps.
+
+    Batches are sessionized with vectorized gap detection over time-sorted
+    columns. The last session of each user stays open, in preallocated
+    NumPy rows, so the next batch can extend it, until expire() closes the
+    sessions that have been idle for longer than the gap.
+    """
+
+    def __init__(self, gap=timedelta(minutes=30), capacity=1024):
+        self.gap = int(gap.total_seconds() * 1e9)
+
+        # Open sessions: user_id -> row of (start_ns, last_ns, events)
+        self._slots = {}
+        self._open_users = []
+        self._open = np.zeros((capacity, 3), dtype='int64')
+
+        self._closed_chunks = []
+        self._closed = None
+
+        # Latest event time seen, in nanoseconds
+        self.latest = None
+
+    def add_batch(self, user_ids, timestamps):
+        """
+        Sessionizes a batch of events in one vectorized pass
+        """
+        if len(user_ids) == 0:
+            return
+
+        ts = pd.to_datetime(pd.Series(timestamps)).values.astype('int64')
+        codes, users = pd.factorize(np.asarray(user_ids, dtype=object))
+        order = np.lexsort((ts, codes))
+        codes, ts = codes[order], ts[order]
+        self.latest = int(ts.max()) if self.latest is None else max(self.latest, int(ts.max()))
+
+        # A session starts at each user's first event and after every long gap
+        first = np.ones(len(ts), dtype=bool)
+        first[1:] = codes[1:] != codes[:-1]
+        boundary = first.copy()
+        boundary[1:] |= (ts[1:] - ts[:-1]) > self.gap
+
+        starts = np.flatnonzero(boundary)
+        ends = np.r_[starts[1:], len(ts)] - 1
+        seg_users = users[codes[starts]]
+        seg_start = ts[starts]
+        seg_end = ts[ends]
+        seg_events = ends - starts + 1
+        first_segments = np.flatnonzero(first[starts])
+        last_segments = np.flatnonzero(np.r_[first[1:], True][ends])
+
+        # Continue or close the sessions left open by earlier batches
+        batch_users = seg_users[first_segments]
+        slots = np.fromiter(
+            (self._slots.get(user_id, -1) for user_id in batch_users.tolist()),
+            dtype='int64',
+            count=len(batch_users)
+        )
+        known = slots >= 0
+        previous = self._open[slots[known]]
+        continued = seg_start[first_segments[known]] - previous[:, 1] <= self.gap
+
+        idx = first_segments[known][continued]
+        seg_start[idx] = np.minimum(seg_start[idx], previous[continued, 0])
+        seg_events[idx] += previous[continued, 2]
+
+        ended = ~continued
+        self._close_columns(batch_users[known][ended], *previous[ended].T)
+
+        # Each user's last segment becomes their open session
+        slots[~known] = self._new_slots(batch_users[~known].tolist())
+        self._open[slots] = np.column_stack([
+            seg_start[last_segments], seg_end[last_segments], seg_events[last_segments]
+        ])
+
+        done = np.ones(len(starts), dtype=bool)
+        done[last_segments] = False
+        self._close_columns(seg_users[done], seg_start[done], seg_end[done], seg_events[done])
+
+    def expire(self, now):
+        """
+        Closes sessions with no activity within the gap before now
+        """
+        size = len(self._open_users)
+        cutoff = pd.Timestamp(now).value - self.gap
+        idle = self._open[:size, 1] < cutoff
+        if not idle.any():
+            return
+
+        users = np.array(self._open_users, dtype=object)
+        self._close_columns(users[idle], *self._open[:size][idle].T)
+
+        # Compact the open rows that remain
+        keep = ~idle
+        remaining = self._open[:size][keep]
+        self._open[:len(remaining)] = remaining
+        self._open_users = users[keep].tolist()
+        self._slots = {user_id: slot for slot, user_id in enumerate(self._open_users)}
+
+    def sessions(self, include_open=True):
+        """
+        Returns a DataFrame with one row per session and its duration in minutes
+        """
+        if self._closed is None:
+            chunks = self._closed_chunks
+            self._closed = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=SESSION_COLUMNS)
+            self._closed_chunks = [self._closed]
+
+        sessions_df = self._closed
+        if include_open and self._open_users:
+            open_rows = self._open[:len(self._open_users)]
+            open_df = self._frame(np.array(self._open_users, dtype=object), *open_rows.T)
+            sessions_df = pd.concat([sessions_df, open_df], ignore_index=True)
+
+        sessions_df = sessions_df.assign(
+            start=pd.to_datetime(sessions_df['start'].astype('int64')),
+            end=pd.to_datetime(sessions_df['end'].astype('int64')),
+            events=sessions_df['events'].astype('int64'),
+        )
+        sessions_df['duration_minutes'] = (sessions_df['end'] - sessions_df['start']).dt.total_seconds() / 60
+        return sessions_df
+
+    def _new_slots(self, user_ids):
+        first_slot = len(self._open_users)
+        needed = first_slot + len(user_ids)
+        if needed > len(self._open):
+            grown = np.zeros((max(needed, 2 * len(self._open)), 3), dtype='int64')
+            grown[:first_slot] = self._open[:first_slot]
+            self._open = grown
+
+        self._slots.update(zip(user_ids, range(first_slot, needed)))
+        self._open_users.extend(user_ids)
+        return np.arange(first_slot, needed)
+
+    def _close_columns(self, users, starts, ends, events):
+        if len(users):
+            self._closed_chunks.append(self._frame(users, starts, ends, events))
+            self._closed = None
+
+    @staticmethod
+    def _frame(users, starts, ends, events):
+        return pd.DataFrame({
+            'user_id': users,
+            'start': starts,
+            'end': ends,
+            'events': events,
+        }, columns=SESSION_COLUMNS)
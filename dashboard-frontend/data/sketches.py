@@ -0,0 +1,478 @@
+import hashlib
+import heapq
+import math
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data.memory import dict_nbytes
+
+
+def hour_bucket(timestamp):
+    """
+    Truncates a timestamp string or datetime to the start of its hour
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_buckets(timestamps):
+    """
+    Truncates an array of timestamps to the start of their hours
+    """
+    return pd.to_datetime(pd.Series(timestamps)).dt.floor('h')
+
+
+class LatencySketch:
+    """
+    Fixed-size DDSketch-style histogram with bounded relative error.
+
+    Values are mapped to logarithmic bins, so quantiles are accurate to within
+    RELATIVE_ACCURACY of the true value, and two sketches merge by adding
+    their bin counts.
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    MIN_VALUE = 0.01
+    MAX_VALUE = 1e6
+
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+    OFFSET = math.ceil(math.log(MIN_VALUE) / LOG_GAMMA)
+    NUM_BINS = math.ceil(math.log(MAX_VALUE) / LOG_GAMMA) - OFFSET + 1
+
+    __slots__ = ("counts",)
+
+    def __init__(self, counts=None):
+        self.counts = np.zeros(self.NUM_BINS, dtype=np.float32) if counts is None else counts
+
+    @classmethod
+    def _bins(cls, values):
+        values = np.clip(np.asarray(values, dtype=np.float64), cls.MIN_VALUE, cls.MAX_VALUE)
+        return np.ceil(np.log(values) / cls.LOG_GAMMA).astype(np.int64) - cls.OFFSET
+
+    def add(self, value, count=1):
+        value = min(max(value, self.MIN_VALUE), self.MAX_VALUE)
+        self.counts[math.ceil(math.log(value) / self.LOG_GAMMA) - self.OFFSET] += count
+
+    def add_many(self, values, counts=None):
+        self.counts += np.bincount(self._bins(values), weights=counts, minlength=self.NUM_BINS).astype(np.float32)
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    @classmethod
+    def merged(cls, sketches):
+        """
+        Returns a new sketch holding the union of the given sketches
+        """
+        sketches = list(sketches)
+        if not sketches:
+            return cls()
+        return cls(np.sum([sketch.counts for sketch in sketches], axis=0, dtype=np.float32))
+
+    @property
+    def count(self):
+        return float(self.counts.sum())
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes
+
+    def quantiles(self, qs):
+        """
+        Returns the estimated value at each quantile in qs, or NaN for an empty sketch
+        """
+        cumulative = np.cumsum(self.counts, dtype=np.float64)
+        total = cumulative[-1]
+        if total <= 0:
+            return [float("nan")] * len(qs)
+
+        ranks = np.asarray(qs, dtype=np.float64) * (total - 1)
+        bins = np.searchsorted(cumulative, ranks, side="right")
+        values = 2 * self.GAMMA ** (bins + self.OFFSET) / (self.GAMMA + 1)
+        return values.tolist()
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+
+def hash64(value):
+    """
+    Returns a stable 64-bit hash of a value, identical across processes and workers
+    """
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-value counter (Flajolet et al., 2007).
+
+    Uses 2**precision one-byte registers, giving a standard error of about
+    1.04 / sqrt(2**precision) (1.6% at the default precision of 12) no matter
+    how many distinct values are added. Sketches merge by taking the
+    register-wise maximum.
+    """
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    def add(self, value):
+        h = hash64(value)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add_many(self, values):
+        # Repeats cannot change a register, so each distinct value is hashed once
+        values = pd.unique(np.asarray(values, dtype=object))
+        hashes = np.fromiter((hash64(value) for value in values), dtype=np.uint64, count=len(values))
+        if not len(hashes):
+            return
+        width = 64 - self.precision
+        indexes = (hashes >> np.uint64(width)).astype(np.int64)
+        rest = hashes & np.uint64((1 << width) - 1)
+        bit_lengths = np.where(rest > 0, np.floor(np.log2(np.maximum(rest, 1).astype(np.float64))) + 1, 0)
+        ranks = (width - bit_lengths + 1).astype(np.uint8)
+        np.maximum.at(self.registers, indexes, ranks)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @classmethod
+    def merged(cls, sketches):
+        """
+        Returns a new sketch counting the union of the given sketches
+        """
+        sketches = list(sketches)
+        if not sketches:
+            return cls()
+        return cls(sketches[0].precision, np.max([sketch.registers for sketch in sketches], axis=0))
+
+    @property
+    def nbytes(self):
+        return self.registers.nbytes
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+
+        # Linear counting is more accurate while many registers are still empty
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter summary (Metwally et al., 2005).
+
+    Tracks at most `capacity` items. Reported counts never undercount, and
+    overcount by at most the smallest tracked count, so any item whose true
+    frequency exceeds total / capacity is guaranteed to be present.
+
+    The smallest counter is found through a min-heap of (count, item) that
+    is updated lazily: increments leave the heap alone, and an entry whose
+    count went stale is pushed back down when it surfaces, so eviction is
+    O(log capacity) amortized.
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "heap")
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []
+
+    def add(self, item, count=1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+        elif len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self.heap, (count, item))
+        else:
+            # Replace the smallest counter and inherit its count as the error bound
+            floor, evicted = self._smallest()
+            del counts[evicted]
+            del self.errors[evicted]
+            counts[item] = floor + count
+            self.errors[item] = floor
+            heapq.heapreplace(self.heap, (floor + count, item))
+
+    def add_many(self, items):
+        # Heaviest items first, so a batch evicts as little as possible
+        for item, count in pd.Series(items, dtype=object).value_counts().items():
+            self.add(item, int(count))
+
+    def _smallest(self):
+        # Heap counts only lag behind the real ones, so the top is the minimum once it is up to date
+        heap, counts = self.heap, self.counts
+        while heap[0][0] != counts[heap[0][1]]:
+            item = heap[0][1]
+            heapq.heapreplace(heap, (counts[item], item))
+        return heap[0]
+
+    def _floor(self):
+        return self._smallest()[0] if len(self.counts) >= self.capacity else 0
+
+    @classmethod
+    def merged(cls, summaries):
+        """
+        Returns a new summary over the union of the given summaries (Agarwal et al., 2012)
+        """
+        summaries = list(summaries)
+        if not summaries:
+            return cls()
+
+        capacity = summaries[0].capacity
+        floors = [summary._floor() for summary in summaries]
+        items = set().union(*(summary.counts for summary in summaries))
+
+        counts, errors = {}, {}
+        for item in items:
+            count, error = 0, 0
+            for summary, floor in zip(summaries, floors):
+                if item in summary.counts:
+                    count += summary.counts[item]
+                    error += summary.errors[item]
+                else:
+                    # The item may have been evicted from this summary with up to floor hits
+                    count += floor
+                    error += floor
+            counts[item] = count
+            errors[item] = error
+
+        merged = cls(capacity)
+        for item in sorted(counts, key=counts.get, reverse=True)[:capacity]:
+            merged.counts[item] = counts[item]
+            merged.errors[item] = errors[item]
+        merged.heap = [(count, item) for item, count in merged.counts.items()]
+        heapq.heapify(merged.heap)
+        return merged
+
+    def top(self, n=10):
+        """
+        Returns the n most frequent items as (item, count) pairs
+        """
+        return sorted(self.counts.items(), key=lambda entry: entry[1], reverse=True)[:n]
+
+    def total(self):
+        """
+        Returns the number of items added; Space-Saving counters always sum to it
+        """
+        return sum(self.counts.values())
+
+    @property
+    def nbytes(self):
+        heap = sys.getsizeof(self.heap) + len(self.heap) * sys.getsizeof((0, None))
+        return dict_nbytes(self.counts) + dict_nbytes(self.errors) + heap
+
+
+class HourlySketchStore:
+    """
+    Mergeable sketches per key and hour bucket.
+
+    The ingest writer adds keys, buckets and values while dashboard and
+    report threads merge them, so both hold the store's lock.
+    """
+
+    def __init__(self, sketch_class, **sketch_args):
+        self.sketch_class = sketch_class
+        self.sketch_args = sketch_args
+        self.series = {}
+        self._lock = threading.RLock()
+
+    def sketch(self, key, timestamp):
+        """
+        Returns the sketch for a key and the hour containing timestamp, creating it if needed
+        """
+        with self._lock:
+            buckets = self.series.setdefault(key, {})
+            bucket = hour_bucket(timestamp)
+            sketch = buckets.get(bucket)
+            if sketch is None:
+                sketch = buckets[bucket] = self.sketch_class(**self.sketch_args)
+            return sketch
+
+    def add(self, key, timestamp, *args):
+        with self._lock:
+            self.sketch(key, timestamp).add(*args)
+
+    def add_many(self, keys, timestamps, values):
+        """
+        Adds a batch of values, updating each key and hour sketch once
+        """
+        if len(keys) == 0:
+            return
+
+        frame = pd.DataFrame({'key': keys, 'hour': hour_buckets(timestamps), 'value': values})
+        groups = frame.groupby(['key', 'hour'], sort=False)['value']
+        with self._lock:
+            for (key, bucket), group in groups:
+                self.sketch(key, bucket.to_pydatetime()).add_many(group.to_numpy())
+
+    def merged(self, key, start=None, end=None):
+        """
+        Merges every hourly sketch for a key that falls within [start, end]
+        """
+        with self._lock:
+            return self._merged(key, start, end)
+
+    def merged_by_key(self, start=None, end=None, aggregator=None):
+        """
+        Returns a dict of key to its merged sketch within [start, end], merging keys in parallel given an aggregator
+        """
+        # Held while the pool merges, so the workers read the sketches without taking it
+        with self._lock:
+            keys = list(self.series)
+            merge = lambda key: self._merged(key, start, end)
+            sketches = aggregator.map(merge, keys) if aggregator is not None else [merge(key) for key in keys]
+        return dict(zip(keys, sketches))
+
+    def overall(self, start=None, end=None, aggregator=None):
+        """
+        Merges the sketches of every key within [start, end]
+        """
+        return self._merge_all(list(self.merged_by_key(start, end, aggregator).values()))
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by every sketch
+        """
+        with self._lock:
+            return sum(sketch.nbytes for buckets in self.series.values() for sketch in buckets.values())
+
+    def _merged(self, key, start, end):
+        # Caller holds the lock
+        buckets = self.series.get(key, {})
+        start = hour_bucket(start) if start is not None else None
+        return self._merge_all([
+            sketch for bucket, sketch in buckets.items()
+            if (start is None or bucket >= start) and (end is None or bucket <= end)
+        ])
+
+    def _merge_all(self, sketches):
+        if not sketches:
+            return self.sketch_class(**self.sketch_args)
+        return self.sketch_class.merged(sketches)
+
+
+class LatencySketchStore(HourlySketchStore):
+    """
+    Latency sketches per endpoint and hour bucket
+    """
+
+    def __init__(self):
+        super().__init__(LatencySketch)
+
+    def percentiles(self, start=None, end=None, qs=(0.5, 0.95, 0.99), aggregator=None):
+        """
+        Returns a dict of endpoint to the requested quantiles over the time range
+        """
+        return {
+            endpoint: sketch.quantiles(qs)
+            for endpoint, sketch in self.merged_by_key(start, end, aggregator).items()
+        }
+
+
+class DistinctCountStore(HourlySketchStore):
+    """
+    HyperLogLog sketches per key and hour bucket
+    """
+
+    def __init__(self, precision=12):
+        super().__init__(HyperLogLog, precision=precision)
+
+    def counts(self, start=None, end=None, aggregator=None):
+        """
+        Returns a dict of key to the estimated number of distinct values over the time range
+        """
+        return {key: sketch.count() for key, sketch in self.merged_by_key(start, end, aggregator).items()}
+
+
+class HeavyHitterStore(HourlySketchStore):
+    """
+    Space-Saving summaries per key and hour bucket.
+
+    Running all-time summaries, per key and over every key, are updated
+    alongside the hourly ones, so a top list without a time range is read
+    from them instead of merging every hour.
+    """
+
+    def __init__(self, capacity=200):
+        super().__init__(SpaceSaving, capacity=capacity)
+        self.totals = {}
+        self.all_time = SpaceSaving(capacity)
+
+    def add(self, key, timestamp, item, count=1):
+        with self._lock:
+            super().add(key, timestamp, item, count)
+            self._total(key).add(item, count)
+            self.all_time.add(item, count)
+
+    def add_many(self, keys, timestamps, values):
+        super().add_many(keys, timestamps, values)
+        if len(keys) == 0:
+            return
+
+        frame = pd.DataFrame({'key': keys, 'value': values})
+        with self._lock:
+            self.all_time.add_many(frame['value'].to_numpy())
+            for key, group in frame.groupby('key', sort=False)['value']:
+                self._total(key).add_many(group.to_numpy())
+
+    def top(self, n=10, start=None, end=None, keys=None):
+        """
+        Returns the n most frequent items over the time range, optionally limited to some keys
+        """
+        with self._lock:
+            if start is None and end is None:
+                if keys is None:
+                    return self.all_time.top(n)
+                return self._merge_all([self.totals[key] for key in keys if key in self.totals]).top(n)
+            if keys is None:
+                keys = list(self.series)
+            return self._merge_all([self._merged(key, start, end) for key in keys]).top(n)
+
+    def hourly_totals(self, start=None, end=None):
+        """
+        Returns a DataFrame of the number of events per key and hour within [start, end]
+        """
+        start = hour_bucket(start) if start is not None else None
+        with self._lock:
+            records = [
+                {'hour': bucket, 'key': key, 'count': summary.total()}
+                for key, buckets in self.series.items()
+                for bucket, summary in buckets.items()
+                if (start is None or bucket >= start) and (end is None or bucket <= end)
+            ]
+        return pd.DataFrame(records, columns=['hour', 'key', 'count']).sort_values('hour', ignore_index=True)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            running = self.all_time.nbytes + sum(summary.nbytes for summary in self.totals.values())
+        return super().nbytes + running
+
+    def _total(self, key):
+        summary = self.totals.get(key)
+        if summary is None:
+            summary = self.totals[key] = SpaceSaving(**self.sketch_args)
+        return summary
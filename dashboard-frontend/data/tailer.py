@@ -0,0 +1,347 @@
+import json
+import multiprocessing
+import os
+import re
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tail_checkpoints.json")
+
+# Most bytes read from one file per poll; a backlog is worked through over several polls
+READ_CHUNK_BYTES = 8 * 1024 * 1024
+
+_NGINX_COMBINED = re.compile(
+    r'(?P<remote_addr>\S+) \S+ (?P<remote_user>\S+) \[(?P<time_local>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" (?P<status>\d{3}) \S+'
+)
+_LOGFMT_PAIR = re.compile(r'([\w.@-]+)=("(?:[^"\\]|\\.)*"|\S*)')
+
+_MONTHS = {
+    name: number for number, name in enumerate(
+        ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1
+    )
+}
+
+_SEVERITIES = {
+    "DEBUG": "INFO", "TRACE": "INFO", "INFO": "INFO", "NOTICE": "INFO",
+    "WARN": "WARNING", "WARNING": "WARNING",
+    "ERR": "ERROR", "ERROR": "ERROR",
+    "CRIT": "CRITICAL", "CRITICAL": "CRITICAL", "FATAL": "CRITICAL", "ALERT": "CRITICAL", "EMERG": "CRITICAL",
+}
+
+# Field names used by common structured loggers, in order of preference
+_FIELD_ALIASES = {
+    'timestamp': ("timestamp", "time", "ts", "@timestamp", "date"),
+    'severity': ("severity", "level", "lvl", "log_level"),
+    'endpoint': ("endpoint", "path", "route", "url", "uri"),
+    'user_id': ("user_id", "user", "uid", "client_ip", "remote_addr"),
+    'message': ("message", "msg", "event"),
+    'log_class': ("log_class", "category", "class"),
+}
+
+
+def _status_class(status):
+    if status in (401, 407):
+        return "Authentication"
+    if status == 403:
+        return "Authorization"
+    if 400 <= status < 500:
+        return "Input Validation"
+    return "Network"
+
+
+def _status_severity(status):
+    if status >= 500:
+        return "CRITICAL" if status in (502, 503, 504) else "ERROR"
+    if status >= 400:
+        return "WARNING"
+    return "INFO"
+
+
+def _normalize_timestamp(value):
+    # Epoch seconds or milliseconds, or an ISO 8601 string cut to whole seconds; raises ValueError otherwise
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"Unsupported timestamp {value!r}")
+    if isinstance(value, (int, float)):
+        try:
+            moment = datetime.fromtimestamp(value / 1000 if value > 1e11 else value)
+        except (OverflowError, OSError) as error:
+            raise ValueError(f"Timestamp out of range: {value}") from error
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+    if len(value) >= 19 and value[4] == "-" and value[10] in "T ":
+        value = value[:10] + " " + value[11:19]
+        # Checked, so an impossible date never reaches the ingest pipeline
+        datetime.fromisoformat(value)
+        return value
+    return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_nginx(line):
+    """
+    Parses a line in nginx's combined format; the status code sets the severity and class
+    """
+    match = _NGINX_COMBINED.match(line)
+    if match is None:
+        return None
+
+    # time_local looks like 10/Oct/2024:13:55:36 +0000 and is kept as local wall-clock time
+    time_local = match.group("time_local")
+    timestamp = (
+        f"{time_local[7:11]}-{_MONTHS[time_local[3:6]]:02d}-{time_local[0:2]} {time_local[12:20]}"
+    )
+    status = int(match.group("status"))
+    user = match.group("remote_user")
+    return {
+        "timestamp": timestamp,
+        "severity": _status_severity(status),
+        "endpoint": match.group("path"),
+        "user_id": match.group("remote_addr") if user == "-" else user,
+        "message": f"{match.group('method')} {match.group('path')} returned {status}",
+        "log_class": _status_class(status),
+    }
+
+
+def _from_fields(fields):
+    record = {}
+    for field, aliases in _FIELD_ALIASES.items():
+        for alias in aliases:
+            value = fields.get(alias)
+            if value not in (None, ""):
+                record[field] = value
+                break
+
+    if "timestamp" not in record or "message" not in record:
+        return None
+    record["timestamp"] = _normalize_timestamp(record["timestamp"])
+    record["severity"] = _SEVERITIES.get(str(record.get("severity", "INFO")).upper(), "INFO")
+    record.setdefault("endpoint", "unknown")
+    record.setdefault("user_id", "unknown")
+    record.setdefault("log_class", "Network")
+    # JSON values may be numbers or objects; the stores expect strings
+    for field in ("endpoint", "user_id", "message", "log_class"):
+        record[field] = str(record[field])
+    return record
+
+
+def parse_json_line(line):
+    """
+    Parses a JSON object per line, accepting the field names of common structured loggers
+    """
+    try:
+        fields = _json.loads(line)
+    except ValueError:
+        return None
+    return _from_fields(fields) if isinstance(fields, dict) else None
+
+
+def parse_logfmt(line):
+    """
+    Parses a logfmt line of key=value pairs, where values may be double-quoted
+    """
+    fields = {}
+    for key, value in _LOGFMT_PAIR.findall(line):
+        if value.startswith('"'):
+            value = value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+        fields[key] = value
+    return _from_fields(fields)
+
+
+LOG_FORMATS = {
+    'nginx': parse_nginx,
+    'jsonl': parse_json_line,
+    'logfmt': parse_logfmt,
+}
+
+
+def _find_by_inode(directory, inode):
+    try:
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.inode() == inode:
+                return entry.path
+    except OSError:
+        pass
+    return None
+
+
+def read_chunk(path, fmt, inode=None, offset=0, max_bytes=READ_CHUNK_BYTES):
+    """
+    Reads and parses the complete lines after offset; runs in a worker process.
+
+    Returns the records with the inode and offset to resume from. When the
+    path now names a different file, the rest of the old one is read first
+    if it can still be found by inode (a rotation), before starting over on
+    the new file. A file smaller than the offset was truncated and restarts
+    from the beginning.
+    """
+    result = {'path': path, 'records': [], 'skipped': 0, 'inode': inode, 'offset': offset, 'more': False}
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return result
+
+    source = path
+    if inode is not None and stat.st_ino != inode:
+        rotated = _find_by_inode(os.path.dirname(path) or ".", inode)
+        if rotated is not None and os.path.getsize(rotated) > offset:
+            source = rotated
+        else:
+            inode, offset = stat.st_ino, 0
+    elif inode is None or stat.st_size < offset:
+        inode, offset = stat.st_ino, 0
+
+    with open(source, "rb") as log_file:
+        log_file.seek(offset)
+        chunk = log_file.read(max_bytes)
+
+    end = chunk.rfind(b"\n") + 1
+    if source != path and len(chunk) < max_bytes:
+        # Nothing more will be written to a rotated file, so an unterminated last line is complete
+        end = len(chunk)
+    elif end == 0 and len(chunk) == max_bytes:
+        # A single line longer than a chunk cannot be parsed; skip past it
+        end = len(chunk)
+        result['skipped'] += 1
+
+    parse = LOG_FORMATS[fmt]
+    records = result['records']
+    for line in chunk[:end].decode("utf-8", errors="replace").splitlines():
+        if line.strip():
+            try:
+                record = parse(line)
+            except (ValueError, KeyError, OverflowError):
+                # Malformed timestamps and the like
+                record = None
+            if record is None:
+                result['skipped'] += 1
+            else:
+                records.append(record)
+
+    result['inode'] = inode
+    result['offset'] = offset + end
+    # More is waiting if the chunk was full, or the rotated file still needs finishing
+    result['more'] = len(chunk) == max_bytes or source != path
+    return result
+
+
+def load_checkpoints(path=CHECKPOINT_PATH):
+    """
+    Returns the saved {path: {'inode', 'offset'}} positions, or an empty dict
+    """
+    try:
+        with open(path, encoding="utf-8") as checkpoint_file:
+            return json.load(checkpoint_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_checkpoints(checkpoints, path=CHECKPOINT_PATH):
+    """
+    Writes the positions to a temporary file and renames it over the old one, so a crash never leaves half a file
+    """
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as checkpoint_file:
+        json.dump(checkpoints, checkpoint_file)
+    os.replace(temporary, path)
+
+
+def parse_sources(spec):
+    """
+    Parses "format=path,format=path" into (path, format) pairs
+    """
+    sources = []
+    for entry in filter(None, (part.strip() for part in (spec or "").split(","))):
+        fmt, _, path = entry.partition("=")
+        if fmt not in LOG_FORMATS or not path:
+            raise ValueError(f"Invalid log source {entry!r}; expected one of {', '.join(LOG_FORMATS)}=<path>")
+        sources.append((path, fmt))
+    return sources
+
+
+class LogTailer:
+    """
+    Follows log files and feeds their new lines to the ingest pipeline.
+
+    Each poll reads every file in parallel in a pool of spawned processes,
+    where the lines are parsed. Offsets are checkpointed only after a
+    file's records have been queued, so a restart resumes where ingestion
+    stopped instead of re-reading whole files, and a batch refused by a full
+    queue is simply read again on the next poll.
+    """
+
+    def __init__(self, pipeline, sources, checkpoint_path=CHECKPOINT_PATH, max_workers=None, poll_seconds=1):
+        self.pipeline = pipeline
+        self.sources = list(sources)
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        self.poll_seconds = poll_seconds
+        self.checkpoints = load_checkpoints(checkpoint_path)
+        self.skipped = 0
+        self.executor = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(
+            self.max_workers or min(len(self.sources), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        threading.Thread(target=self._loop, name="log-tailer", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def poll(self):
+        """
+        Reads every source once and returns True if any of them has more to read
+        """
+        futures = []
+        for path, fmt in self.sources:
+            position = self.checkpoints.get(path, {})
+            futures.append(self.executor.submit(
+                read_chunk, path, fmt, position.get('inode'), position.get('offset', 0)
+            ))
+
+        more = False
+        changed = False
+        sequence = None
+        for future in futures:
+            result = future.result()
+            if result['records']:
+                submitted = self.pipeline.submit('logs', result['records'])
+                if submitted is None:
+                    # Queue is full; leave the offset so the same lines are read again
+                    continue
+                sequence = submitted
+            position = {'inode': result['inode'], 'offset': result['offset']}
+            if self.checkpoints.get(result['path']) != position:
+                self.checkpoints[result['path']] = position
+                changed = True
+            self.skipped += result['skipped']
+            more = more or result['more']
+
+        if changed:
+            # Offsets only move past lines that are safely in the write-ahead log
+            if sequence is not None:
+                self.pipeline.wait_durable(sequence)
+            save_checkpoints(self.checkpoints, self.checkpoint_path)
+        return more
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                more = self.poll()
+            except Exception:
+                # An unreadable file must not stop the others
+                traceback.print_exc()
+                more = False
+            if not more:
+                self._stop.wait(self.poll_seconds)
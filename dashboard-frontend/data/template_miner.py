@@ -0,0 +1,180 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from data.memory import dict_nbytes
+
+WILDCARD = "<*>"
+
+# Tokens that are always parameters, whatever the surrounding message says
+_PARAM_PATTERNS = re.compile(
+    r"^(?:"
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+    r"|\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?"
+    r"|0x[0-9a-fA-F]+"
+    r"|[-+]?\d+(?:\.\d+)?(?:ms|s|%)?"
+    r")[:,;]?$"
+)
+
+
+class LogCluster:
+    """
+    A group of messages that share one template
+    """
+
+    __slots__ = ("template_id", "tokens", "size")
+
+    def __init__(self, template_id, tokens):
+        self.template_id = template_id
+        self.tokens = tokens
+        self.size = 0
+
+    @property
+    def template(self):
+        return " ".join(self.tokens)
+
+
+class LogTemplateMiner:
+    """
+    Online log template miner based on Drain (He et al., 2017).
+
+    Messages are routed through a fixed-depth parse tree keyed by token count
+    and the first few tokens, so each message is only compared against the
+    handful of clusters in a single leaf.
+    """
+
+    def __init__(self, depth=4, similarity_threshold=0.5, max_children=100):
+        # Depth counts the root and length layers, like the original paper
+        self.prefix_depth = max(1, depth - 2)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.root = {}
+        self.clusters = []
+        # Masked tokens and token sequences already seen, to skip the regex and the tree walk
+        self._masked = {}
+        self._seen = {}
+        self.cache_size = 1 << 16
+
+    def add_message(self, message):
+        """
+        Assigns the message to a template and returns the template id
+        """
+        tokens = self._tokenize(message)
+        key = tuple(tokens)
+        cluster = self._seen.get(key)
+        if cluster is not None:
+            # Merging a sequence into the cluster it already joined changes nothing
+            cluster.size += 1
+            return cluster.template_id
+
+        leaf = self._leaf(tokens)
+        cluster = self._best_match(leaf, tokens)
+        if cluster is None:
+            cluster = LogCluster(len(self.clusters), tokens)
+            self.clusters.append(cluster)
+            leaf.append(cluster)
+        else:
+            cluster.tokens = self._merge(cluster.tokens, tokens)
+
+        cluster.size += 1
+        if len(self._seen) >= self.cache_size:
+            self._seen.clear()
+        self._seen[key] = cluster
+        return cluster.template_id
+
+    def add_messages(self, messages):
+        """
+        Assigns each message to a template and returns the template ids, mining each distinct message once
+        """
+        codes, uniques = pd.factorize(pd.Series(messages, dtype=object), use_na_sentinel=False)
+        counts = np.bincount(codes, minlength=len(uniques))
+        template_ids = np.empty(len(uniques), dtype=np.int64)
+        for i, message in enumerate(uniques):
+            template_ids[i] = self.add_message(message)
+            self.clusters[template_ids[i]].size += int(counts[i]) - 1
+        return template_ids[codes]
+
+    @property
+    def cache_nbytes(self):
+        return dict_nbytes(self._masked) + dict_nbytes(self._seen)
+
+    def clear_cache(self):
+        self._masked.clear()
+        self._seen.clear()
+
+    def match(self, message):
+        """
+        Returns the template id for a message without updating the tree, or None
+        """
+        tokens = self._tokenize(message)
+        leaf = self._leaf(tokens, create=False)
+        if leaf is None:
+            return None
+        cluster = self._best_match(leaf, tokens)
+        return cluster.template_id if cluster is not None else None
+
+    def template(self, template_id):
+        return self.clusters[template_id].template
+
+    def templates(self):
+        """
+        Returns a dict of template id to template string
+        """
+        return {cluster.template_id: cluster.template for cluster in self.clusters}
+
+    def _tokenize(self, message):
+        masked = self._masked
+        return [masked[token] if token in masked else self._mask(token) for token in message.split()]
+
+    def _mask(self, token):
+        value = WILDCARD if _PARAM_PATTERNS.match(token) else token
+        if len(self._masked) < self.cache_size:
+            self._masked[token] = value
+        return value
+
+    def _leaf(self, tokens, create=True):
+        node = self.root.get(len(tokens))
+        if node is None:
+            if not create:
+                return None
+            node = self.root[len(tokens)] = {}
+
+        # Messages shorter than the prefix depth keep their clusters under a wildcard key
+        prefix = tokens[:self.prefix_depth] or [WILDCARD]
+
+        for i, token in enumerate(prefix):
+            is_last = i == len(prefix) - 1
+            if token not in node:
+                # Route parameter-like tokens, or overflow, to the wildcard branch
+                if any(ch.isdigit() for ch in token) or len(node) >= self.max_children:
+                    token = WILDCARD
+                if token not in node:
+                    if not create:
+                        return None
+                    node[token] = [] if is_last else {}
+            node = node[token]
+        return node
+
+    def _best_match(self, leaf, tokens):
+        best, best_score, best_params = None, -1.0, -1
+        for cluster in leaf:
+            same, params = 0, 0
+            for template_token, token in zip(cluster.tokens, tokens):
+                if template_token == token:
+                    same += 1
+                if template_token == WILDCARD:
+                    params += 1
+            score = same / len(tokens) if tokens else 1.0
+            if score > best_score or (score == best_score and params > best_params):
+                best, best_score, best_params = cluster, score, params
+
+        if best is not None and best_score >= self.similarity_threshold:
+            return best
+        return None
+
+    def _merge(self, template_tokens, tokens):
+        return [
+            template_token if template_token == token else WILDCARD
+            for template_token, token in zip(template_tokens, tokens)
+        ]
@@ -0,0 +1,83 @@
+import re
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+PRESET_RANGES = {
+    '24h': timedelta(days=1),
+    '3d': timedelta(days=3),
+    '1w': timedelta(weeks=1),
+}
+
+_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+_RELATIVE = re.compile(r'^\s*(?:last\s+)?-?\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*$', re.IGNORECASE)
+_ABSOLUTE_SEPARATOR = re.compile(r'\s+(?:to|until|-)\s+|\s*\.\.\s*', re.IGNORECASE)
+
+# Number of points a chart asks the stores for, whatever the range
+DEFAULT_MAX_POINTS = 300
+
+
+def parse_time_range(text, now=None):
+    """
+    Parses a relative ("-2h", "90m", "last 3d") or absolute ("2024-05-01 10:00 to 2024-05-01 12:00")
+    range into (start, end); raises ValueError if the text cannot be understood
+    """
+    now = now or datetime.now()
+    text = (text or '').strip()
+    if not text:
+        raise ValueError("Empty time range")
+
+    match = _RELATIVE.match(text)
+    if match:
+        amount, unit = float(match.group(1)), match.group(2).lower()
+        return now - timedelta(**{_UNITS[unit]: amount}), now
+
+    parts = _ABSOLUTE_SEPARATOR.split(text, maxsplit=1)
+    try:
+        start = pd.Timestamp(parts[0]).to_pydatetime()
+        end = pd.Timestamp(parts[1]).to_pydatetime() if len(parts) > 1 else now
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Unrecognised time range: {text}") from exc
+
+    if end <= start:
+        raise ValueError(f"Time range ends before it starts: {text}")
+    return start, end
+
+
+def relayout_range(relayout_data):
+    """
+    Returns the (start, end) x-axis range from a graph's relayoutData after a zoom, or None
+    """
+    if not relayout_data:
+        return None
+
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        bounds = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        bounds = relayout_data['xaxis.range']
+    else:
+        return None
+
+    return pd.Timestamp(bounds[0]).to_pydatetime(), pd.Timestamp(bounds[1]).to_pydatetime()
+
+
+def resolve_time_range(preset, custom=None, relayout_data=None, now=None):
+    """
+    Returns the (start, end) to query for a page's range controls.
+
+    A zoomed graph wins over the custom text, which wins over the preset radio
+    option; invalid custom text falls back to the last 24 hours.
+    """
+    now = now or datetime.now()
+
+    zoomed = relayout_range(relayout_data)
+    if zoomed is not None:
+        return zoomed
+
+    if preset == 'custom':
+        try:
+            return parse_time_range(custom, now)
+        except ValueError:
+            return now - PRESET_RANGES['24h'], now
+
+    return now - PRESET_RANGES.get(preset, PRESET_RANGES['24h']), now
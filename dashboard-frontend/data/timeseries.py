@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+INFRA_METRICS = ['cpu_usage', 'memory_usage', 'disk_usage', 'network_in', 'network_out']
+
+
+class RingBufferStore:
+    """
+    Fixed-size time-series store with one ring buffer per (server, metric).
+
+    Every server gets a preallocated row of `capacity` slots per metric, so
+    memory is constant per server, the latest value is a single index and a
+    time window is a contiguous slice once the ring is unrolled.
+
+    That relies on each ring being in time order, so a sample older than the
+    latest one already stored for its server is dropped and counted in
+    `late` rather than written out of order.
+    """
+
+    def __init__(self, metrics=INFRA_METRICS, capacity=2048, initial_servers=16):
+        self.metrics = list(metrics)
+        self.capacity = capacity
+        self.servers = []
+        self.rows = {}
+        self.late = 0
+        self.counts = np.zeros(initial_servers, dtype=np.int64)
+        self.times = np.zeros((initial_servers, capacity), dtype=np.int64)
+        self.values = {
+            metric: np.full((initial_servers, capacity), np.nan, dtype=np.float32)
+            for metric in self.metrics
+        }
+
+    def __len__(self):
+        return len(self.servers)
+
+    def row(self, server):
+        """
+        Returns the row index for a server, allocating one if it is new
+        """
+        row = self.rows.get(server)
+        if row is None:
+            row = self.rows[server] = len(self.servers)
+            self.servers.append(server)
+            if row >= len(self.counts):
+                self._grow(2 * len(self.counts))
+        return row
+
+    def append(self, server, timestamp, values):
+        """
+        Appends one sample, given as a dict of metric to value; samples older than the server's latest are dropped
+        """
+        row = self.row(server)
+        time = pd.Timestamp(timestamp).value
+        if self.counts[row] and time < self.times[row, (self.counts[row] - 1) % self.capacity]:
+            self.late += 1
+            return
+        slot = self.counts[row] % self.capacity
+        self.times[row, slot] = time
+        for metric in self.metrics:
+            self.values[metric][row, slot] = values.get(metric, np.nan)
+        self.counts[row] += 1
+
+    def append_many(self, servers, timestamps, values):
+        """
+        Appends a batch of samples; values is a dict of metric to an array aligned with servers.
+
+        Samples older than the latest already stored for their server are dropped.
+        """
+        if len(servers) == 0:
+            return
+
+        times = pd.to_datetime(pd.Series(timestamps)).values.astype(np.int64)
+        rows = np.fromiter((self.row(server) for server in servers), dtype=np.int64, count=len(servers))
+
+        # Keep each server's samples in time order and give them consecutive slots
+        order = np.lexsort((times, rows))
+        rows, times = rows[order], times[order]
+
+        counts = self.counts[rows]
+        latest = np.where(counts > 0, self.times[rows, (counts - 1) % self.capacity], np.iinfo(np.int64).min)
+        in_order = times >= latest
+        if not in_order.all():
+            self.late += int(len(in_order) - in_order.sum())
+            order, rows, times = order[in_order], rows[in_order], times[in_order]
+            if len(rows) == 0:
+                return
+
+        first = np.r_[True, rows[1:] != rows[:-1]]
+        group_start = np.maximum.accumulate(np.where(first, np.arange(len(rows)), 0))
+        rank = np.arange(len(rows)) - group_start
+        slots = (self.counts[rows] + rank) % self.capacity
+
+        self.times[rows, slots] = times
+        for metric in self.metrics:
+            column = values.get(metric)
+            if column is None:
+                self.values[metric][rows, slots] = np.nan
+            else:
+                self.values[metric][rows, slots] = np.asarray(column, dtype=np.float32)[order]
+        np.add.at(self.counts, rows, 1)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.times.nbytes + sum(values.nbytes for values in self.values.values())
+
+    def latest(self, metric):
+        """
+        Returns a Series of the most recent value of a metric for every server
+        """
+        size = len(self.servers)
+        counts = self.counts[:size]
+        slots = (counts - 1) % self.capacity
+        latest = self.values[metric][np.arange(size), slots]
+        latest[counts == 0] = np.nan
+        return pd.Series(latest, index=self.servers, name=metric)
+
+    def hottest(self, metric, n=10):
+        """
+        Returns a Series of the n servers with the highest latest value of a metric, highest first
+        """
+        latest = self.latest(metric).dropna()
+        if len(latest) > n:
+            # Partial selection keeps this linear in the fleet size
+            top = np.argpartition(-latest.values, n - 1)[:n]
+            latest = latest.iloc[top]
+        return latest.sort_values(ascending=False)
+
+    def latest_value(self, server, metric):
+        row = self.rows.get(server)
+        if row is None or self.counts[row] == 0:
+            return None
+        return float(self.values[metric][row, (self.counts[row] - 1) % self.capacity])
+
+    def latest_timestamp(self):
+        size = len(self.servers)
+        if not size or not self.counts[:size].any():
+            return None
+        slots = (self.counts[:size] - 1) % self.capacity
+        latest = self.times[np.arange(size), slots][self.counts[:size] > 0]
+        return pd.Timestamp(latest.max())
+
+    def retained_since(self):
+        """
+        Returns the time from which every server's ring still holds all its samples, or None if no ring has wrapped
+        """
+        size = len(self.servers)
+        wrapped = np.flatnonzero(self.counts[:size] > self.capacity)
+        if not len(wrapped):
+            return None
+        # The oldest sample left in a wrapped ring sits in the slot the next one will overwrite
+        oldest = self.times[wrapped, self.counts[wrapped] % self.capacity]
+        return pd.Timestamp(oldest.max())
+
+    def window(self, server, start=None, end=None):
+        """
+        Returns a DataFrame of a server's samples within [start, end] in time order
+        """
+        row = self.rows.get(server)
+        if row is None:
+            return pd.DataFrame(columns=['timestamp'] + self.metrics)
+
+        # Unroll the ring so slots run oldest to newest
+        count = int(self.counts[row])
+        size = min(count, self.capacity)
+        slots = (count - size + np.arange(size)) % self.capacity
+        times = self.times[row, slots]
+
+        lo = np.searchsorted(times, pd.Timestamp(start).value, side='left') if start is not None else 0
+        hi = np.searchsorted(times, pd.Timestamp(end).value, side='right') if end is not None else size
+        slots = slots[lo:hi]
+
+        window_df = pd.DataFrame({'timestamp': pd.to_datetime(times[lo:hi])})
+        for metric in self.metrics:
+            window_df[metric] = self.values[metric][row, slots]
+        return window_df
+
+    def recent(self, metric, n):
+        """
+        Returns (times, values) matrices of the last n samples of every server, oldest first.
+
+        Rows follow self.servers; servers with fewer than n samples are padded on
+        the left with time 0 and NaN.
+        """
+        n = min(n, self.capacity)
+        size = len(self.servers)
+        counts = self.counts[:size]
+        index = counts[:, None] - n + np.arange(n)[None, :]
+        slots = index % self.capacity
+        rows = np.arange(size)[:, None]
+
+        times = self.times[rows, slots]
+        values = self.values[metric][rows, slots].astype(np.float64)
+        missing = index < 0
+        times[missing] = 0
+        values[missing] = np.nan
+        return times, values
+
+    def _grow(self, num_rows):
+        old_rows = len(self.counts)
+        self.counts = np.concatenate([self.counts, np.zeros(num_rows - old_rows, dtype=np.int64)])
+        self.times = np.vstack([self.times, np.zeros((num_rows - old_rows, self.capacity), dtype=np.int64)])
+        for metric in self.metrics:
+            self.values[metric] = np.vstack([
+                self.values[metric],
+                np.full((num_rows - old_rows, self.capacity), np.nan, dtype=np.float32)
+            ])
@@ -0,0 +1,426 @@
+import os
+import re
+import struct
+import threading
+import traceback
+import zlib
+
+import pandas as pd
+
+from data.ingest_queue import INGEST_KINDS, BatchError, decode_batch, encode_batch, validate_batch
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+WAL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "wal")
+
+# Payload length, CRC32 of kind and payload, length of the kind name
+_HEADER = struct.Struct("<IIH")
+
+_SEGMENT_NAME = re.compile(r"^segment-(\d{8})\.wal$")
+_SNAPSHOT_NAME = re.compile(r"^snapshot-(\d{8})-(\w+)\.parquet$")
+_BASE_NAME = re.compile(r"^base-(\d{8})-(\w+)\.parquet$")
+_NUMBERED_NAME = re.compile(r"^(?:segment|snapshot|base)-(\d{8})")
+
+# Batches that could not be replayed are moved here, in the segment format
+QUARANTINE_NAME = "quarantine.wal"
+
+# Replayed snapshots are validated in batches of this many records, so an invalid record quarantines only its batch
+REPLAY_CHUNK_RECORDS = 10000
+
+
+def _segment_path(directory, number):
+    return os.path.join(directory, f"segment-{number:08d}.wal")
+
+
+def _snapshot_path(directory, number, kind):
+    return os.path.join(directory, f"snapshot-{number:08d}-{kind}.parquet")
+
+
+def _base_path(directory, number, kind):
+    # Holds every snapshot of a kind up to and including number
+    return os.path.join(directory, f"base-{number:08d}-{kind}.parquet")
+
+
+def _compacted_marker(directory, number):
+    # Written once every snapshot of a segment is in place, so a partial compaction is never trusted
+    return os.path.join(directory, f"segment-{number:08d}.compacted")
+
+
+def _fsync_directory(directory):
+    # Makes file creations, renames and deletions in the directory durable
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _entry(kind, payload):
+    kind = kind.encode()
+    return _HEADER.pack(len(payload), zlib.crc32(payload, zlib.crc32(kind)), len(kind)) + kind + payload
+
+
+def _write_parquet(frame, path):
+    # Fields outside the validated ones may hold different types from batch to batch,
+    # so object columns are written as nullable strings to give every file one schema
+    frame = frame.astype({column: 'string' for column in frame.columns[frame.dtypes == object]})
+    # Written beside the target and renamed into place once durable
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    pq.write_table(table, path + ".tmp")
+    with open(path + ".tmp", "rb") as written:
+        os.fsync(written.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def read_segment(path):
+    """
+    Yields the (kind, payload) entries of a segment, stopping at a torn or corrupt tail
+    """
+    with open(path, "rb") as segment:
+        data = segment.read()
+
+    position = 0
+    while position + _HEADER.size <= len(data):
+        length, checksum, kind_length = _HEADER.unpack_from(data, position)
+        start = position + _HEADER.size
+        end = start + kind_length + length
+        if end > len(data) or zlib.crc32(data[start:end]) != checksum:
+            break
+        yield data[start:start + kind_length].decode(), data[start + kind_length:end]
+        position = end
+
+
+class WriteAheadLog:
+    """
+    Append-only log of ingested batches with group commit.
+
+    Each accepted batch is appended as one checksummed entry holding its
+    NDJSON payload, and a committer thread fsyncs whatever has accumulated
+    every commit_interval, so many batches share one fsync. Callers that
+    need durability wait for their sequence number to be committed.
+    Segments are sealed once they reach segment_bytes, and a compaction
+    thread rewrites sealed segments as one Parquet file per record kind,
+    which replays much faster than re-parsing JSON. Once a kind has
+    max_snapshots snapshots, they are merged into one base snapshot and the
+    files it replaces are deleted, so the directory does not grow with every
+    segment. Batches that fail validation, and whole segments that cannot
+    be written as Parquet, are moved to a quarantine file instead of being
+    compacted.
+    """
+
+    def __init__(self, directory=WAL_DIR, segment_bytes=64 * 1024 * 1024, commit_interval=0.005,
+                 compact_interval=30, max_snapshots=16):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.compact_interval = compact_interval
+        self.max_snapshots = max_snapshots
+        self.appended = 0
+        self.durable = 0
+        self.segment_number = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """
+        Opens a new segment after any existing ones and starts the commit and compaction threads
+        """
+        # Numbers of compacted segments are never reused, since their markers stay behind
+        numbers = [int(match.group(1)) for match in map(_NUMBERED_NAME.match, os.listdir(self.directory)) if match]
+        self._open_segment(max(numbers, default=0) + 1)
+        threading.Thread(target=self._commit_loop, name="wal-commit", daemon=True).start()
+        if pq is not None:
+            threading.Thread(target=self._compact_loop, name="wal-compact", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    def segments(self):
+        """
+        Returns the (number, path) of every segment on disk, oldest first
+        """
+        found = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def snapshots(self):
+        """
+        Returns the (number, kind, path) of every compacted snapshot on disk, oldest first
+        """
+        found = []
+        for name in os.listdir(self.directory):
+            match = _SNAPSHOT_NAME.match(name)
+            if match:
+                found.append((int(match.group(1)), match.group(2), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def bases(self):
+        """
+        Returns {kind: (number, path)} of the newest base snapshot of each kind
+        """
+        found = {}
+        for name in sorted(os.listdir(self.directory)):
+            match = _BASE_NAME.match(name)
+            if match:
+                found[match.group(2)] = (int(match.group(1)), os.path.join(self.directory, name))
+        return found
+
+    def quarantine(self, kind, payload):
+        """
+        Appends a batch that could not be ingested to the quarantine file, for inspection with read_segment
+        """
+        with open(os.path.join(self.directory, QUARANTINE_NAME), "ab") as quarantined:
+            quarantined.write(_entry(kind, payload))
+            quarantined.flush()
+            os.fsync(quarantined.fileno())
+
+    def sealed_segments(self):
+        return [(number, path) for number, path in self.segments() if number < self.segment_number]
+
+    def is_compacted(self, number):
+        return os.path.exists(_compacted_marker(self.directory, number))
+
+    def append(self, kind, payload):
+        """
+        Appends a batch and returns its sequence number; it is durable once wait() returns for it
+        """
+        entry = _entry(kind, payload)
+        with self._lock:
+            self._file.write(entry)
+            self.appended += 1
+            sequence = self.appended
+            if self._file.tell() >= self.segment_bytes:
+                self._sync()
+                self._file.close()
+                self._open_segment(self.segment_number + 1)
+        return sequence
+
+    def wait(self, sequence, timeout=None):
+        """
+        Blocks until the batch with this sequence number is on disk; returns False on timeout
+        """
+        with self._committed:
+            return self._committed.wait_for(lambda: self.durable >= sequence, timeout)
+
+    def _open_segment(self, number):
+        self.segment_number = number
+        self._file = open(_segment_path(self.directory, number), "ab")
+        _fsync_directory(self.directory)
+
+    def _sync(self):
+        # Caller holds the lock
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.durable = self.appended
+        self._committed.notify_all()
+
+    def _commit_loop(self):
+        while not self._stop.wait(self.commit_interval):
+            with self._lock:
+                if self.durable < self.appended:
+                    self._sync()
+
+    def compact(self):
+        """
+        Rewrites each sealed segment as Parquet snapshots, one per record kind, then deletes it
+        """
+        for number, path in self.sealed_segments():
+            try:
+                self._compact_segment(number, path)
+            except Exception:
+                # One segment that cannot be written as Parquet must not hold back the ones after it
+                traceback.print_exc()
+                self._quarantine_segment(number, path)
+
+        bases = self.bases()
+        by_kind = {}
+        for number, kind, path in self.snapshots():
+            if kind not in bases or number > bases[kind][0]:
+                by_kind.setdefault(kind, []).append((number, path))
+        for kind, snapshots in by_kind.items():
+            if len(snapshots) >= self.max_snapshots:
+                try:
+                    self.merge_snapshots(kind, snapshots, bases.get(kind))
+                except Exception:
+                    # The snapshots stay as they are and are replayed one by one
+                    traceback.print_exc()
+
+    def _compact_segment(self, number, path):
+        batches = {}
+        for kind, payload in read_segment(path):
+            try:
+                records = decode_batch(payload)
+                validate_batch(kind, records)
+            except BatchError:
+                self.quarantine(kind, payload)
+                continue
+            batches.setdefault(kind, []).extend(records)
+
+        for kind, records in batches.items():
+            _write_parquet(pd.DataFrame(records), _snapshot_path(self.directory, number, kind))
+
+        # The snapshots are durable before the segment they replace is removed
+        _fsync_directory(self.directory)
+        open(_compacted_marker(self.directory, number), "wb").close()
+        _fsync_directory(self.directory)
+        os.remove(path)
+
+    def _quarantine_segment(self, number, path):
+        # Moves every entry of a segment to the quarantine file and removes the segment and any of its snapshots
+        for snapshot_number, _, snapshot_path in self.snapshots():
+            if snapshot_number == number:
+                os.remove(snapshot_path)
+        for kind, payload in read_segment(path):
+            self.quarantine(kind, payload)
+        os.remove(path)
+        _fsync_directory(self.directory)
+
+    def merge_snapshots(self, kind, snapshots, base=None):
+        """
+        Rewrites a base snapshot and the snapshots after it as one new base, then deletes the files it replaces
+        """
+        paths = ([base[1]] if base else []) + [path for _, path in snapshots]
+        number = snapshots[-1][0]
+        frame = pd.concat([pq.read_table(path).to_pandas() for path in paths], ignore_index=True)
+        _write_parquet(frame, _base_path(self.directory, number, kind))
+        _fsync_directory(self.directory)
+        self.prune()
+
+    def prune(self):
+        """
+        Deletes the snapshots, segments and markers that the newest base snapshots already hold
+        """
+        bases = self.bases()
+        if not bases:
+            return
+        for number, kind, path in self.snapshots():
+            if kind in bases and number <= bases[kind][0]:
+                os.remove(path)
+        for name in os.listdir(self.directory):
+            match = _BASE_NAME.match(name)
+            if match and int(match.group(1)) < bases[match.group(2)][0]:
+                os.remove(os.path.join(self.directory, name))
+
+        # Markers, and segments left behind by a finished compaction, can go once no snapshot needs them;
+        # base numbers keep later segments from reusing a merged number
+        pending = {number for number, _, _ in self.snapshots()}
+        for number, path in self.segments():
+            if number not in pending and self.is_compacted(number):
+                os.remove(path)
+        for name in os.listdir(self.directory):
+            match = _NUMBERED_NAME.match(name)
+            if match and name.endswith(".compacted") and int(match.group(1)) not in pending:
+                # The segment goes first, so it is never replayed without its marker
+                os.remove(os.path.join(self.directory, name))
+        _fsync_directory(self.directory)
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.compact()
+            except Exception:
+                # A segment that cannot be compacted stays on disk and is replayed from JSON
+                traceback.print_exc()
+
+
+def replay_wal(data, wal):
+    """
+    Ingests every base snapshot, snapshot and segment on disk in order and returns the number of records restored.
+
+    Runs before wal.start(), so nothing is appended or compacted meanwhile.
+    Batches that fail to ingest are quarantined and skipped, so one bad
+    batch cannot stop the app from starting.
+    """
+    # Leftovers of a merge that stopped before its cleanup
+    wal.prune()
+    bases = wal.bases()
+    restored = 0
+    for kind, (_, path) in bases.items():
+        restored += _replay_snapshot(data, wal, kind, path)
+
+    snapshots = {}
+    for number, kind, path in wal.snapshots():
+        snapshots.setdefault(number, []).append((kind, path))
+    segments = dict(wal.segments())
+
+    for number in sorted(set(snapshots) | set(segments)):
+        if wal.is_compacted(number):
+            if number in segments:
+                # Compaction finished but the segment was not deleted yet
+                os.remove(segments[number])
+            for kind, path in snapshots.get(number, []):
+                restored += _replay_snapshot(data, wal, kind, path)
+            continue
+
+        for kind, path in snapshots.get(number, []):
+            # Left over from a compaction that did not finish; the segment is still authoritative
+            os.remove(path)
+        if number not in segments:
+            continue
+
+        batches = {}
+        for kind, payload in read_segment(segments[number]):
+            try:
+                batches.setdefault(kind, []).append(decode_batch(payload))
+            except BatchError:
+                wal.quarantine(kind, payload)
+        for kind, kind_batches in batches.items():
+            restored += _replay_batches(data, wal, kind, kind_batches)
+
+    return restored
+
+
+def _replay_snapshot(data, wal, kind, path):
+    if pq is None:
+        raise RuntimeError("Replaying WAL snapshots requires pyarrow")
+    # Columns a record did not have come back as nulls; drop them so records match what was ingested
+    records = [
+        {key: value for key, value in record.items() if not _is_missing(value)}
+        for record in pq.read_table(path).to_pandas().to_dict('records')
+    ]
+    chunks = [records[start:start + REPLAY_CHUNK_RECORDS] for start in range(0, len(records), REPLAY_CHUNK_RECORDS)]
+    return _replay_batches(data, wal, kind, chunks)
+
+
+def _replay_batches(data, wal, kind, batches):
+    # Invalid batches are quarantined first, so the rest are ingested together and cannot fail halfway through
+    valid = []
+    for records in batches:
+        try:
+            validate_batch(kind, records)
+        except BatchError:
+            wal.quarantine(kind, encode_batch(records))
+            continue
+        valid.append(records)
+
+    records = [record for records in valid for record in records]
+    if kind == 'user_activities':
+        records.sort(key=lambda record: record["timestamp"])
+    ingest, _ = INGEST_KINDS[kind]
+    try:
+        ingest(data, records)
+    except Exception:
+        # Not retried, since the stores may already hold part of it; kept for inspection instead
+        traceback.print_exc()
+        for batch in valid:
+            wal.quarantine(kind, encode_batch(batch))
+        return 0
+    return len(records)
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
@@ -0,0 +1,238 @@
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from html import escape
+
+import pandas as pd
+import plotly.express as px
+from plotly.offline import get_plotlyjs
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated_reports")
+
+REPORT_PERIODS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+
+# Long per-service tables are split into pages that render in parallel
+SERVICES_PER_PAGE = 50
+
+REPORT_CSS = """
+body { font-family: Arial, sans-serif; margin: 30px; color: #333; }
+h1 { color: #3f51b5; }
+section { margin-bottom: 40px; }
+.report-table { border-collapse: collapse; margin-top: 10px; }
+.report-table th, .report-table td { padding: 6px 12px; border-bottom: 1px solid #ddd; text-align: left; }
+.report-table th { background-color: rgb(240, 240, 240); }
+"""
+
+
+def _paged(kind, title, table):
+    if len(table) <= SERVICES_PER_PAGE:
+        return [{'kind': kind, 'title': title, 'table': table}]
+
+    pages = range(0, len(table), SERVICES_PER_PAGE)
+    return [
+        {
+            'kind': kind,
+            'title': f"{title} ({number} of {len(pages)})",
+            'table': table.iloc[offset:offset + SERVICES_PER_PAGE].reset_index(drop=True),
+        }
+        for number, offset in enumerate(pages, 1)
+    ]
+
+
+def collect_report_sections(data, start, end):
+    """
+    Reads the precomputed stores into small tables, one section per report page.
+
+    This is the only step that runs in the dashboard process; it merges
+    sketches and rollups rather than scanning raw records.
+    """
+    sections = []
+
+    volume = data["top_endpoints"].hourly_totals(start, end).rename(columns={'key': 'severity'})
+    sections.append({'kind': 'log_volume', 'title': "Log Volume", 'table': volume})
+
+    top_errors = pd.DataFrame(
+        data["top_endpoints"].top(10, start, end, keys=['ERROR', 'CRITICAL']),
+        columns=['endpoint', 'errors']
+    )
+    sections.append({'kind': 'top_errors', 'title': "Top Error Endpoints", 'table': top_errors})
+
+    latency = pd.DataFrame.from_dict(
+        data["latency_sketches"].percentiles(start, end, aggregator=data["aggregator"]), orient='index', columns=['p50', 'p95', 'p99']
+    )
+    api_table = data["api_rollups"].summary(start, end).join(latency).rename_axis('endpoint').reset_index()
+    sections.extend(_paged('api_latency', "API Latency", api_table))
+
+    infra_table = data["infra_rollups"].summary(start, end).rename_axis('server').reset_index()
+    sections.extend(_paged('infra_utilization', "Infrastructure Utilization", infra_table))
+
+    alerts_df = pd.DataFrame(data["alerts"], columns=['timestamp', 'type', 'priority', 'status'])
+    alert_times = pd.to_datetime(alerts_df['timestamp'])
+    alerts_df = alerts_df[(alert_times >= start) & (alert_times <= end)]
+    alert_counts = alerts_df.groupby(['type', 'priority']).size().reset_index(name='count')
+    sections.append({'kind': 'alerts', 'title': "Alerts", 'table': alert_counts})
+
+    return sections
+
+
+def _log_volume_figures(table):
+    return [px.bar(table, x='hour', y='count', color='severity', title='Log Volume by Severity')]
+
+
+def _top_error_figures(table):
+    return [px.bar(table, x='endpoint', y='errors', title='Top Error Endpoints', color_discrete_sequence=['#F44336'])]
+
+
+def _api_latency_figures(table):
+    return [
+        px.bar(table, x='endpoint', y=['p50', 'p95', 'p99'], barmode='group', title='Latency Percentiles (ms)'),
+        px.bar(table, x='endpoint', y='error_rate', title='Error Rate by Endpoint (%)'),
+    ]
+
+
+def _infra_figures(table):
+    return [
+        px.bar(
+            table, x='server', y=['cpu_usage', 'memory_usage', 'disk_usage'],
+            barmode='group', title='Average Utilization (%)'
+        ),
+    ]
+
+
+def _alert_figures(table):
+    return [px.bar(table, x='type', y='count', color='priority', title='Alerts by Type and Priority')]
+
+
+SECTION_FIGURES = {
+    'log_volume': _log_volume_figures,
+    'top_errors': _top_error_figures,
+    'api_latency': _api_latency_figures,
+    'infra_utilization': _infra_figures,
+    'alerts': _alert_figures,
+}
+
+
+def render_section(section):
+    """
+    Renders one section to an HTML fragment with its figures and table; runs in a worker process
+    """
+    table = section['table']
+    parts = [f"<section><h2>{escape(section['title'])}</h2>"]
+    if len(table):
+        for fig in SECTION_FIGURES[section['kind']](table):
+            parts.append(fig.to_html(full_html=False, include_plotlyjs=False))
+        parts.append(table.round(2).to_html(index=False, classes='report-table', border=0, na_rep=''))
+    else:
+        parts.append("<p>No data for this period.</p>")
+    parts.append("</section>")
+    return "".join(parts)
+
+
+def assemble_report(title, fragments):
+    """
+    Wraps rendered sections in a self-contained HTML page with plotly.js inlined
+    """
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{escape(title)}</title><style>{REPORT_CSS}</style>"
+        f"<script type=\"text/javascript\">{get_plotlyjs()}</script>"
+        f"</head><body><h1>{escape(title)}</h1>{''.join(fragments)}</body></html>"
+    )
+
+
+def generate_report(data, period='daily', end=None, executor=None, output_dir=REPORT_DIR):
+    """
+    Generates the report for the period ending at end and returns the path of the HTML file
+    """
+    end = end or datetime.now()
+    start = end - REPORT_PERIODS[period]
+    sections = collect_report_sections(data, start, end)
+
+    render = executor.map if executor is not None else map
+    fragments = list(render(render_section, sections))
+
+    title = f"{period.capitalize()} Report: {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M}"
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{period}-{end:%Y-%m-%d-%H%M}.html")
+    with open(path, "w", encoding="utf-8") as report_file:
+        report_file.write(assemble_report(title, fragments))
+    return path
+
+
+class ReportScheduler:
+    """
+    Generates the daily and weekly reports on a schedule.
+
+    A background thread snapshots the aggregates when a report is due and
+    hands the sections to a pool of spawned processes, so rendering runs in
+    parallel and outside the process serving the dashboard.
+    """
+
+    def __init__(self, data, output_dir=REPORT_DIR, max_workers=None, run_at=time(0, 5), weekly_day=0, poll_seconds=60):
+        self.data = data
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.run_at = run_at
+        self.weekly_day = weekly_day
+        self.poll_seconds = poll_seconds
+        self.due = {}
+        self.executor = None
+        self._stop = threading.Event()
+
+    def next_run(self, period, after):
+        """
+        Returns the first scheduled time for a period strictly after the given time
+        """
+        candidate = datetime.combine(after.date(), self.run_at)
+        if candidate <= after:
+            candidate += timedelta(days=1)
+        if period == 'weekly':
+            candidate += timedelta(days=(self.weekly_day - candidate.weekday()) % 7)
+        return candidate
+
+    def start(self):
+        now = datetime.now()
+        self.due = {period: self.next_run(period, now) for period in REPORT_PERIODS}
+        self.executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        threading.Thread(target=self._loop, name="report-scheduler", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def run_pending(self, now):
+        """
+        Generates every report that is due and returns their paths
+        """
+        paths = []
+        for period, due in self.due.items():
+            if now >= due:
+                paths.append(generate_report(self.data, period, due, self.executor, self.output_dir))
+                self.due[period] = self.next_run(period, now)
+        return paths
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.run_pending(datetime.now())
+            except Exception:
+                # A failed report must not stop later ones
+                traceback.print_exc()
+
+
+if __name__ == "__main__":
+    # Generate reports on demand: python reports.py [daily|weekly ...]
+    from data.mock_data import mock_data
+
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+        for period in sys.argv[1:] or ['daily']:
+            print(generate_report(mock_data, period, executor=pool))
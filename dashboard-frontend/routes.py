@@ -0,0 +1,79 @@
+import os
+from html import escape
+
+from flask import Response, abort, jsonify, request, send_from_directory, stream_with_context
+
+from data.export import EXPORT_FORMATS, EXPORT_VIEWS, ExportError, export_view, pq
+from data.ingest_queue import INGEST_KINDS, BatchError, decode_batch, validate_batch
+from data.log_query import QueryError
+from reports import REPORT_DIR
+
+
+def register_routes(server, data, pipeline):
+    """
+    Registers the plain HTTP endpoints served next to the Dash app
+    """
+    @server.route("/ingest/<kind>", methods=["POST"])
+    def ingest(kind):
+        # Handlers only decode and queue; the pipeline's writer thread updates the stores
+        if kind not in INGEST_KINDS:
+            abort(404)
+        try:
+            body = request.get_data()
+            records = decode_batch(body, request.content_encoding == "gzip")
+            validate_batch(kind, records)
+        except BatchError as error:
+            return jsonify(error=str(error)), 400
+
+        if not records:
+            return jsonify(accepted=0), 202
+
+        sequence = pipeline.submit(kind, records, payload=body)
+        if sequence is None:
+            response = jsonify(error="Ingest queue is full", **pipeline.stats())
+            response.status_code = 429
+            response.headers["Retry-After"] = str(pipeline.retry_after())
+            return response
+        # Group commit: the batch is acknowledged once the write-ahead log has synced it
+        if not pipeline.wait_durable(sequence, timeout=10):
+            return jsonify(error="Timed out waiting for the write-ahead log"), 503
+        return jsonify(accepted=len(records)), 202
+
+    @server.route("/ingest/stats")
+    def ingest_stats():
+        return jsonify(pipeline.stats())
+
+    @server.route("/memory")
+    def memory_stats():
+        return jsonify(data["memory_budget"].stats())
+
+    @server.route("/export/<view>.<fmt>")
+    def export(view, fmt):
+        # Rows are filtered and encoded one chunk at a time while the response streams
+        if view not in EXPORT_VIEWS or fmt not in EXPORT_FORMATS:
+            abort(404)
+        if fmt == 'parquet' and pq is None:
+            abort(501, description="Parquet export requires pyarrow")
+
+        try:
+            chunks = export_view(data, view, fmt, request.args)
+        except (ExportError, QueryError) as error:
+            return jsonify(error=str(error)), 400
+        return Response(
+            stream_with_context(chunks),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename={view}.{fmt}"}
+        )
+
+    @server.route("/reports/")
+    def list_reports():
+        names = sorted(os.listdir(REPORT_DIR), reverse=True) if os.path.isdir(REPORT_DIR) else []
+        items = "".join(
+            f'<li><a href="/reports/{escape(name)}">{escape(name)}</a></li>'
+            for name in names if name.endswith(".html")
+        )
+        return f"<h1>Reports</h1><ul>{items or '<li>No reports generated yet</li>'}</ul>"
+
+    @server.route("/reports/<name>")
+    def show_report(name):
+        return send_from_directory(REPORT_DIR, name)